@@ -1,14 +1,57 @@
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.routes.demo import router as demo_router
 from app.routes.predict import router as predict_router
 from app.routes.readings import router as readings_router
 from app.routes.analytics import router as analytics_router
+from app.routes.models import router as models_router
+from app.routes.jobs import router as jobs_router
+from app.routes.metrics import router as metrics_router
+from app.services.dataset import merged_data
+from app.services.weather import weather_provider
+from app.services.air_quality import pm25_provider
+from app.services.model_registry import model_registry
+from app.services.batcher import batcher
+from app.services.executor import work_pool
+from app.services.jobs import job_runner
+from app.services.encoding import CompressionMiddleware
+from app.services.log import configure_logging
+from app.services.metrics import MetricsMiddleware
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Parse the history data once up front instead of on the first request
+    try:
+        merged_data.load()
+    except Exception as e:
+        logger.error("Error loading history data: %s", e)
+    # Load and warm up the models in the background, then watch for new versions
+    model_registry.start()
+    # Thread pool (and worker processes in process mode) for CPU-heavy request work
+    work_pool.start()
+    # Pick up queued (and interrupted) batch jobs
+    job_runner.start()
+    yield
+    job_runner.stop()
+    # Let batched /api/predict calls finish on the pool before it goes away
+    await batcher.aclose()
+    work_pool.shutdown()
+    model_registry.stop()
+    await weather_provider.aclose()
+    pm25_provider.close()
+
 
 app = FastAPI(
     title="ML Project API",
     description="FastAPI backend for Machine Learning project with scikit-learn",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS for frontend connection
@@ -18,13 +61,24 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Resolution of downsampled history responses
+    expose_headers=["X-Points-Total", "X-Points-Returned", "X-Resolution"],
 )
 
+# gzip/br for clients that accept it, streamed batch output included
+app.add_middleware(CompressionMiddleware)
+
+# Request counts and latencies for /metrics
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(demo_router)
 app.include_router(predict_router)
 app.include_router(readings_router)
 app.include_router(analytics_router)
+app.include_router(models_router)
+app.include_router(jobs_router)
+app.include_router(metrics_router)
 
 
 
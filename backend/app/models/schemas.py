@@ -1,5 +1,7 @@
+from datetime import datetime
 from pydantic import BaseModel
 from typing import Optional, List
+from app.services.features import DEFAULT_AC_POWER_LAG1, DEFAULT_POWER_FACTOR_LAG1
 
 
 class AdditionRequest(BaseModel):
@@ -35,9 +37,12 @@ class PredictionRequest(BaseModel):
     
     # Common inputs
     pm25: float
-    pm25_lag1: float
-    ac_power_lag1: float
-    power_factor_lag1: float
+    # Lags left out are taken from the latest reading ingested for site_id,
+    # when hour/month are those of the hour right after it
+    site_id: Optional[str] = None
+    pm25_lag1: Optional[float] = None
+    ac_power_lag1: Optional[float] = None
+    power_factor_lag1: Optional[float] = None
 
 
 class PredictionResponse(BaseModel):
@@ -45,3 +50,136 @@ class PredictionResponse(BaseModel):
     predicted_power: float
     features: List[float]
 
+
+
+class ForecastSite(BaseModel):
+    """One site (or scenario) to forecast, with its current readings"""
+    latitude: float
+    longitude: float
+    name: Optional[str] = None
+
+    pm25: float
+    pm25_lag1: float
+    ac_power_lag1: float
+    power_factor_lag1: float
+
+
+class ForecastRequest(BaseModel):
+    """Request model for a multi-step power forecast"""
+    sites: List[ForecastSite]
+    # Same fixed default date as location mode in /api/predict
+    start_date: str = "20250101"
+    start_hour: int = 0
+    hours: int = 24
+
+
+class ForecastSiteResult(BaseModel):
+    """Predicted power per forecast step for one site"""
+    latitude: float
+    longitude: float
+    name: Optional[str] = None
+    predicted_power: List[float]
+
+
+class ForecastResponse(BaseModel):
+    """Response model for a multi-step power forecast"""
+    times: List[str]
+    model_version: str
+    sites: List[ForecastSiteResult]
+
+
+class PortfolioSite(BaseModel):
+    """One site of a portfolio; readings left out are fetched or taken from the fleet defaults"""
+    id: Optional[str] = None
+    name: Optional[str] = None
+    latitude: float
+    longitude: float
+    # Panel area, to add the per-m2 prediction up to a fleet total
+    area_m2: Optional[float] = None
+
+    pm25: Optional[float] = None
+    pm25_lag1: Optional[float] = None
+    ac_power_lag1: Optional[float] = None
+    power_factor_lag1: Optional[float] = None
+
+
+class PortfolioRequest(BaseModel):
+    """Request model for a multi-site prediction; no sites means the stored site registry"""
+    sites: Optional[List[PortfolioSite]] = None
+    hour: int
+    month: int
+
+    # Fleet-wide defaults for sites that don't give their own lags
+    ac_power_lag1: float = DEFAULT_AC_POWER_LAG1
+    power_factor_lag1: float = DEFAULT_POWER_FACTOR_LAG1
+
+
+class PortfolioSiteResult(BaseModel):
+    """Prediction, or the reason there is none, for one site"""
+    id: Optional[str] = None
+    name: Optional[str] = None
+    latitude: float
+    longitude: float
+    area_m2: Optional[float] = None
+    pm25: Optional[float] = None
+    predicted_power: Optional[float] = None
+    model: Optional[str] = None
+    error: Optional[str] = None
+
+
+class PortfolioAggregate(BaseModel):
+    """Totals over the sites that were scored"""
+    sites: int
+    succeeded: int
+    failed: int
+    mean_power: Optional[float] = None
+    total_power: Optional[float] = None
+
+
+class PortfolioResponse(BaseModel):
+    """Response model for a multi-site prediction"""
+    model_version: str
+    sites: List[PortfolioSiteResult]
+    aggregate: PortfolioAggregate
+
+
+class Reading(BaseModel):
+    """One hourly reading of a live site; lag columns are derived on ingestion"""
+    datetime: datetime
+    ac_power: Optional[float] = None
+    power_factor: Optional[float] = None
+    pm25: Optional[float] = None
+    allsky_sfc_sw_dwn: Optional[float] = None
+    allsky_kt: Optional[float] = None
+    t2m: Optional[float] = None
+    ws10m: Optional[float] = None
+    # Derived from the site's coordinates when left out
+    sza: Optional[float] = None
+
+    # Used only when the site has no reading one hour earlier
+    pm25_lag1: Optional[float] = None
+    t2m_lag1: Optional[float] = None
+
+
+class IngestRequest(BaseModel):
+    """Request model for appending a site's readings"""
+    site_id: str
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    # Timezone of the stored (naive) timestamps; aware datetimes are converted to it
+    timezone: str = "UTC"
+    readings: List[Reading]
+
+
+class SiteStatus(BaseModel):
+    """Ingested readings of a site and the lag inputs of its next hour"""
+    site_id: str
+    rows: int
+    latest: Optional[str] = None
+    next: Optional[dict] = None
+
+
+class IngestResponse(SiteStatus):
+    """Response model for an ingestion request"""
+    accepted: int
+    skipped: int
@@ -1,77 +1,248 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Header, HTTPException, Query, Response
+import numpy as np
+import orjson
 import pandas as pd
 import os
 from datetime import datetime
+from typing import Optional
+from app.services.backtest import backtest_store
+from app.services.dataset import merged_data
+from app.services.downsample import minmax_indices
+from app.services.encoding import (ARROW, COLUMNS, JSON, MEDIA_TYPES, PARQUET, UnsupportedFormatError, encode_columns,
+                                   negotiate)
+from app.services.executor import PoolSaturatedError, work_pool
+from app.services.ingest import SiteNotFoundError, ingest_store
+from app.services.metrics import RESAMPLE, SERIALIZE, stage
+from app.services.model_registry import ModelsUnavailableError, model_registry
 
 router = APIRouter(prefix="/api/analytics", tags=["analytics"])
 
 # Path to the data file
-# Go up 4 levels: routes -> app -> backend -> Project root
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
-DATA_PATH = os.path.join(BASE_DIR, "data", "merged_data.csv")
+DATA_PATH = merged_data.path
+
+
+def format_history(times: pd.DatetimeIndex, power: np.ndarray, time_format: str, date_format: str):
+    """Build the history response list with vectorized date formatting"""
+    power = np.where(np.isnan(power), 0.0, power).tolist()
+    return [
+        {"time": t, "full_date": d, "power": p}
+        for t, d, p in zip(times.strftime(time_format), times.strftime(date_format), power)
+    ]
+
+
+# Output formats of /history, the list of points first (the default)
+HISTORY_FORMATS = (JSON, COLUMNS, ARROW, PARQUET)
+
+# Spacing of the points of each interval, as ISO 8601 durations
+INTERVAL_RESOLUTION = {'hour': 'PT1H', 'day': 'P1D', 'month': 'P1M'}
+
+# (time, full_date) label formats per interval
+INTERVAL_FORMATS = {
+    'month': ("%b", "%Y-%m"), # Jan, Feb, etc.
+    'day': ("%d", "%Y-%m-%d"), # 01, 02, etc.
+    'hour': ("%H:%M", "%Y-%m-%d %H:%M"),
+}
+
+
+def history_series(start: pd.Timestamp, end: pd.Timestamp, interval: str, max_points: int = None, site_id: str = None):
+    """
+    Mean AC power per interval bucket between start and end, from the
+    history file or, with `site_id`, from that site's ingested readings.
+
+    With `max_points`, longer series are thinned to at most that many
+    points by min/max bucketing. Returns (times, power, label formats,
+    resolution info).
+    """
+    with stage(RESAMPLE):
+        if site_id is not None:
+            # Rollups kept up to date as the site's readings are ingested
+            times, power = ingest_store.history(site_id, start, end, interval)
+        elif interval == 'month':
+            # Mean per Month Start bucket, combined from the precomputed rollups
+            times, power = merged_data.rollups().query('month', start, end, 'AC Power/m2')
+        elif interval == 'day':
+            # Mean per Day, combined from the precomputed rollups
+            times, power = merged_data.rollups().query('day', start, end, 'AC Power/m2')
+        else: # hour
+            # Raw rows from the cached, time-sorted data (reloaded only if the file changed)
+            rows = merged_data.range(start, end, columns=['AC Power/m2'])
+            times, power = rows.index, rows['AC Power/m2'].to_numpy()
+        formats = INTERVAL_FORMATS.get(interval, INTERVAL_FORMATS['hour'])
+
+        info = {"total": len(times), "resolution": INTERVAL_RESOLUTION.get(interval, 'PT1H')}
+        if max_points is not None and len(times) > max_points:
+            keep = minmax_indices(power, max_points)
+            # Each kept min/max pair stands for one bucket of the original span
+            buckets = max(max_points // 2, 1)
+            info["resolution"] = (pd.Timedelta(times[-1] - times[0]) / buckets).round("s").isoformat()
+            times, power = times[keep], power[keep]
+    return times, power, formats, info
+
+
+def history_points(start: pd.Timestamp, end: pd.Timestamp, interval: str, max_points: int = None, site_id: str = None):
+    """History as a list of {time, full_date, power} points; returns (points, resolution info)"""
+    times, power, formats, info = history_series(start, end, interval, max_points, site_id)
+    with stage(SERIALIZE):
+        return format_history(times, power, *formats), info
+
+
+def history_body(start: pd.Timestamp, end: pd.Timestamp, interval: str, max_points: int, fmt: str, site_id: str = None):
+    """
+    Encoded history response: the point list as JSON, or the time,
+    full_date and power columns in a columnar format. Returns (body, points, info).
+    """
+    if fmt == JSON:
+        points, info = history_points(start, end, interval, max_points, site_id)
+        with stage(SERIALIZE):
+            return orjson.dumps(points), len(points), info
+
+    times, power, (time_format, date_format), info = history_series(start, end, interval, max_points, site_id)
+    with stage(SERIALIZE):
+        columns = {
+            "time": times.strftime(time_format).to_numpy(dtype=object),
+            "full_date": times.strftime(date_format).to_numpy(dtype=object),
+            "power": np.where(np.isnan(power), 0.0, power),
+        }
+    return encode_columns(columns, fmt), len(times), info
 
 
 @router.get("/history")
 async def get_historical_data(
     start_date: str = Query(..., description="Start date in YYYY-MM-DD format"),
     end_date: str = Query(..., description="End date in YYYY-MM-DD format"),
-    interval: str = Query("hour", description="Aggregation interval: hour, day, month")
+    interval: str = Query("hour", description="Aggregation interval: hour, day, month"),
+    max_points: Optional[int] = Query(None, ge=2, description="Thin the series to at most this many points, keeping each bucket's min and max"),
+    output_format: Optional[str] = Query(None, alias="format", description="json (list of points), columns, arrow or parquet; overrides the Accept header"),
+    site_id: Optional[str] = Query(None, description="Site whose ingested readings to chart instead of the history file"),
+    accept: Optional[str] = Header(None),
 ):
-    if not os.path.exists(DATA_PATH):
+    if site_id is None and not os.path.exists(DATA_PATH):
         raise HTTPException(status_code=500, detail=f"Data file not found at {DATA_PATH}")
+    try:
+        fmt = negotiate(output_format, accept, HISTORY_FORMATS)
+    except UnsupportedFormatError as e:
+        raise HTTPException(status_code=406, detail=str(e))
 
     try:
-        # Read CSV
-        df = pd.read_csv(DATA_PATH)
-        
-        # Ensure datetime column is datetime objects
-        df['datetime'] = pd.to_datetime(df['datetime'])
-        
         # Parse query dates
         start = pd.to_datetime(start_date)
         end = pd.to_datetime(end_date) + pd.Timedelta(days=1) - pd.Timedelta(seconds=1) # Include the whole end day
-        
-        # Filter data
-        mask = (df['datetime'] >= start) & (df['datetime'] <= end)
-        filtered_df = df.loc[mask].copy()
-        
-        if filtered_df.empty:
-            return []
-
-        # Sort by date
-        filtered_df.sort_values('datetime', inplace=True)
-        
-        result = []
-        
-        if interval == 'month':
-            # Resample by Month Start and calculate mean
-            # Using 'MS' for Month Start
-            resampled = filtered_df.set_index('datetime').resample('MS')['AC Power/m2'].mean().reset_index()
-            for _, row in resampled.iterrows():
-                result.append({
-                    "time": row['datetime'].strftime("%b"), # Jan, Feb, etc.
-                    "full_date": row['datetime'].strftime("%Y-%m"),
-                    "power": float(row['AC Power/m2']) if pd.notnull(row['AC Power/m2']) else 0.0
-                })
-        elif interval == 'day':
-            # Resample by Day and calculate mean
-            resampled = filtered_df.set_index('datetime').resample('D')['AC Power/m2'].mean().reset_index()
-            for _, row in resampled.iterrows():
-                result.append({
-                    "time": row['datetime'].strftime("%d"), # 01, 02, etc.
-                    "full_date": row['datetime'].strftime("%Y-%m-%d"),
-                    "power": float(row['AC Power/m2']) if pd.notnull(row['AC Power/m2']) else 0.0
-                })
-        else: # hour
-            # Select relevant columns and format
-            for _, row in filtered_df.iterrows():
-                result.append({
-                    "time": row['datetime'].strftime("%H:%M"),
-                    "full_date": row['datetime'].strftime("%Y-%m-%d %H:%M"),
-                    "power": float(row['AC Power/m2']) if pd.notnull(row['AC Power/m2']) else 0.0
-                })
-            
-        return result
 
+        # Loading, slicing and formatting are pandas work; keep them off the event loop
+        body, returned, info = await work_pool.run(history_body, start, end, interval, max_points, fmt, site_id)
+        return Response(content=body, media_type=MEDIA_TYPES[fmt], headers={
+            "X-Points-Total": str(info["total"]),
+            "X-Points-Returned": str(returned),
+            "X-Resolution": info["resolution"],
+        })
+
+    except PoolSaturatedError:
+        raise HTTPException(status_code=503, detail="Server is busy, please retry shortly.", headers={"Retry-After": "1"})
+    except SiteNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _nullable(values: np.ndarray) -> list:
+    """Values as a list with NaN turned into None (JSON null)"""
+    return [None if v != v else v for v in values.tolist()]
+
+
+def backtest_points(start: pd.Timestamp, end: pd.Timestamp, interval: str):
+    """Actual vs. predicted AC power per interval bucket, from the backtest store"""
+    backtest = backtest_store.current(model_registry.get())
+    with stage(RESAMPLE):
+        times, values = backtest.series(start, end, interval)
+
+    with stage(SERIALIZE):
+        time_format, date_format = INTERVAL_FORMATS[interval]
+        actual, predicted, residual = (_nullable(values[col]) for col in ('actual', 'predicted', 'residual'))
+        return [
+            {"time": t, "full_date": d, "actual": a, "predicted": p, "residual": r}
+            for t, d, a, p, r in zip(times.strftime(time_format), times.strftime(date_format), actual, predicted, residual)
+        ]
+
+
+def _errors(rows: int, abs_sum: float, sq_sum: float) -> dict:
+    if not rows:
+        return {"rows": 0, "mae": None, "rmse": None}
+    return {"rows": int(rows), "mae": abs_sum / rows, "rmse": float(np.sqrt(sq_sum / rows))}
+
+
+def _split_errors(rows: np.ndarray, abs_sums: np.ndarray, sq_sums: np.ndarray) -> dict:
+    """Errors over all rows, then per model (column 0 LGBM, column 1 LogReg)"""
+    return {
+        **_errors(rows.sum(), abs_sums.sum(), sq_sums.sum()),
+        "lgbm": _errors(rows[0], abs_sums[0], sq_sums[0]),
+        "logreg": _errors(rows[1], abs_sums[1], sq_sums[1]),
+    }
+
+
+def backtest_errors(start: pd.Timestamp, end: pd.Timestamp, interval: str) -> dict:
+    """MAE/RMSE per interval bucket and overall, split by LGBM vs. LogReg routing"""
+    backtest = backtest_store.current(model_registry.get())
+    with stage(RESAMPLE):
+        starts, rows, abs_sums, sq_sums = backtest.error_metrics(start, end, interval)
+
+    time_format, date_format = INTERVAL_FORMATS[interval]
+    buckets = [
+        {"time": t, "full_date": d, **_split_errors(rows[i], abs_sums[i], sq_sums[i])}
+        for i, (t, d) in enumerate(zip(starts.strftime(time_format), starts.strftime(date_format)))
+    ]
+    return {
+        "model_version": backtest.model_version,
+        "interval": interval,
+        "overall": _split_errors(rows.sum(axis=0), abs_sums.sum(axis=0), sq_sums.sum(axis=0)),
+        "buckets": buckets,
+    }
+
+
+async def _run_backtest(fn, start_date: str, end_date: str, interval: str):
+    try:
+        start = pd.to_datetime(start_date)
+        end = pd.to_datetime(end_date) + pd.Timedelta(days=1) - pd.Timedelta(seconds=1) # Include the whole end day
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid date: {e}")
+
+    try:
+        # The first call after a data or model change (re)scores rows; keep it off the event loop
+        return await work_pool.run(fn, start, end, interval)
+    except PoolSaturatedError:
+        raise HTTPException(status_code=503, detail="Server is busy, please retry shortly.", headers={"Retry-After": "1"})
+    except ModelsUnavailableError:
+        raise HTTPException(status_code=500, detail="Models not loaded properly on server.")
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=500, detail=f"Data file not found: {e.filename}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/backtest")
+async def get_backtest_series(
+    start_date: str = Query(..., description="Start date in YYYY-MM-DD format"),
+    end_date: str = Query(..., description="End date in YYYY-MM-DD format"),
+    interval: str = Query("hour", description="Aggregation interval: hour, day, month")
+):
+    """Actual vs. predicted AC power (and residual, actual - predicted) over the history data"""
+    if interval not in INTERVAL_FORMATS:
+        raise HTTPException(status_code=400, detail="interval must be one of: hour, day, month")
+    return await _run_backtest(backtest_points, start_date, end_date, interval)
+
+
+@router.get("/backtest/metrics")
+async def get_backtest_metrics(
+    start_date: str = Query(..., description="Start date in YYYY-MM-DD format"),
+    end_date: str = Query(..., description="End date in YYYY-MM-DD format"),
+    interval: str = Query("day", description="Error buckets: day, month")
+):
+    """Prediction errors over the history data, per day or month and by the model that scored each row"""
+    if interval not in ('day', 'month'):
+        raise HTTPException(status_code=400, detail="interval must be one of: day, month")
+    return await _run_backtest(backtest_errors, start_date, end_date, interval)
+
+
+@router.get("/backtest/status")
+async def get_backtest_status():
+    """Model version, source file and row counts of the loaded backtest"""
+    return backtest_store.status()
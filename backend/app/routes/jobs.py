@@ -0,0 +1,72 @@
+import logging
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from app.services.batch import DEFAULT_STREAM_CHUNK_ROWS
+from app.services.jobs import DONE, BatchJobRunner, get_job_runner
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api/jobs", tags=["jobs"])
+
+
+def get_job_or_404(job_id: str, runner: BatchJobRunner) -> dict:
+    job = runner.store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found.")
+    return job
+
+
+@router.post("/batch", status_code=202)
+async def submit_batch_job(
+    file: UploadFile = File(...),
+    chunk_size: int = Query(DEFAULT_STREAM_CHUNK_ROWS, ge=1, description="Rows parsed and scored per chunk"),
+    latitude: Optional[float] = Query(None, description="Site latitude, used to derive SZA when the CSV has none"),
+    longitude: Optional[float] = Query(None, description="Site longitude, used to derive SZA when the CSV has none"),
+    timezone: str = Query("UTC", description="Timezone of naive timestamps when deriving SZA"),
+    runner: BatchJobRunner = Depends(get_job_runner)
+):
+    """Queue a batch prediction CSV; poll the returned job for progress and fetch the result when done"""
+    if not file.filename.endswith('.csv'):
+        raise HTTPException(status_code=400, detail="Only CSV files are supported.")
+
+    params = {"chunk_size": chunk_size, "latitude": latitude, "longitude": longitude, "timezone": timezone}
+    try:
+        return await run_in_threadpool(runner.submit, file.file, file.filename, params)
+    except OSError as e:
+        logger.error("Error spooling batch upload: %s", e)
+        raise HTTPException(status_code=500, detail=f"Could not store upload: {str(e)}")
+
+
+@router.get("")
+async def list_jobs(
+    limit: int = Query(50, ge=1, le=500),
+    runner: BatchJobRunner = Depends(get_job_runner)
+):
+    """Most recent jobs first"""
+    return await run_in_threadpool(runner.store.list, limit)
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: str, runner: BatchJobRunner = Depends(get_job_runner)):
+    """Status and progress of one job"""
+    return await run_in_threadpool(get_job_or_404, job_id, runner)
+
+
+@router.post("/{job_id}/cancel")
+async def cancel_job(job_id: str, runner: BatchJobRunner = Depends(get_job_runner)):
+    """Cancel a queued or running job; finished jobs are left as they are"""
+    job = await run_in_threadpool(runner.store.cancel, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found.")
+    return job
+
+
+@router.get("/{job_id}/result")
+async def download_job_result(job_id: str, runner: BatchJobRunner = Depends(get_job_runner)):
+    """The scored CSV of a finished job"""
+    job = await run_in_threadpool(get_job_or_404, job_id, runner)
+    if job["status"] != DONE:
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is {job['status']}, no result to download.")
+    return FileResponse(runner.store.result_path(job_id), media_type="text/csv", filename="predictions.csv")
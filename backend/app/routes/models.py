@@ -0,0 +1,59 @@
+import hmac
+import os
+import time
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from app.services.executor import work_pool
+from app.services.model_registry import ModelsUnavailableError, model_registry
+
+router = APIRouter(prefix="/api/models", tags=["models"])
+
+# Token POST /api/models/reload requires in the X-Admin-Token header; unset disables the endpoint
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+# Seconds after a load (forced or by the watcher) before the same artifacts can be forced in again
+RELOAD_MIN_INTERVAL = float(os.getenv("MODEL_RELOAD_MIN_INTERVAL", "30"))
+
+
+def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Model reload is disabled: set ADMIN_TOKEN on the server to enable it")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Missing or invalid X-Admin-Token")
+
+
+@router.get("")
+async def get_model_status():
+    """Loaded model version, per-model load/warm-up time and memory"""
+    return model_registry.status()
+
+
+@router.post("/reload", dependencies=[Depends(require_admin_token)])
+async def reload_models():
+    """
+    Reload the artifacts in models/ (requires X-Admin-Token).
+
+    Changed artifacts are loaded right away, as the watcher would. The same
+    artifacts are only loaded again once MODEL_RELOAD_MIN_INTERVAL seconds
+    have passed since the last load; before that the answer is a 429.
+    Artifacts that fail to load leave the current version serving, with the
+    error in `last_error`.
+    """
+    previous = model_registry.status()
+    age = time.time() - previous["loaded_at"] if previous["loaded"] else None
+    force = age is None or age >= RELOAD_MIN_INTERVAL
+    try:
+        bundle = await run_in_threadpool(model_registry.reload, force)
+    except ModelsUnavailableError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not force and bundle.loaded_at == previous["loaded_at"] and model_registry.last_error is None:
+        retry = max(int(RELOAD_MIN_INTERVAL - age) + 1, 1)
+        raise HTTPException(status_code=429, detail=f"Models were loaded {age:.0f}s ago and haven't changed",
+                            headers={"Retry-After": str(retry)})
+    return model_registry.status()
+
+
+@router.get("/pool")
+async def get_pool_status():
+    """Work pool kind, size and admission counters"""
+    return work_pool.status()
@@ -1,163 +1,146 @@
-import requests
-import math
+import asyncio
+import itertools
+import logging
 import numpy as np
 import pandas as pd
-import joblib
-import lightgbm as lgb
-import os
-import io
-from fastapi import APIRouter, HTTPException, UploadFile, File
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, UploadFile, File, Query
 from fastapi.responses import StreamingResponse
-from app.models.schemas import PredictionRequest, PredictionResponse
+from app.models.schemas import (ForecastRequest, ForecastResponse, PortfolioRequest, PortfolioResponse, PortfolioSite,
+                                PredictionRequest, PredictionResponse)
+from app.services.model_registry import ModelBundle, ModelsUnavailableError, model_registry
+from app.services.air_quality import PM25Provider, get_pm25_provider
+from app.services.weather import LOCATION_MODE_DATES, WeatherProvider, get_weather_provider, location_weather
+from app.services.features import build_feature_vector
+from app.services.batcher import batcher
+from app.services.executor import PoolSaturatedError, WorkPool, get_work_pool
+from app.services.prediction_cache import prediction_cache
+from app.services.batch import (BatchFormatError, DEFAULT_STREAM_CHUNK_ROWS, iter_csv_bytes, iter_prediction_chunks,
+                                iter_selected_columns, parse_columns)
+from app.services.encoding import (ARROW, COLUMNS, CSV, MEDIA_TYPES, PARQUET, UnsupportedFormatError, iter_frame_arrow,
+                                   iter_frame_columns_json, iter_frame_parquet, negotiate)
+from app.services.forecast import (FORECAST_MAX_HOURS, FORECAST_MAX_SITES, forecast_times, recursive_forecast,
+                                   weather_dates, weather_matrix)
+from app.services.ingest import SiteNotFoundError, ingest_store
+from app.services.log import sampled
+from app.services.portfolio import (PORTFOLIO_CONCURRENCY, PORTFOLIO_MAX_SITES, SiteInputError, aggregate, gather_bounded,
+                                    score_sites, site_features, site_inputs, site_registry)
+from app.services.metrics import FEATURE_BUILD, INFERENCE, count_routing, stage
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api", tags=["prediction"])
 
-# Load Models
-try:
-    # backend/app/routes/predict.py -> backend/
-    BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    MODELS_DIR = os.path.join(BASE_DIR, "../models")
-    
-    LGBM_PATH = os.path.join(MODELS_DIR, "lgb_shallow_model.pkl")
-    LOG_REG_PATH = os.path.join(MODELS_DIR, "log_reg_pipeline.pkl")
-    
-    print(f"Loading models from: {MODELS_DIR}")
-    
-    lgbm_model = joblib.load(LGBM_PATH)
-    log_reg_model = joblib.load(LOG_REG_PATH)
-    print("Models loaded successfully.")
-except Exception as e:
-    print(f"Error loading models: {e}")
-    # We don't raise here to allow the app to start, but prediction will fail if models aren't loaded
-    lgbm_model = None
-    log_reg_model = None
+# Output formats of /predict/batch (CSV unless asked otherwise), with their serializers
+BATCH_FORMATS = (CSV, COLUMNS, ARROW, PARQUET)
+BATCH_ENCODERS = {
+    CSV: iter_csv_bytes,
+    COLUMNS: iter_frame_columns_json,
+    ARROW: iter_frame_arrow,
+    PARQUET: iter_frame_parquet,
+}
+BATCH_EXTENSIONS = {CSV: "csv", COLUMNS: "json", ARROW: "arrow", PARQUET: "parquet"}
 
-@router.post("/predict/batch")
-async def predict_batch(file: UploadFile = File(...)):
-    if lgbm_model is None or log_reg_model is None:
+def get_models() -> ModelBundle:
+    """Current model bundle; loaded lazily, so a failed load is retried on the next request"""
+    try:
+        return model_registry.get()
+    except ModelsUnavailableError:
         raise HTTPException(status_code=500, detail="Models not loaded properly on server.")
-    
+
+
+def server_busy(e: PoolSaturatedError) -> HTTPException:
+    logger.warning("Rejecting request, work pool saturated: %s", e)
+    return HTTPException(status_code=503, detail="Server is busy, please retry shortly.", headers={"Retry-After": "1"})
+
+
+@router.get("/predict/cache")
+async def get_prediction_cache():
+    """Hit/miss counters and size of the single-prediction cache"""
+    return prediction_cache.stats()
+
+
+@router.post("/predict/batch")
+async def predict_batch(
+    file: UploadFile = File(...),
+    chunk_size: int = Query(DEFAULT_STREAM_CHUNK_ROWS, ge=1, description="Rows parsed and scored per streamed chunk"),
+    latitude: Optional[float] = Query(None, description="Site latitude, used to derive SZA when the CSV has none"),
+    longitude: Optional[float] = Query(None, description="Site longitude, used to derive SZA when the CSV has none"),
+    timezone: str = Query("UTC", description="Timezone of naive timestamps when deriving SZA"),
+    output_format: Optional[str] = Query(None, alias="format", description="csv, columns, arrow or parquet; overrides the Accept header"),
+    columns: Optional[str] = Query(None, description="Comma-separated output columns, e.g. row,Predicted_Power ('row' is the input row number)"),
+    accept: Optional[str] = Header(None),
+    models: ModelBundle = Depends(get_models),
+    pool: WorkPool = Depends(get_work_pool)
+):
+    """
+    Score an uploaded CSV, streaming the predictions back chunk by chunk.
+
+    Missing columns and bad values in the first chunk are answered with a
+    400 before anything is sent. A bad value further down the file is only
+    found when its chunk is reached; the status line has been sent by then,
+    so the response is cut off early and the client sees a truncated body.
+    """
     if not file.filename.endswith('.csv'):
         raise HTTPException(status_code=400, detail="Only CSV files are supported.")
-    
     try:
-        contents = await file.read()
-        df = pd.read_csv(io.BytesIO(contents))
-        
-        # Required features (excluding AC Power and Cyclic features which are handled dynamically)
-        base_required_features = ['PM25', 'ALLSKY_SFC_SW_DWN', 'ALLSKY_KT', 'T2M', 'WS10M', 'SZA', 'T2M_Lag1', 'PM25_Lag1', 'power_factor_Lag1']
-        
-        # Check for missing base columns
-        missing_cols = [col for col in base_required_features if col not in df.columns]
-        if missing_cols:
-             raise HTTPException(status_code=400, detail=f"Missing columns in CSV: {missing_cols}")
-
-        # Handle Cyclic Features
-        cyclic_features = ['Hour_sin', 'Hour_cos', 'Month_sin', 'Month_cos']
-        if not all(col in df.columns for col in cyclic_features):
-            # Try to calculate them from Hour and Month
-            # Normalize column names if needed
-            if 'hour' in df.columns and 'Hour' not in df.columns: df.rename(columns={'hour': 'Hour'}, inplace=True)
-            if 'month' in df.columns and 'Month' not in df.columns: df.rename(columns={'month': 'Month'}, inplace=True)
-
-            # Check for datetime column if Hour/Month are missing
-            if ('Hour' not in df.columns or 'Month' not in df.columns):
-                datetime_col = None
-                if 'datetime' in df.columns: datetime_col = 'datetime'
-                elif 'timestamp' in df.columns: datetime_col = 'timestamp'
-                elif 'Date' in df.columns: datetime_col = 'Date'
-                
-                if datetime_col:
-                    try:
-                        df[datetime_col] = pd.to_datetime(df[datetime_col])
-                        if 'Hour' not in df.columns:
-                            df['Hour'] = df[datetime_col].dt.hour
-                        if 'Month' not in df.columns:
-                            df['Month'] = df[datetime_col].dt.month
-                    except Exception as e:
-                        print(f"Error parsing datetime column: {e}")
-
-            if 'Hour' in df.columns and 'Month' in df.columns:
-                 df['Hour_sin'] = np.sin(2 * np.pi * df['Hour'] / 24)
-                 df['Hour_cos'] = np.cos(2 * np.pi * df['Hour'] / 24)
-                 df['Month_sin'] = np.sin(2 * np.pi * df['Month'] / 12)
-                 df['Month_cos'] = np.cos(2 * np.pi * df['Month'] / 12)
-            else:
-                 raise HTTPException(status_code=400, detail="Missing cyclic features (Hour_sin, etc.) and missing 'Hour'/'Month' or 'datetime' columns to calculate them.")
-        
-        # Handle AC Power column
-        ac_power_col = None
-        if 'AC_Power/m2_Lag1' in df.columns:
-            ac_power_col = 'AC_Power/m2_Lag1'
-        elif 'AC Power/m2_Lag1' in df.columns:
-            ac_power_col = 'AC Power/m2_Lag1'
-        elif 'AC_Power_Lag1' in df.columns:
-             # Rename to what models expect temporarily
-             df['AC_Power/m2_Lag1'] = df['AC_Power_Lag1']
-             df['AC Power/m2_Lag1'] = df['AC_Power_Lag1']
-             ac_power_col = 'AC_Power/m2_Lag1' # Default to one
-        else:
-             raise HTTPException(status_code=400, detail="Missing AC Power Lag1 column (expected 'AC_Power/m2_Lag1' or 'AC Power/m2_Lag1')")
-
-        # Ensure both variants exist for the models
-        if 'AC_Power/m2_Lag1' not in df.columns:
-             df['AC_Power/m2_Lag1'] = df[ac_power_col]
-        if 'AC Power/m2_Lag1' not in df.columns:
-             df['AC Power/m2_Lag1'] = df[ac_power_col]
-
-        # Fill NaNs for Lag features with reasonable defaults
-        # This is crucial for the first row or missing data to avoid "off" predictions or errors
-        df['AC_Power/m2_Lag1'] = df['AC_Power_Lag1'].fillna(0.0) if 'AC_Power_Lag1' in df.columns else df['AC_Power/m2_Lag1'].fillna(0.0)
-        df['AC Power/m2_Lag1'] = df['AC Power/m2_Lag1'].fillna(0.0)
-        
-        if 'power_factor_Lag1' in df.columns:
-            df['power_factor_Lag1'] = df['power_factor_Lag1'].fillna(0.95) # Default to 0.95 if missing
-        
-        if 'PM25_Lag1' in df.columns:
-             df['PM25_Lag1'] = df['PM25_Lag1'].fillna(method='bfill').fillna(0.0) # Backfill then 0
-             
-        if 'T2M_Lag1' in df.columns:
-             df['T2M_Lag1'] = df['T2M_Lag1'].fillna(method='bfill').fillna(25.0) # Backfill then 25C
+        fmt = negotiate(output_format, accept, BATCH_FORMATS)
+    except UnsupportedFormatError as e:
+        raise HTTPException(status_code=406, detail=str(e))
+    selected = parse_columns(columns)
 
-        predictions = []
-        
-        # Iterate through rows
-        for index, row in df.iterrows():
-            pm25_val = row['PM25']
-            
-            if pm25_val <= 35:
-                # Use LGBM
-                lgbm_cols = ['PM25', 'ALLSKY_SFC_SW_DWN', 'ALLSKY_KT', 'T2M', 'WS10M', 'SZA', 'T2M_Lag1', 'PM25_Lag1', 'AC_Power/m2_Lag1', 'power_factor_Lag1', 'Hour_sin', 'Hour_cos', 'Month_sin', 'Month_cos']
-                # Create single row dataframe
-                row_df = pd.DataFrame([row[lgbm_cols]])
-                pred = lgbm_model.predict(row_df)[0]
-            else:
-                # Use LogReg
-                logreg_cols = ['PM25', 'ALLSKY_SFC_SW_DWN', 'ALLSKY_KT', 'T2M', 'WS10M', 'SZA', 'T2M_Lag1', 'PM25_Lag1', 'AC Power/m2_Lag1', 'power_factor_Lag1', 'Hour_sin', 'Hour_cos', 'Month_sin', 'Month_cos']
-                row_df = pd.DataFrame([row[logreg_cols]])
-                pred = log_reg_model.predict(row_df)[0]
-            
-            predictions.append(pred)
-            
-        df['Predicted_Power'] = predictions
-        
-        # Convert back to CSV
-        stream = io.StringIO()
-        df.to_csv(stream, index=False)
-        response = StreamingResponse(iter([stream.getvalue()]), media_type="text/csv")
-        response.headers["Content-Disposition"] = "attachment; filename=predictions.csv"
-        return response
+    try:
+        # Parse the spooled upload lazily, one chunk of rows at a time
+        reader = pd.read_csv(file.file, chunksize=chunk_size)
+        frames = iter_prediction_chunks(reader, models.lgbm, models.log_reg, latitude=latitude, longitude=longitude, timezone=timezone,
+                                        predict=lambda frame: pool.predict_frame(frame, models))
+        if selected:
+            frames = iter_selected_columns(frames, selected)
 
+        # Score the first chunk up front so format errors still map to a proper status code
+        first = await pool.run(next, frames, None)
+    except PoolSaturatedError as e:
+        raise server_busy(e)
+    except BatchFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        print(f"Batch prediction error: {e}")
+        logger.error("Batch prediction error: %s", e)
         raise HTTPException(status_code=500, detail=f"Batch prediction error: {str(e)}")
 
+    encoded = BATCH_ENCODERS[fmt](itertools.chain([first] if first is not None else [], frames))
+
+    async def stream():
+        try:
+            # Parse, score and serialize each chunk on the pool; the job was admitted above,
+            # so later chunks are never turned away halfway through the response
+            while (chunk := await pool.run(next, encoded, None, admit=False)) is not None:
+                yield chunk
+        except Exception as e:
+            # Headers are already sent at this point, so all we can do is stop the stream
+            logger.error("Batch prediction error: %s", e)
+            raise
+
+    response = StreamingResponse(stream(), media_type=MEDIA_TYPES[fmt])
+    response.headers["Content-Disposition"] = f"attachment; filename=predictions.{BATCH_EXTENSIONS[fmt]}"
+    return response
+
 @router.post("/predict", response_model=PredictionResponse)
-async def predict_power(request: PredictionRequest):
-    print("Received Prediction Request:", request.model_dump())
-    
-    if lgbm_model is None or log_reg_model is None:
-        raise HTTPException(status_code=500, detail="Models not loaded properly on server.")
+async def predict_power(
+    request: PredictionRequest,
+    weather: WeatherProvider = Depends(get_weather_provider),
+    models: ModelBundle = Depends(get_models),
+    pool: WorkPool = Depends(get_work_pool)
+):
+    """
+    Predict AC power for one hour. Lags left out of the request are taken
+    from the latest reading ingested for `site_id`, but only when `hour`
+    and `month` are those of the hour right after that reading (the site's
+    `next` in /api/readings/sites/{site_id}); otherwise they must be sent.
+    """
+    # Per-request details are only logged for a sampled share of requests (none by default)
+    debug = sampled()
+    if debug:
+        logger.info("Received prediction request", extra={"request": request.model_dump()})
 
     # Initialize variables
     allsky_sfc_sw_dwn = 0.0
@@ -167,6 +150,32 @@ async def predict_power(request: PredictionRequest):
     ws10m = 0.0
     
     t2m_lag1 = 0.0
+
+    # Lags not sent come from the latest reading ingested for the site, if
+    # the request is for the hour after it
+    site_lags = {}
+    upcoming = None
+    if request.site_id is not None:
+        try:
+            upcoming = ingest_store.site(request.site_id).status()["next"]
+        except SiteNotFoundError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        if upcoming is not None and (request.hour, request.month) == (upcoming["hour"], upcoming["month"]):
+            site_lags = upcoming
+    lags = {}
+    for name in ("pm25_lag1", "ac_power_lag1", "power_factor_lag1"):
+        lags[name] = getattr(request, name)
+        if lags[name] is None:
+            lags[name] = site_lags.get(name)
+        if lags[name] is None:
+            if request.site_id is None:
+                detail = f"{name} required (or a site_id with ingested readings)"
+            elif upcoming is not None and not site_lags:
+                detail = (f"{name} required: site '{request.site_id}' lags only apply to the hour after its latest reading "
+                          f"({upcoming['datetime']}, hour {upcoming['hour']}, month {upcoming['month']})")
+            else:
+                detail = f"{name} required: site '{request.site_id}' has no value for it in its latest reading"
+            raise HTTPException(status_code=400, detail=detail)
     
     # NASA API Logic
     if request.is_location_mode:
@@ -175,53 +184,20 @@ async def predict_power(request: PredictionRequest):
             
         lat = request.latitude
         long = request.longitude
-        
-        # Hardcoded dates as per instructions
-        start_date = "20250101"
-        end_date = "20250102"
-        
-        url = (
-            "https://power.larc.nasa.gov/api/temporal/hourly/point"
-            f"?parameters=ALLSKY_SFC_SW_DWN,ALLSKY_KT,T2M,SZA,WS10M"
-            "&community=RE"
-            f"&latitude={lat}"
-            f"&longitude={long}"
-            f"&start={start_date}"
-            f"&end={end_date}"
-            "&format=JSON"
-        )
+        start_date, end_date = LOCATION_MODE_DATES
         
         try:
-            response = requests.get(url)
-            response.raise_for_status()
-            data = response.json()
+            # Cached per site and date range, so every hour of the day reuses one fetch
+            properties = await weather.hourly(lat, long, start_date, end_date)
             
-            properties = data.get("properties", {}).get("parameter", {})
-            
-            # Construct keys
             # Assuming we use the first day (start_date) for the 'hour'
-            target_key = f"{start_date}{request.hour:02d}"
-            
-            # Determine previous key
-            if request.hour == 8:
-                prev_key = target_key # Edge case: repeat 08:00 value
-            else:
-                if request.hour == 0:
-                     prev_key = target_key
-                else:
-                     prev_key = f"{start_date}{request.hour-1:02d}"
-            
-            # Extract values
-            def get_val(param, key):
-                return properties.get(param, {}).get(key, 0.0)
-            
-            allsky_sfc_sw_dwn = get_val("ALLSKY_SFC_SW_DWN", target_key)
-            allsky_kt = get_val("ALLSKY_KT", target_key)
-            t2m = get_val("T2M", target_key)
-            sza = get_val("SZA", target_key)
-            ws10m = get_val("WS10M", target_key)
-            
-            t2m_lag1 = get_val("T2M", prev_key)
+            values = location_weather(properties, start_date, request.hour)
+            allsky_sfc_sw_dwn = values["allsky_sfc_sw_dwn"]
+            allsky_kt = values["allsky_kt"]
+            t2m = values["t2m"]
+            sza = values["sza"]
+            ws10m = values["ws10m"]
+            t2m_lag1 = values["t2m_lag1"]
             
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error fetching NASA data: {str(e)}")
@@ -234,93 +210,179 @@ async def predict_power(request: PredictionRequest):
         sza = request.sza or 0.0
         ws10m = request.ws10m or 0.0
         
-        # For manual mode, use provided lag1 or fallback to current t2m
-        t2m_lag1 = request.t2m_lag1 if request.t2m_lag1 is not None else t2m
+        # For manual mode, use provided lag1, then the site's latest reading, then current t2m
+        t2m_lag1 = next((v for v in (request.t2m_lag1, site_lags.get("t2m_lag1")) if v is not None), t2m)
 
-    # Calculate Cyclic Features
-    # Hour is 0-23?
-    hour_sin = math.sin(2 * math.pi * request.hour / 24)
-    hour_cos = math.cos(2 * math.pi * request.hour / 24)
-    
-    # Month is 1-12?
-    month_sin = math.sin(2 * math.pi * request.month / 12)
-    month_cos = math.cos(2 * math.pi * request.month / 12)
-    
-    # Construct Feature Dictionary
-    # Common features
-    feature_data = {
-        'PM25': [request.pm25],
-        'ALLSKY_SFC_SW_DWN': [allsky_sfc_sw_dwn],
-        'ALLSKY_KT': [allsky_kt],
-        'T2M': [t2m],
-        'WS10M': [ws10m],
-        'SZA': [sza],
-        'T2M_Lag1': [t2m_lag1],
-        'PM25_Lag1': [request.pm25_lag1],
-        # AC Power Lag1 key differs between models
-        'power_factor_Lag1': [request.power_factor_lag1],
-        'Hour_sin': [hour_sin],
-        'Hour_cos': [hour_cos],
-        'Month_sin': [month_sin],
-        'Month_cos': [month_cos]
-    }
-
-    predicted_power = 0.0
+    # Single feature row in model column order (cyclic encodings come from lookup tables)
+    with stage(FEATURE_BUILD):
+        features = build_feature_vector(
+            pm25=request.pm25,
+            allsky_sfc_sw_dwn=allsky_sfc_sw_dwn,
+            allsky_kt=allsky_kt,
+            t2m=t2m,
+            ws10m=ws10m,
+            sza=sza,
+            t2m_lag1=t2m_lag1,
+            pm25_lag1=lags["pm25_lag1"],
+            ac_power_lag1=lags["ac_power_lag1"],
+            power_factor_lag1=lags["power_factor_lag1"],
+            hour=request.hour,
+            month=request.month
+        )
 
     try:
-        if request.pm25 <= 25:
-            # Use LGBM Shallow Model
-            # Feature name: AC_Power/m2_Lag1
-            feature_data['AC_Power/m2_Lag1'] = [request.ac_power_lag1]
-            
-            # Ensure correct order for LGBM
-            lgbm_cols = ['PM25', 'ALLSKY_SFC_SW_DWN', 'ALLSKY_KT', 'T2M', 'WS10M', 'SZA', 'T2M_Lag1', 'PM25_Lag1', 'AC_Power/m2_Lag1', 'power_factor_Lag1', 'Hour_sin', 'Hour_cos', 'Month_sin', 'Month_cos']
-            df = pd.DataFrame(feature_data)
-            df = df[lgbm_cols]
-            
-            # Predict
-            prediction = lgbm_model.predict(df)
-            predicted_power = float(prediction[0])
-            print(f"Used LGBM Shallow Model. Prediction: {predicted_power}")
-            
-        else:
-            # Use Log Reg Pipeline
-            # Feature name: AC Power/m2_Lag1
-            feature_data['AC Power/m2_Lag1'] = [request.ac_power_lag1]
-            
-            # Ensure correct order for LogReg (though pipeline might handle it if names match, but safer to order)
-            logreg_cols = ['PM25', 'ALLSKY_SFC_SW_DWN', 'ALLSKY_KT', 'T2M', 'WS10M', 'SZA', 'T2M_Lag1', 'PM25_Lag1', 'AC Power/m2_Lag1', 'power_factor_Lag1', 'Hour_sin', 'Hour_cos', 'Month_sin', 'Month_cos']
-            df = pd.DataFrame(feature_data)
-            df = df[logreg_cols]
-            
-            # Predict
-            prediction = log_reg_model.predict(df)
-            predicted_power = float(prediction[0])
-            print(f"Used LogReg Pipeline. Prediction: {predicted_power}")
+        # LGBM Shallow Model for PM2.5 <= 25, Log Reg Pipeline otherwise; scored
+        # together with any other requests arriving within a few milliseconds
+        cached = prediction_cache.get(features, models.version)
+        if cached is None:
+            pool.admit()
+            cached = await batcher.predict(features, models)
+            prediction_cache.set(features, models.version, cached)
+        predicted_power, model_name = cached
+        if debug:
+            logger.info("Prediction served", extra={"model": model_name, "prediction": predicted_power, "model_version": models.version})
 
+    except PoolSaturatedError as e:
+        raise server_busy(e)
     except Exception as e:
-        print(f"Prediction error: {e}")
+        logger.error("Prediction error: %s", e)
         raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
     
     # Construct features list for response (just values)
-    features_list = [
-        request.pm25,
-        allsky_sfc_sw_dwn,
-        allsky_kt,
-        t2m,
-        ws10m,
-        sza,
-        t2m_lag1,
-        request.pm25_lag1,
-        request.ac_power_lag1,
-        request.power_factor_lag1,
-        hour_sin,
-        hour_cos,
-        month_sin,
-        month_cos
-    ]
+    features_list = features[0].tolist()
 
     return PredictionResponse(
         predicted_power=predicted_power,
         features=features_list
     )
+
+
+def score_forecast(sites, series: dict, times: pd.DatetimeIndex, models: ModelBundle) -> np.ndarray:
+    """Stack every site's weather and current readings and run the recursive forecast (blocking)"""
+    with stage(FEATURE_BUILD):
+        matrices = {coord: weather_matrix(properties, times) for coord, properties in series.items()}
+        weather = np.stack([matrices[(site.latitude, site.longitude)] for site in sites])
+        readings = {
+            name: np.array([getattr(site, name) for site in sites], dtype=np.float64)
+            for name in ("pm25", "pm25_lag1", "ac_power_lag1", "power_factor_lag1")
+        }
+
+    with stage(INFERENCE):
+        predictions, lgbm_mask = recursive_forecast(weather, times, **readings,
+                                                    lgbm_model=models.lgbm, log_reg_model=models.log_reg)
+    lgbm_rows = int(lgbm_mask.sum())
+    count_routing(lgbm_rows, lgbm_mask.size - lgbm_rows)
+    return predictions
+
+
+@router.post("/predict/forecast", response_model=ForecastResponse)
+async def forecast_power(
+    request: ForecastRequest,
+    weather: WeatherProvider = Depends(get_weather_provider),
+    models: ModelBundle = Depends(get_models),
+    pool: WorkPool = Depends(get_work_pool)
+):
+    """
+    Hourly power for a whole horizon in one call, for one or more sites or
+    scenarios. Each step's predicted AC power is fed back as the next
+    step's lag on the server, instead of the client chaining /api/predict.
+    """
+    if not 1 <= len(request.sites) <= FORECAST_MAX_SITES:
+        raise HTTPException(status_code=400, detail=f"Between 1 and {FORECAST_MAX_SITES} sites required")
+    if not 1 <= request.hours <= FORECAST_MAX_HOURS:
+        raise HTTPException(status_code=400, detail=f"hours must be between 1 and {FORECAST_MAX_HOURS}")
+    if not 0 <= request.start_hour < 24:
+        raise HTTPException(status_code=400, detail="start_hour must be between 0 and 23")
+    try:
+        times = forecast_times(request.start_date, request.start_hour, request.hours)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start_date must be in YYYYMMDD format")
+
+    try:
+        pool.admit()
+        # One fetch per distinct coordinate covers the whole horizon; all of them run concurrently
+        coords = list(dict.fromkeys((site.latitude, site.longitude) for site in request.sites))
+        first_date, last_date = weather_dates(times)
+        properties = await asyncio.gather(*(weather.hourly(lat, lon, first_date, last_date) for lat, lon in coords))
+    except PoolSaturatedError as e:
+        raise server_busy(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching NASA data: {str(e)}")
+
+    try:
+        predictions = await pool.run(score_forecast, request.sites, dict(zip(coords, properties)), times, models, admit=False)
+    except Exception as e:
+        logger.error("Forecast error: %s", e)
+        raise HTTPException(status_code=500, detail=f"Forecast error: {str(e)}")
+
+    return ForecastResponse(
+        times=times.strftime("%Y-%m-%d %H:%M").tolist(),
+        model_version=models.version,
+        sites=[
+            {"latitude": site.latitude, "longitude": site.longitude, "name": site.name, "predicted_power": row}
+            for site, row in zip(request.sites, predictions.tolist())
+        ],
+    )
+
+
+@router.post("/predict/portfolio", response_model=PortfolioResponse)
+async def predict_portfolio(
+    request: PortfolioRequest,
+    weather: WeatherProvider = Depends(get_weather_provider),
+    pm25: PM25Provider = Depends(get_pm25_provider),
+    models: ModelBundle = Depends(get_models),
+    pool: WorkPool = Depends(get_work_pool)
+):
+    """
+    Location-mode prediction for many sites at once. Upstream data for all
+    sites is fetched concurrently (at most PORTFOLIO_CONCURRENCY sites at a
+    time) and every site is scored in one batched model call. A site whose
+    upstream lookups fail gets an `error` instead of failing the request.
+    """
+    if request.sites is not None:
+        sites = request.sites
+    else:
+        try:
+            sites = [PortfolioSite(**site) for site in site_registry.sites()]
+        except FileNotFoundError:
+            raise HTTPException(status_code=400, detail=f"No sites given and no site registry at {site_registry.path}")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error reading site registry: {str(e)}")
+    if not 1 <= len(sites) <= PORTFOLIO_MAX_SITES:
+        raise HTTPException(status_code=400, detail=f"Between 1 and {PORTFOLIO_MAX_SITES} sites required")
+
+    try:
+        pool.admit()
+    except PoolSaturatedError as e:
+        raise server_busy(e)
+
+    inputs = await gather_bounded(
+        [lambda site=site: site_inputs(site, request.hour, weather, pm25) for site in sites], PORTFOLIO_CONCURRENCY)
+
+    results = []
+    rows = []
+    for site, site_input in zip(sites, inputs):
+        result = {"id": site.id, "name": site.name, "latitude": site.latitude, "longitude": site.longitude,
+                  "area_m2": site.area_m2, "predicted_power": None}
+        if isinstance(site_input, SiteInputError):
+            result["error"] = str(site_input)
+        elif isinstance(site_input, Exception):
+            logger.error("Portfolio site %s error: %s", site.id or (site.latitude, site.longitude), site_input)
+            result["error"] = f"Error gathering inputs: {str(site_input)}"
+        else:
+            result["pm25"] = site_input["pm25"]
+            rows.append((result, site_features(site, site_input, request.hour, request.month,
+                                               request.ac_power_lag1, request.power_factor_lag1)))
+        results.append(result)
+
+    if rows:
+        try:
+            predictions, lgbm_mask = await pool.run(score_sites, np.concatenate([row for _, row in rows]), models, admit=False)
+        except Exception as e:
+            logger.error("Portfolio prediction error: %s", e)
+            raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
+        for (result, _), prediction, used_lgbm in zip(rows, predictions.tolist(), lgbm_mask.tolist()):
+            result["predicted_power"] = prediction
+            result["model"] = "lgbm" if used_lgbm else "logreg"
+
+    return PortfolioResponse(model_version=models.version, sites=results, aggregate=aggregate(results))
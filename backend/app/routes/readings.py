@@ -1,82 +1,106 @@
-from fastapi import APIRouter, HTTPException, Query
-import pvlib
+import logging
+from fastapi import APIRouter, Depends, HTTPException, Query
+import numpy as np
 import pandas as pd
-import openaq
+from typing import Optional
 from datetime import datetime
 import pytz
+from app.models.schemas import IngestRequest, IngestResponse, SiteStatus
+from app.services.air_quality import PM25Provider, get_pm25_provider
+from app.services.ingest import INGEST_MAX_READINGS, SITE_ID_PATTERN, IngestError, SiteNotFoundError, ingest_store
+from app.services.solar import zenith_memo, zenith_series
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/readings", tags=["readings"])
 
+# Longest range /sza/series will compute in one request
+MAX_SERIES_DAYS = 366
+
+SERIES_FREQS = {"hour": "h", "15min": "15min", "5min": "5min"}
+
+
 @router.get("/sza")
 def get_sza(lat: float, lon: float):
     try:
-        # Get current time in UTC
-        now = pd.Timestamp.now(tz='UTC')
-        
-        # Calculate solar position
-        # pvlib expects a DatetimeIndex or similar for efficient calculation, 
-        # but passing a single timestamp works and returns a DataFrame with one row.
-        solpos = pvlib.solarposition.get_solarposition(
-            time=now,
-            latitude=lat,
-            longitude=lon
-        )
-        
-        sza = solpos['zenith'].iloc[0]
+        # Memoized per site and UTC hour, so repeat calls skip pvlib's setup entirely
+        sza = zenith_memo.at(lat, lon)
         return {"sza": round(float(sza), 2)}
     except Exception as e:
-        print(f"SZA Error: {e}")
+        logger.error("SZA Error: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/sza/series")
+def get_sza_series(
+    lat: float,
+    lon: float,
+    start_date: str = Query(..., description="Start date in YYYY-MM-DD format (UTC)"),
+    end_date: Optional[str] = Query(None, description="End date in YYYY-MM-DD format (UTC), defaults to start_date"),
+    interval: str = Query("hour", description="Step between values: hour, 15min, 5min")
+):
+    if interval not in SERIES_FREQS:
+        raise HTTPException(status_code=400, detail=f"Unsupported interval '{interval}', expected one of {list(SERIES_FREQS)}")
+
+    try:
+        start = pd.Timestamp(start_date)
+        end = pd.Timestamp(end_date or start_date) + pd.Timedelta(days=1) - pd.Timedelta(seconds=1) # Include the whole end day
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if end < start or (end - start).days >= MAX_SERIES_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range must be between 1 and {MAX_SERIES_DAYS} days")
+
+    try:
+        # One vectorized solar-position call for the whole range
+        series = zenith_series(lat, lon, start, end, freq=SERIES_FREQS[interval])
+        return [
+            {"time": t, "sza": z}
+            for t, z in zip(series.index.strftime("%Y-%m-%dT%H:%M:%SZ"), np.round(series.to_numpy(), 2).tolist())
+        ]
+    except Exception as e:
+        logger.error("SZA Error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/pm25")
-def get_pm25(lat: float, lon: float):
-    # API Key provided by user
-    OPENAQ_API_KEY = "58c2a8a33d07e70bab3011b3a8fa933ea7b45ba24aab506c281703cc0e9f0607"
-    
+def get_pm25(lat: float, lon: float, provider: PM25Provider = Depends(get_pm25_provider)):
+    # Runs in the threadpool; the provider keeps one client and caches stations and readings
     try:
-        client = openaq.OpenAQ(api_key=OPENAQ_API_KEY)
-        
-        # Find nearest location with PM2.5
-        # We use the locations endpoint to find the nearest station
-        # parameter_id 2 corresponds to PM2.5
-        # Note: order_by="distance" caused validation error, removing it. 
-        # OpenAQ API v3 usually sorts by distance when coordinates are provided.
-        response = client.locations.list(
-            coordinates=(lat, lon),
-            radius=25000,
-            limit=5,
-            parameters_id=[2] 
-        )
-        
-        if not response.results:
-             return {"pm25": None, "message": "No sensors found within 25km"}
-        
-        # Sort by distance manually to be safe
-        sorted_results = sorted(response.results, key=lambda x: x.distance if x.distance is not None else float('inf'))
-        location = sorted_results[0]
-        
-        # Find the PM2.5 sensor in this location
-        # The response is a Pydantic model, so we access attributes directly
-        pm25_sensor = next((s for s in location.sensors if s.parameter.id == 2), None)
-        
-        if pm25_sensor:
-            # Fetch latest measurement for this sensor explicitly
-            measurements = client.measurements.list(
-                sensors_id=pm25_sensor.id,
-                limit=1
-            )
-            
-            if measurements.results:
-                latest = measurements.results[0]
-                return {
-                    "pm25": latest.value,
-                    "unit": pm25_sensor.parameter.units,
-                    "location": location.name,
-                    "distance": getattr(location, 'distance', None)
-                }
-        
-        return {"pm25": None, "message": "PM2.5 data not found in closest sensor"}
-            
+        return provider.latest(lat, lon)
     except Exception as e:
-        print(f"OpenAQ Error: {e}")
+        logger.error("OpenAQ Error: %s", e)
         raise HTTPException(status_code=500, detail=f"Error fetching PM2.5: {str(e)}")
+
+
+def check_site_id(site_id: str):
+    if not SITE_ID_PATTERN.match(site_id):
+        raise HTTPException(status_code=400, detail="site_id must be 1-64 letters, digits, '-' or '_'")
+
+
+@router.post("/ingest", response_model=IngestResponse)
+def ingest_readings(request: IngestRequest):
+    """
+    Append hourly readings of a live site. Lag features and the history
+    rollups of the site are updated as the readings arrive, so /api/predict
+    and /api/analytics/history can use them with just the site_id.
+    """
+    check_site_id(request.site_id)
+    if not 1 <= len(request.readings) <= INGEST_MAX_READINGS:
+        raise HTTPException(status_code=400, detail=f"Between 1 and {INGEST_MAX_READINGS} readings required")
+    try:
+        return ingest_store.ingest(request.site_id, request.readings, request.latitude, request.longitude, request.timezone)
+    except IngestError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("Ingestion error for site %s: %s", request.site_id, e)
+        raise HTTPException(status_code=500, detail=f"Ingestion error: {str(e)}")
+
+
+@router.get("/sites/{site_id}", response_model=SiteStatus)
+def get_site(site_id: str):
+    """Latest ingested reading of a site and the lags its next hour will use"""
+    check_site_id(site_id)
+    try:
+        return ingest_store.site(site_id).status()
+    except SiteNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
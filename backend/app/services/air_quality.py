@@ -0,0 +1,176 @@
+import math
+import os
+import threading
+from concurrent.futures import Future
+import openaq
+from app.services.cache import TTLCache
+from app.services.metrics import UPSTREAM_OPENAQ, count_cache, upstream_call
+
+# API Key provided by user
+OPENAQ_API_KEY = os.getenv("OPENAQ_API_KEY", "58c2a8a33d07e70bab3011b3a8fa933ea7b45ba24aab506c281703cc0e9f0607")
+# Point this at a local stub server to run without the real API
+OPENAQ_BASE_URL = os.getenv("OPENAQ_BASE_URL", "https://api.openaq.org/v3/")
+
+# parameter_id 2 corresponds to PM2.5
+PM25_PARAMETER_ID = 2
+
+# Marker cached for a cell with no PM2.5 station, or a sensor with no measurement
+_MISSING = object()
+
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one call of `fn`"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance in metres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * 6371000.0 * math.asin(math.sqrt(a))
+
+
+class PM25Provider:
+    """
+    Long-lived OpenAQ client for the latest PM2.5 reading near a point.
+
+    The nearest station is cached per grid cell of `cell_size` degrees, and
+    the latest measurement per sensor for `measurement_ttl` seconds (stations
+    report about hourly). Concurrent lookups of the same cell or sensor share
+    one upstream call.
+    """
+
+    def __init__(self, api_key: str = OPENAQ_API_KEY, base_url: str = OPENAQ_BASE_URL,
+                 radius: int = 25000, cell_size: float = 0.01, station_ttl: float = 24 * 3600,
+                 measurement_ttl: float = 300, cache_size: int = 4096, client=None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.radius = radius
+        self.cell_size = cell_size
+        self._client = client
+        self._client_lock = threading.Lock()
+        self._stations = TTLCache(maxsize=cache_size, ttl=station_ttl)
+        self._measurements = TTLCache(maxsize=cache_size, ttl=measurement_ttl)
+        self._flight = SingleFlight()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = openaq.OpenAQ(api_key=self.api_key, base_url=self.base_url)
+        return self._client
+
+    def cell(self, lat: float, lon: float):
+        """Grid cell containing a point"""
+        return (math.floor(lat / self.cell_size), math.floor(lon / self.cell_size))
+
+    def nearest_station(self, lat: float, lon: float):
+        """Nearest station with a PM2.5 sensor, as (location, sensor), or None"""
+        key = self.cell(lat, lon)
+        station = self._stations.get(key)
+        count_cache("openaq_station", station is not None)
+        if station is None:
+            station = self._flight.do(("station", key), lambda: self._find_station(lat, lon))
+            self._stations.set(key, station)
+        return None if station is _MISSING else station
+
+    def _find_station(self, lat: float, lon: float):
+        # Note: order_by="distance" caused validation error, removing it.
+        # OpenAQ API v3 usually sorts by distance when coordinates are provided.
+        with upstream_call("openaq", UPSTREAM_OPENAQ):
+            response = self.client.locations.list(
+                coordinates=(lat, lon),
+                radius=self.radius,
+                limit=5,
+                parameters_id=[PM25_PARAMETER_ID]
+            )
+        if not response.results:
+            return _MISSING
+
+        # Sort by distance manually to be safe
+        sorted_results = sorted(response.results, key=lambda x: x.distance if x.distance is not None else float('inf'))
+        location = sorted_results[0]
+
+        # Find the PM2.5 sensor in this location
+        pm25_sensor = next((s for s in location.sensors if s.parameter.id == PM25_PARAMETER_ID), None)
+        return location, pm25_sensor
+
+    def latest_measurement(self, sensor_id: int):
+        """Most recent measurement for a sensor, or None"""
+        cached = self._measurements.get(sensor_id)
+        count_cache("openaq_measurement", cached is not None)
+        if cached is not None:
+            return None if cached is _MISSING else cached
+
+        def fetch():
+            with upstream_call("openaq", UPSTREAM_OPENAQ):
+                measurements = self.client.measurements.list(sensors_id=sensor_id, limit=1)
+            return measurements.results[0] if measurements.results else _MISSING
+
+        latest = self._flight.do(("measurement", sensor_id), fetch)
+        self._measurements.set(sensor_id, latest)
+        return None if latest is _MISSING else latest
+
+    def latest(self, lat: float, lon: float) -> dict:
+        """Latest PM2.5 near a point, in the /api/readings/pm25 response layout"""
+        station = self.nearest_station(lat, lon)
+        if station is None:
+            return {"pm25": None, "message": f"No sensors found within {self.radius // 1000}km"}
+
+        location, pm25_sensor = station
+        if pm25_sensor:
+            latest = self.latest_measurement(pm25_sensor.id)
+            if latest is not None:
+                # The station is shared by the whole cell, so measure from this point
+                coordinates = getattr(location, 'coordinates', None)
+                distance = (haversine_m(lat, lon, coordinates.latitude, coordinates.longitude)
+                            if coordinates is not None else getattr(location, 'distance', None))
+                return {
+                    "pm25": latest.value,
+                    "unit": pm25_sensor.parameter.units,
+                    "location": location.name,
+                    "distance": distance
+                }
+
+        return {"pm25": None, "message": "PM2.5 data not found in closest sensor"}
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+
+pm25_provider = PM25Provider()
+
+
+def get_pm25_provider() -> PM25Provider:
+    """FastAPI dependency; override it to swap in a stub-backed provider"""
+    return pm25_provider
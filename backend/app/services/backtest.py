@@ -0,0 +1,251 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import numpy as np
+import pandas as pd
+from app.services.batch import (BASE_REQUIRED_FEATURES, CYCLIC_FEATURES, NUMERIC_COLUMNS, fill_backfill_defaults,
+                                 prepare_batch_frame)
+from app.services.dataset import DATA_DIR, MERGED_LAGS_PATH, DatasetStore
+from app.services.executor import SCORING_COLUMNS, work_pool
+from app.services.features import build_feature_matrix
+from app.services.inference import BATCH_PM25_THRESHOLD
+from app.services.rollups import RollupCube, bucket_starts
+
+logger = logging.getLogger(__name__)
+
+# One subdirectory of scored rows per model version
+BACKTEST_DIR = os.getenv("BACKTEST_DIR", os.path.join(DATA_DIR, "backtest"))
+# Model versions whose backtests are kept on disk
+BACKTEST_KEEP_VERSIONS = int(os.getenv("BACKTEST_KEEP_VERSIONS", "3"))
+
+FORMAT_VERSION = 1
+META_FILE = "meta.json"
+# Arrays stored per version, in the time order of the source's rows
+ARRAYS = ("index", "actual", "predicted", "lgbm", "features")
+# Source columns read to rebuild the features and the actuals
+SOURCE_COLUMNS = list(dict.fromkeys(BASE_REQUIRED_FEATURES + CYCLIC_FEATURES + NUMERIC_COLUMNS + ['AC Power/m2']))
+SERIES_COLUMNS = ['actual', 'predicted', 'residual']
+
+
+def _source_stamp(path: str) -> dict:
+    st = os.stat(path)
+    return {"path": os.path.abspath(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _same_rows(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Per row, whether two feature matrices hold the same values (NaN equal to NaN)"""
+    return ((a == b) | (np.isnan(a) & np.isnan(b))).all(axis=1)
+
+
+class Backtest:
+    """
+    Predictions of one model version over the history file, next to the
+    actual AC power. Queries run on a time-sorted view of the rows.
+    """
+
+    def __init__(self, arrays: dict, meta: dict):
+        self.arrays = arrays
+        self.meta = meta
+        self.model_version = meta["model_version"]
+
+        index = arrays["index"]
+        order = None if np.all(index[1:] >= index[:-1]) else np.argsort(index, kind="stable")
+        sort = (lambda a: a) if order is None else (lambda a: a[order])
+        self.index = sort(index)
+        self.actual = sort(arrays["actual"])
+        self.predicted = sort(arrays["predicted"])
+        self.lgbm = sort(arrays["lgbm"])
+
+        frame = pd.DataFrame({
+            'actual': self.actual,
+            'predicted': self.predicted,
+            'residual': self.actual - self.predicted,
+        }, index=pd.DatetimeIndex(self.index.view("datetime64[ns]")))
+        self.frame = frame
+        self.cube = RollupCube(frame, SERIES_COLUMNS)
+
+    def bounds(self, start, end) -> tuple:
+        """Row positions [lo, hi) with start <= time <= end"""
+        lo = np.searchsorted(self.index, pd.Timestamp(start).as_unit("ns").value, side="left")
+        hi = np.searchsorted(self.index, pd.Timestamp(end).as_unit("ns").value, side="right")
+        return int(lo), int(hi)
+
+    def series(self, start, end, interval: str) -> tuple:
+        """(times, {column: values}) of actual, predicted and residual; bucket means for day/month"""
+        if interval in ('day', 'month'):
+            values = {}
+            for col in SERIES_COLUMNS:
+                times, values[col] = self.cube.query(interval, start, end, col)
+            return times, values
+        lo, hi = self.bounds(start, end)
+        rows = self.frame.iloc[lo:hi]
+        return rows.index, {col: rows[col].to_numpy() for col in SERIES_COLUMNS}
+
+    def error_metrics(self, start, end, interval: str) -> tuple:
+        """
+        Error counts and sums per `interval` bucket, split by the model that
+        scored each row. Rows without an actual value are left out.
+
+        Returns (bucket starts, rows, absolute error sums, squared error
+        sums), the last three shaped (buckets, 2) with LGBM in column 0 and
+        LogReg in column 1.
+        """
+        lo, hi = self.bounds(start, end)
+        error = self.predicted[lo:hi] - self.actual[lo:hi]
+        valid = ~np.isnan(error)
+        error = error[valid]
+        keys = bucket_starts(pd.DatetimeIndex(self.index[lo:hi][valid].view("datetime64[ns]")), interval).asi8
+        starts, bucket = np.unique(keys, return_inverse=True)
+
+        group = bucket * 2 + np.where(self.lgbm[lo:hi][valid], 0, 1)
+        size = 2 * len(starts)
+        rows = np.bincount(group, minlength=size).reshape(-1, 2)
+        abs_sums = np.bincount(group, weights=np.abs(error), minlength=size).reshape(-1, 2)
+        sq_sums = np.bincount(group, weights=error * error, minlength=size).reshape(-1, 2)
+        return pd.DatetimeIndex(starts.view("datetime64[ns]")), rows, abs_sums, sq_sums
+
+
+class BacktestStore:
+    """
+    Predictions for every row of the history file, computed once per model
+    version and persisted under `directory`/<version>.
+
+    `current(models)` keeps the stored backtest in step with the history
+    file and the model version. The history is read column by column from
+    its columnar store (see app/services/columnar.py), which is rebuilt
+    when the file changes. Every row's features are then rebuilt the same
+    way /api/predict/batch builds them (cheap, vectorized) and compared
+    with the stored ones. Only rows that are new or whose features changed
+    are scored again, so appending data rescores just the appended rows
+    (plus any earlier rows whose back-filled lag values the new rows
+    changed). A new model version is scored in full.
+    """
+
+    def __init__(self, source_path: str = MERGED_LAGS_PATH, directory: str = BACKTEST_DIR,
+                 keep_versions: int = BACKTEST_KEEP_VERSIONS, store_dir: str = None):
+        self.source_path = source_path
+        self.source = DatasetStore(source_path, store_dir=store_dir)
+        self.directory = directory
+        self.keep_versions = keep_versions
+        self._lock = threading.Lock()
+        self._current = None
+
+    def version_dir(self, version: str) -> str:
+        return os.path.join(self.directory, version)
+
+    def current(self, models) -> Backtest:
+        """Backtest of `models` (a ModelBundle) over the current history file (blocking)"""
+        stamp = _source_stamp(self.source_path)
+        backtest = self._current
+        if self._matches(backtest, models.version, stamp):
+            return backtest
+
+        with self._lock:
+            backtest = self._current
+            if self._matches(backtest, models.version, stamp):
+                return backtest
+            if backtest is None or backtest.model_version != models.version:
+                backtest = self._read(models.version)
+            if not self._matches(backtest, models.version, stamp):
+                backtest = self._update(models, stamp, backtest)
+            self._current = backtest
+            return backtest
+
+    @staticmethod
+    def _matches(backtest, version: str, stamp: dict) -> bool:
+        if backtest is None or backtest.model_version != version:
+            return False
+        source = backtest.meta["source"]
+        return (source["size"], source["mtime_ns"]) == (stamp["size"], stamp["mtime_ns"])
+
+    def _read(self, version: str):
+        """The stored backtest of a model version, or None"""
+        path = self.version_dir(version)
+        try:
+            with open(os.path.join(path, META_FILE)) as f:
+                meta = json.load(f)
+            if meta.get("format_version") != FORMAT_VERSION:
+                return None
+            arrays = {name: np.load(os.path.join(path, f"{name}.npy")) for name in ARRAYS}
+        except (OSError, ValueError):
+            return None
+        return Backtest(arrays, meta)
+
+    def _update(self, models, stamp: dict, previous) -> Backtest:
+        started = time.perf_counter()
+        df = self.source.columns(SOURCE_COLUMNS)
+        index = df.index.as_unit("ns").asi8
+        actual = df['AC Power/m2'].to_numpy(dtype=np.float64) if 'AC Power/m2' in df.columns else np.full(len(df), np.nan)
+
+        # Same features as a whole-file /api/predict/batch upload of the history
+        frame = fill_backfill_defaults(prepare_batch_frame(df))
+        features = build_feature_matrix(frame, SCORING_COLUMNS)
+
+        predicted = np.empty(len(frame))
+        stale = np.ones(len(frame), dtype=bool)
+        if previous is not None:
+            kept = min(len(frame), len(previous.arrays["features"]))
+            stale[:kept] = ~_same_rows(features[:kept], previous.arrays["features"][:kept])
+            reuse = np.flatnonzero(~stale)
+            predicted[reuse] = previous.arrays["predicted"][reuse]
+
+        rescore = np.flatnonzero(stale)
+        if len(rescore):
+            # Not request traffic, so kept out of /metrics
+            predicted[rescore] = work_pool.predict_frame(frame.iloc[rescore], models, metrics=False)
+        lgbm = (frame['PM25'] <= BATCH_PM25_THRESHOLD).to_numpy()
+
+        meta = {
+            "format_version": FORMAT_VERSION,
+            "model_version": models.version,
+            "source": stamp,
+            "rows": len(frame),
+            "rescored": len(rescore),
+            "updated_at": time.time(),
+        }
+        arrays = {"index": index, "actual": actual, "predicted": predicted, "lgbm": lgbm, "features": features}
+        self._write(models.version, arrays, meta)
+        logger.info("Backtest for model %s updated: %d of %d rows scored in %.2fs.",
+                    models.version, len(rescore), len(frame), time.perf_counter() - started,
+                    extra={"model_version": models.version})
+        return Backtest(arrays, meta)
+
+    def _write(self, version: str, arrays: dict, meta: dict):
+        """Write a version's arrays beside the old copy and swap them in by rename"""
+        path = self.version_dir(version)
+        tmp_dir = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for name in ARRAYS:
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), arrays[name])
+        with open(os.path.join(tmp_dir, META_FILE), "w") as f:
+            json.dump(meta, f, indent=2)
+
+        old_dir = None
+        if os.path.exists(path):
+            old_dir = f"{tmp_dir}.old"
+            os.rename(path, old_dir)
+        os.rename(tmp_dir, path)
+        if old_dir:
+            shutil.rmtree(old_dir, ignore_errors=True)
+        self._prune(keep=version)
+
+    def _prune(self, keep: str):
+        """Drop the backtests of all but the `keep_versions` most recently updated versions"""
+        versions = [name for name in os.listdir(self.directory)
+                    if name != keep and os.path.isfile(os.path.join(self.directory, name, META_FILE))]
+        versions.sort(key=lambda name: os.path.getmtime(os.path.join(self.directory, name, META_FILE)), reverse=True)
+        for name in versions[max(self.keep_versions - 1, 0):]:
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    def status(self) -> dict:
+        backtest = self._current
+        if backtest is None:
+            return {"loaded": False}
+        return {"loaded": True, **{k: v for k, v in backtest.meta.items() if k != "format_version"}}
+
+
+backtest_store = BacktestStore()
@@ -0,0 +1,258 @@
+import logging
+import numpy as np
+import pandas as pd
+from app.services.features import (DEFAULT_AC_POWER_LAG1, DEFAULT_POWER_FACTOR_LAG1, HOUR_COS, HOUR_SIN, MONTH_COS, MONTH_SIN,
+                                   cyclic_columns)
+from app.services.inference import predict_frame
+from app.services.metrics import CSV_PARSE, FEATURE_BUILD, SERIALIZE, stage, timed_iter
+from app.services.solar import solar_zenith
+
+logger = logging.getLogger(__name__)
+
+# Required features (excluding AC Power and Cyclic features which are handled dynamically)
+BASE_REQUIRED_FEATURES = ['PM25', 'ALLSKY_SFC_SW_DWN', 'ALLSKY_KT', 'T2M', 'WS10M', 'SZA', 'T2M_Lag1', 'PM25_Lag1', 'power_factor_Lag1']
+
+CYCLIC_FEATURES = ['Hour_sin', 'Hour_cos', 'Month_sin', 'Month_cos']
+
+# Input columns that must hold numbers wherever they appear in an upload
+NUMERIC_COLUMNS = BASE_REQUIRED_FEATURES + CYCLIC_FEATURES + ['Hour', 'Month', 'AC_Power/m2_Lag1', 'AC Power/m2_Lag1', 'AC_Power_Lag1']
+
+# Lag columns that are back-filled from later rows, with the value used when
+# nothing later in the file can fill them
+BACKFILL_DEFAULTS = {
+    'PM25_Lag1': 0.0,
+    'T2M_Lag1': 25.0,
+}
+
+# Rows parsed, scored and written per step when streaming an upload
+DEFAULT_STREAM_CHUNK_ROWS = 10_000
+
+# Pseudo-column holding each row's 0-based position in the uploaded file
+ROW_COLUMN = 'row'
+
+# Cap on rows held back while waiting for a later row to back-fill a lag value
+MAX_PENDING_ROWS = 100_000
+
+
+class BatchFormatError(ValueError):
+    """Raised when an uploaded batch file can't be turned into model features"""
+
+
+def find_datetime_column(df: pd.DataFrame):
+    """Name of the timestamp column in an upload, if there is one"""
+    return next((col for col in ('datetime', 'timestamp', 'Date') if col in df.columns), None)
+
+
+def check_numeric(df: pd.DataFrame, columns=NUMERIC_COLUMNS) -> pd.DataFrame:
+    """Convert the given columns to numbers, raising BatchFormatError on the first value that isn't one"""
+    for col in columns:
+        if col not in df.columns or pd.api.types.is_numeric_dtype(df[col]):
+            continue
+        values = pd.to_numeric(df[col], errors='coerce')
+        bad = df[col][values.isna() & df[col].notna()]
+        if len(bad):
+            raise BatchFormatError(f"Non-numeric value in column '{col}': {bad.iloc[0]!r}")
+        df[col] = values
+    return df
+
+
+def derive_sza(df: pd.DataFrame, latitude=None, longitude=None, timezone: str = 'UTC') -> pd.DataFrame:
+    """
+    Fill in the SZA column from timestamps and site coordinates.
+
+    Coordinates come from `latitude`/`longitude` (or `lat`/`lon`) columns,
+    falling back to the given scalars. Naive timestamps are read in `timezone`.
+    """
+    datetime_col = find_datetime_column(df)
+    lat_col = next((col for col in ('latitude', 'lat') if col in df.columns), None)
+    lon_col = next((col for col in ('longitude', 'lon') if col in df.columns), None)
+    lats = df[lat_col].to_numpy(dtype=np.float64) if lat_col else latitude
+    lons = df[lon_col].to_numpy(dtype=np.float64) if lon_col else longitude
+
+    if datetime_col is None or lats is None or lons is None:
+        raise BatchFormatError("Missing columns in CSV: ['SZA'] (provide it, or a datetime column plus latitude/longitude to derive it)")
+
+    try:
+        times = pd.DatetimeIndex(pd.to_datetime(df[datetime_col]))
+        if times.tz is None:
+            times = times.tz_localize(timezone)
+    except Exception as e:
+        raise BatchFormatError(f"Could not parse '{datetime_col}' to derive SZA: {e}")
+
+    # One vectorized solar-position call per distinct site in the chunk
+    df['SZA'] = solar_zenith(times, lats, lons)
+    return df
+
+
+def prepare_batch_frame(df: pd.DataFrame, latitude=None, longitude=None, timezone: str = 'UTC') -> pd.DataFrame:
+    """
+    Derive the model features for a batch frame (or one chunk of it).
+
+    Everything done here is row-local. Back-filling of the lag columns in
+    BACKFILL_DEFAULTS depends on later rows and is left to the caller.
+    """
+    missing_cols = [col for col in BASE_REQUIRED_FEATURES if col not in df.columns and col != 'SZA']
+    if missing_cols:
+        raise BatchFormatError(f"Missing columns in CSV: {missing_cols}")
+    check_numeric(df)
+
+    if 'SZA' not in df.columns:
+        derive_sza(df, latitude, longitude, timezone)
+
+    # Handle Cyclic Features
+    if not all(col in df.columns for col in CYCLIC_FEATURES):
+        # Try to calculate them from Hour and Month
+        # Normalize column names if needed
+        if 'hour' in df.columns and 'Hour' not in df.columns: df.rename(columns={'hour': 'Hour'}, inplace=True)
+        if 'month' in df.columns and 'Month' not in df.columns: df.rename(columns={'month': 'Month'}, inplace=True)
+
+        # Check for datetime column if Hour/Month are missing
+        if ('Hour' not in df.columns or 'Month' not in df.columns):
+            datetime_col = find_datetime_column(df)
+
+            if datetime_col:
+                try:
+                    df[datetime_col] = pd.to_datetime(df[datetime_col])
+                    if 'Hour' not in df.columns:
+                        df['Hour'] = df[datetime_col].dt.hour
+                    if 'Month' not in df.columns:
+                        df['Month'] = df[datetime_col].dt.month
+                except Exception as e:
+                    logger.warning("Error parsing datetime column: %s", e)
+
+        if 'Hour' in df.columns and 'Month' in df.columns:
+            # Table lookups for whole hours/months, computed directly otherwise
+            df['Hour_sin'], df['Hour_cos'] = cyclic_columns(df['Hour'], HOUR_SIN, HOUR_COS, 24)
+            df['Month_sin'], df['Month_cos'] = cyclic_columns(df['Month'], MONTH_SIN, MONTH_COS, 12)
+        else:
+            raise BatchFormatError("Missing cyclic features (Hour_sin, etc.) and missing 'Hour'/'Month' or 'datetime' columns to calculate them.")
+
+    # Handle AC Power column
+    ac_power_col = None
+    if 'AC_Power/m2_Lag1' in df.columns:
+        ac_power_col = 'AC_Power/m2_Lag1'
+    elif 'AC Power/m2_Lag1' in df.columns:
+        ac_power_col = 'AC Power/m2_Lag1'
+    elif 'AC_Power_Lag1' in df.columns:
+        # Rename to what models expect temporarily
+        df['AC_Power/m2_Lag1'] = df['AC_Power_Lag1']
+        df['AC Power/m2_Lag1'] = df['AC_Power_Lag1']
+        ac_power_col = 'AC_Power/m2_Lag1' # Default to one
+    else:
+        raise BatchFormatError("Missing AC Power Lag1 column (expected 'AC_Power/m2_Lag1' or 'AC Power/m2_Lag1')")
+
+    # Ensure both variants exist for the models
+    if 'AC_Power/m2_Lag1' not in df.columns:
+        df['AC_Power/m2_Lag1'] = df[ac_power_col]
+    if 'AC Power/m2_Lag1' not in df.columns:
+        df['AC Power/m2_Lag1'] = df[ac_power_col]
+
+    # Fill NaNs for Lag features with reasonable defaults
+    # This is crucial for the first row or missing data to avoid "off" predictions or errors
+    df['AC_Power/m2_Lag1'] = (df['AC_Power_Lag1'] if 'AC_Power_Lag1' in df.columns else df['AC_Power/m2_Lag1']).fillna(DEFAULT_AC_POWER_LAG1)
+    df['AC Power/m2_Lag1'] = df['AC Power/m2_Lag1'].fillna(DEFAULT_AC_POWER_LAG1)
+
+    df['power_factor_Lag1'] = df['power_factor_Lag1'].fillna(DEFAULT_POWER_FACTOR_LAG1)
+
+    return df
+
+
+def fill_backfill_defaults(df: pd.DataFrame) -> pd.DataFrame:
+    """Back-fill the lag columns within `df`, then fall back to the defaults"""
+    for col, default in BACKFILL_DEFAULTS.items():
+        df[col] = df[col].bfill().fillna(default)
+    return df
+
+
+def iter_prediction_chunks(chunks, lgbm_model, log_reg_model, max_pending_rows: int = MAX_PENDING_ROWS,
+                           predict=None, **prepare_kwargs):
+    """
+    Prepare and score an iterator of raw CSV chunks, yielding scored frames.
+
+    Back-filled lag columns are carried across chunk boundaries: rows at the
+    end of a chunk whose lag value is still missing are held back and scored
+    together with the next chunk, so the output matches a whole-file
+    back-fill. To keep memory bounded, at most `max_pending_rows` rows are
+    held back; past that they are flushed with the default fill values.
+    `predict(frame)` overrides how a ready frame is scored (e.g. on a
+    process pool); `prepare_kwargs` are passed on to prepare_batch_frame.
+
+    Missing columns and non-numeric values raise BatchFormatError from the
+    chunk they are found in. Columns are the same in every chunk, so those
+    surface on the first one; a bad value further down the file only shows
+    up when its chunk is reached, after earlier frames were yielded. At
+    least one frame is always yielded, an empty one for a file with no
+    rows, so the output still carries its columns.
+    """
+    if predict is None:
+        predict = lambda frame: predict_frame(frame, lgbm_model, log_reg_model)
+    pending = None
+    empty = None
+    yielded = False
+
+    for chunk in timed_iter(chunks, CSV_PARSE):
+        with stage(FEATURE_BUILD):
+            chunk = prepare_batch_frame(chunk, **prepare_kwargs)
+            if pending is not None:
+                chunk = pd.concat([pending, chunk], ignore_index=True)
+
+            for col in BACKFILL_DEFAULTS:
+                chunk[col] = chunk[col].bfill()
+
+            # After the in-chunk back-fill, only a trailing run of rows can still be missing
+            unresolved = chunk[list(BACKFILL_DEFAULTS)].isna().any(axis=1).to_numpy()
+            cut = int(np.argmax(unresolved)) if unresolved.any() else len(chunk)
+            if len(chunk) - cut > max_pending_rows:
+                cut = len(chunk)
+
+            pending = chunk.iloc[cut:] if cut < len(chunk) else None
+            ready = fill_backfill_defaults(chunk.iloc[:cut].copy())
+        if len(ready):
+            ready['Predicted_Power'] = predict(ready)
+            yielded = True
+            yield ready
+        elif empty is None:
+            empty = ready
+
+    if pending is not None:
+        ready = fill_backfill_defaults(pending.copy())
+        ready['Predicted_Power'] = predict(ready)
+        yield ready
+    elif not yielded and empty is not None:
+        empty['Predicted_Power'] = np.empty(0, dtype=np.float64)
+        yield empty
+
+
+def parse_columns(columns: str):
+    """Comma-separated column names as a list without duplicates, or None for all columns"""
+    names = [name.strip() for name in (columns or "").split(",") if name.strip()]
+    return list(dict.fromkeys(names)) or None
+
+
+def iter_selected_columns(frames, columns: list):
+    """
+    Narrow scored frames to `columns`, in that order. The ROW_COLUMN
+    pseudo-column numbers the rows as they appeared in the upload (unless
+    the file has a column of that name). Raises BatchFormatError for
+    columns the scored frames don't have.
+    """
+    offset = 0
+    for frame in frames:
+        missing = [col for col in columns if col not in frame.columns and col != ROW_COLUMN]
+        if missing:
+            raise BatchFormatError(f"Unknown output columns: {', '.join(missing)}")
+        yield pd.DataFrame({
+            col: frame[col].to_numpy() if col in frame.columns else np.arange(offset, offset + len(frame))
+            for col in columns
+        })
+        offset += len(frame)
+
+
+def iter_csv_bytes(frames):
+    """Serialize scored frames as one CSV byte stream with a single header row"""
+    header = True
+    for frame in frames:
+        with stage(SERIALIZE):
+            data = frame.to_csv(index=False, header=header).encode('utf-8')
+        yield data
+        header = False
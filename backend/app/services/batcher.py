@@ -0,0 +1,115 @@
+import asyncio
+import os
+import numpy as np
+from app.services.executor import work_pool
+from app.services.inference import SINGLE_PM25_THRESHOLD, predict_matrix, predict_one
+from app.services.metrics import INFERENCE, count_routing, stage
+
+# Turn the batcher off to score every request on its own
+PREDICT_BATCHING = os.getenv("PREDICT_BATCHING", "1") not in ("0", "false", "False")
+PREDICT_BATCH_MAX_SIZE = int(os.getenv("PREDICT_BATCH_MAX_SIZE", "64"))
+PREDICT_BATCH_MAX_WAIT_MS = float(os.getenv("PREDICT_BATCH_MAX_WAIT_MS", "2"))
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-row predictions into one model call per model.
+
+    The first request to arrive opens a batch. The batch is scored when it
+    reaches `max_batch_size` rows or `max_wait_ms` after it opened, whichever
+    comes first. Rows are routed by the same PM2.5 rule as a lone request,
+    and each caller gets back its own (prediction, model name). Scoring
+    runs on the work pool so the event loop stays free meanwhile.
+    """
+
+    def __init__(self, max_batch_size: int = PREDICT_BATCH_MAX_SIZE,
+                 max_wait_ms: float = PREDICT_BATCH_MAX_WAIT_MS,
+                 enabled: bool = PREDICT_BATCHING,
+                 pm25_threshold: float = SINGLE_PM25_THRESHOLD):
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.enabled = enabled
+        self.pm25_threshold = pm25_threshold
+        self._pending = []
+        self._timer = None
+        # Scoring tasks in flight; the loop only keeps weak references to tasks
+        self._tasks = set()
+        self.batches = 0
+        self.rows = 0
+
+    async def predict(self, features: np.ndarray, models):
+        """Score one (1, N_FEATURES) vector with `models` (a ModelBundle)"""
+        if not self.enabled or self.max_batch_size <= 1:
+            prediction = await work_pool.run(self._predict_one, features, models, admit=False)
+            count_routing(int(prediction[1] == "lgbm"), int(prediction[1] == "logreg"))
+            return prediction
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((features, models, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+
+        # A model swap can land mid-batch; each request is scored by the bundle it started with
+        groups = {}
+        for item in pending:
+            groups.setdefault(id(item[1]), []).append(item)
+
+        for items in groups.values():
+            task = asyncio.ensure_future(self._score(items))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        self.batches += 1
+        self.rows += len(pending)
+
+    async def aclose(self):
+        """Score any open batch and wait for every scoring task to finish"""
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _predict_one(self, features: np.ndarray, models):
+        with stage(INFERENCE):
+            return predict_one(features, models.lgbm, models.log_reg, self.pm25_threshold)
+
+    def _predict_rows(self, X: np.ndarray, models):
+        with stage(INFERENCE):
+            predictions, lgbm_mask = predict_matrix(X, models.lgbm, models.log_reg, self.pm25_threshold)
+        lgbm_rows = int(lgbm_mask.sum())
+        count_routing(lgbm_rows, len(X) - lgbm_rows)
+        return predictions, lgbm_mask
+
+    async def _score(self, items):
+        models = items[0][1]
+        futures = [future for _, _, future in items]
+        try:
+            X = np.concatenate([features for features, _, _ in items])
+            # Callers were admitted by the route already
+            predictions, lgbm_mask = await work_pool.run(self._predict_rows, X, models, admit=False)
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for future, prediction, used_lgbm in zip(futures, predictions.tolist(), lgbm_mask.tolist()):
+            # The caller may have gone away (client disconnect) while waiting
+            if not future.done():
+                future.set_result((prediction, "lgbm" if used_lgbm else "logreg"))
+
+
+batcher = MicroBatcher()
@@ -0,0 +1,185 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import numpy as np
+import pandas as pd
+from app.services.features import HOUR_COS, HOUR_SIN, MONTH_COS, MONTH_SIN, cyclic_columns
+
+logger = logging.getLogger(__name__)
+
+# Where stores are kept; by default data/columnar/ next to the CSVs
+COLUMNAR_DIR = os.getenv("COLUMNAR_DIR")
+
+FORMAT_VERSION = 1
+INDEX_FILE = "index.npy"
+META_FILE = "meta.json"
+
+# (source column, lag column) pairs derived when the CSV doesn't already have them.
+# A lag is the value exactly one hour earlier, NaN across gaps, matching the training notebook.
+LAG_COLUMNS = [
+    ('AC Power/m2', 'AC Power/m2_Lag1'),
+    ('power_factor', 'power_factor_Lag1'),
+    ('T2M', 'T2M_Lag1'),
+    ('PM25', 'PM25_Lag1'),
+]
+
+
+def default_store_dir(csv_path: str) -> str:
+    """data/merged_data.csv -> data/columnar/merged_data (or COLUMNAR_DIR/merged_data)"""
+    directory, name = os.path.split(os.path.abspath(csv_path))
+    return os.path.join(COLUMNAR_DIR or os.path.join(directory, "columnar"), os.path.splitext(name)[0])
+
+
+def _source_stamp(csv_path: str) -> dict:
+    st = os.stat(csv_path)
+    return {"path": os.path.abspath(csv_path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def derive_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Add the lag and cyclic feature columns that are missing from a time-indexed frame"""
+    previous_hour = df.index - pd.Timedelta(hours=1)
+    for source, lag in LAG_COLUMNS:
+        if lag not in df.columns and source in df.columns:
+            # Look up the row one hour earlier; duplicate timestamps keep their first value
+            values = df[source][~df.index.duplicated()]
+            df[lag] = values.reindex(previous_hour).to_numpy()
+
+    hours = df['Hour'] if 'Hour' in df.columns else df.index.hour
+    months = df['Month'] if 'Month' in df.columns else df.index.month
+    if 'Hour_sin' not in df.columns:
+        df['Hour_sin'], df['Hour_cos'] = cyclic_columns(hours, HOUR_SIN, HOUR_COS, 24)
+    if 'Month_sin' not in df.columns:
+        df['Month_sin'], df['Month_cos'] = cyclic_columns(months, MONTH_SIN, MONTH_COS, 12)
+    return df
+
+
+def prepare_store(csv_path: str, store_dir: str = None, time_column: str = "datetime") -> str:
+    """
+    Convert a CSV into a directory of NumPy column files.
+
+    The rows are sorted on `time_column`, which is stored as int64
+    nanoseconds in index.npy. Every other numeric column gets its own .npy
+    file, with the lag and cyclic columns added. meta.json records the
+    column names and dtypes and the CSV's size and mtime. The new store is
+    written beside the old one and swapped in by rename, so readers never
+    see a half-written store.
+    """
+    store_dir = store_dir or default_store_dir(csv_path)
+    stamp = _source_stamp(csv_path)
+
+    df = pd.read_csv(csv_path)
+    df[time_column] = pd.to_datetime(df[time_column])
+    df = df.set_index(time_column).sort_index(kind="stable")
+    df = derive_columns(df)
+
+    tmp_dir = f"{store_dir}.tmp-{os.getpid()}-{threading.get_ident()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    np.save(os.path.join(tmp_dir, INDEX_FILE), df.index.as_unit("ns").asi8)
+    columns = []
+    for i, name in enumerate(df.columns):
+        values = df[name].to_numpy()
+        if not np.issubdtype(values.dtype, np.number) and values.dtype != np.bool_:
+            logger.info("Skipping non-numeric column %r in %s", name, csv_path)
+            continue
+        file = f"col_{i:03d}.npy"
+        np.save(os.path.join(tmp_dir, file), np.ascontiguousarray(values))
+        columns.append({"name": name, "file": file, "dtype": values.dtype.str})
+
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "source": stamp,
+        "index": time_column,
+        "rows": len(df),
+        "columns": columns,
+    }
+    with open(os.path.join(tmp_dir, META_FILE), "w") as f:
+        json.dump(meta, f, indent=2)
+
+    old_dir = None
+    if os.path.exists(store_dir):
+        old_dir = f"{tmp_dir}.old"
+        os.rename(store_dir, old_dir)
+    os.rename(tmp_dir, store_dir)
+    if old_dir:
+        shutil.rmtree(old_dir, ignore_errors=True)
+    return store_dir
+
+
+def read_meta(store_dir: str):
+    try:
+        with open(os.path.join(store_dir, META_FILE)) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get("format_version") == FORMAT_VERSION else None
+
+
+def is_stale(store_dir: str, csv_path: str) -> bool:
+    """True when the store is missing, from an older format, or built from a different CSV"""
+    meta = read_meta(store_dir)
+    if meta is None:
+        return True
+    if not os.path.exists(csv_path):
+        # No source to rebuild from; the store is all there is
+        return False
+    stamp = _source_stamp(csv_path)
+    return (meta["source"]["size"], meta["source"]["mtime_ns"]) != (stamp["size"], stamp["mtime_ns"])
+
+
+class ColumnarStore:
+    """
+    Read side of a store written by prepare_store.
+
+    Column files are memory-mapped on first use, so opening the store and
+    querying a time range only page in the index and the requested
+    columns' rows.
+    """
+
+    def __init__(self, store_dir: str):
+        meta = read_meta(store_dir)
+        if meta is None:
+            raise FileNotFoundError(f"No columnar store at {store_dir}")
+        self.store_dir = store_dir
+        self.meta = meta
+        self.columns = [col["name"] for col in meta["columns"]]
+        self._files = {col["name"]: col["file"] for col in meta["columns"]}
+        self._arrays = {}
+        self._index_ns = np.load(os.path.join(store_dir, INDEX_FILE), mmap_mode="r")
+
+    def __len__(self):
+        return len(self._index_ns)
+
+    def column(self, name: str) -> np.ndarray:
+        """Read-only memory-mapped array for one column"""
+        array = self._arrays.get(name)
+        if array is None:
+            array = np.load(os.path.join(self.store_dir, self._files[name]), mmap_mode="r")
+            self._arrays[name] = array
+        return array
+
+    def bounds(self, start, end) -> tuple:
+        """Row positions [lo, hi) with start <= time <= end"""
+        lo = np.searchsorted(self._index_ns, pd.Timestamp(start).as_unit("ns").value, side="left")
+        hi = np.searchsorted(self._index_ns, pd.Timestamp(end).as_unit("ns").value, side="right")
+        return int(lo), int(hi)
+
+    def index(self, lo: int = 0, hi: int = None) -> pd.DatetimeIndex:
+        return pd.DatetimeIndex(np.asarray(self._index_ns[lo:hi]).view("datetime64[ns]"), name=self.meta["index"])
+
+    def frame(self, columns=None, lo: int = 0, hi: int = None) -> pd.DataFrame:
+        """Rows lo:hi of `columns` (default all) as a DataFrame on the datetime index"""
+        columns = self.columns if columns is None else columns
+        # copy=False keeps the columns as views onto the mapped files
+        return pd.DataFrame(
+            {name: np.asarray(self.column(name)[lo:hi]) for name in columns},
+            index=self.index(lo, hi),
+            copy=False,
+        )
+
+    def range(self, start, end, columns=None) -> pd.DataFrame:
+        lo, hi = self.bounds(start, end)
+        return self.frame(columns, lo, hi)
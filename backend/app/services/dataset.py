@@ -0,0 +1,123 @@
+import logging
+import os
+import threading
+import pandas as pd
+from app.services.columnar import ColumnarStore, default_store_dir, derive_columns, is_stale, prepare_store
+from app.services.rollups import ROLLUP_COLUMNS, RollupCube
+
+logger = logging.getLogger(__name__)
+
+# Go up 4 levels: services -> app -> backend -> Project root
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+DATA_DIR = os.path.join(BASE_DIR, "data")
+MERGED_DATA_PATH = os.path.join(DATA_DIR, "merged_data.csv")
+MERGED_LAGS_PATH = os.path.join(DATA_DIR, "merged_data_with_lags.csv")
+
+# "columnar" serves queries from memory-mapped column files built from the
+# CSV (see prepare_data.py); "csv" parses the CSV into memory as before
+DATA_STORE = os.getenv("DATA_STORE", "columnar")
+
+
+class DatasetStore:
+    """
+    A time-indexed dataset sourced from a CSV file.
+
+    By default queries are served from a columnar store next to the CSV
+    (memory-mapped NumPy column files, see app/services/columnar.py). It is
+    rebuilt from the CSV whenever the CSV's size or mtime no longer match
+    it, and range queries only touch the requested columns' rows. If the
+    store can't be built, or DATA_STORE=csv, the CSV is parsed into an
+    in-memory frame instead. Either way the data is reloaded only when the
+    CSV changes, and range queries are a pair of binary searches over the
+    index. If `rollup_columns` is given, a RollupCube over those columns is
+    rebuilt alongside every load.
+    """
+
+    def __init__(self, path: str, time_column: str = "datetime", rollup_columns=None,
+                 store_dir: str = None, columnar: bool = DATA_STORE == "columnar"):
+        self.path = path
+        self.time_column = time_column
+        self.rollup_columns = rollup_columns
+        self.store_dir = store_dir or default_store_dir(path)
+        self.columnar = columnar
+        self._lock = threading.Lock()
+        self._store = None
+        self._frame = None
+        self._cube = None
+        self._mtime = None
+        self._loaded = False
+
+    def _source_mtime(self):
+        return os.path.getmtime(self.path) if os.path.exists(self.path) or not self.columnar else None
+
+    def _open_store(self):
+        """The columnar store, rebuilt first if it's out of date; None to fall back to the CSV"""
+        try:
+            if is_stale(self.store_dir, self.path):
+                prepare_store(self.path, self.store_dir, self.time_column)
+                logger.info("Rebuilt columnar store %s", self.store_dir)
+            return ColumnarStore(self.store_dir)
+        except Exception as e:
+            if not os.path.exists(self.path):
+                raise
+            logger.warning("Columnar store unavailable, reading %s instead: %s", self.path, e)
+            return None
+
+    def load(self) -> pd.DataFrame:
+        """(Re)build or open the data and swap it in as current"""
+        mtime = self._source_mtime()
+        store = self._open_store() if self.columnar else None
+        if store is not None:
+            df = None
+            cube = RollupCube(store.frame(self.rollup_columns), self.rollup_columns) if self.rollup_columns else None
+        else:
+            df = pd.read_csv(self.path)
+            df[self.time_column] = pd.to_datetime(df[self.time_column])
+            df = derive_columns(df.set_index(self.time_column).sort_index(kind="stable"))
+            cube = RollupCube(df, self.rollup_columns) if self.rollup_columns else None
+
+        self._store = store
+        self._frame = df
+        self._cube = cube
+        self._mtime = mtime
+        self._loaded = True
+        return df
+
+    def _ensure_current(self):
+        """Reload if nothing is loaded yet or the CSV changed on disk"""
+        if not self._loaded or self._source_mtime() != self._mtime:
+            with self._lock:
+                # Another request may have reloaded while we waited
+                if not self._loaded or self._source_mtime() != self._mtime:
+                    self.load()
+
+    def columns(self, columns) -> pd.DataFrame:
+        """Every row of those `columns` the data has (views onto the column files when columnar)"""
+        self._ensure_current()
+        store = self._store
+        if store is not None:
+            return store.frame([col for col in columns if col in store.columns])
+        df = self._frame
+        return df[[col for col in columns if col in df.columns]]
+
+    def rollups(self) -> RollupCube:
+        """Return the rollup cube matching the current data"""
+        self._ensure_current()
+        return self._cube
+
+    def range(self, start, end, columns=None) -> pd.DataFrame:
+        """Rows with start <= index <= end, found by binary search on the index"""
+        self._ensure_current()
+        store = self._store
+        if store is not None:
+            return store.range(start, end, columns)
+
+        df = self._frame
+        lo = df.index.searchsorted(pd.Timestamp(start), side="left")
+        hi = df.index.searchsorted(pd.Timestamp(end), side="right")
+        rows = df.iloc[lo:hi]
+        return rows if columns is None else rows[columns]
+
+
+# Shared store for the hourly plant + weather history
+merged_data = DatasetStore(MERGED_DATA_PATH, rollup_columns=ROLLUP_COLUMNS)
@@ -0,0 +1,33 @@
+import numpy as np
+
+
+def minmax_indices(values: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Positions of at most `max_points` values that keep the series' shape.
+
+    The series is cut into max_points // 2 buckets of consecutive values
+    and the minimum and maximum of each bucket are kept, so peaks and dips
+    survive however far the series is thinned. NaN counts as 0.0, the value
+    it is charted as. Returns sorted positions; all of them when the series
+    is already short enough. Raises ValueError for max_points below 2, which
+    can't hold a bucket's min and max.
+    """
+    if max_points < 2:
+        raise ValueError(f"max_points must be at least 2, got {max_points}")
+    n = len(values)
+    if n <= max_points:
+        return np.arange(n)
+
+    values = np.nan_to_num(np.asarray(values, dtype=np.float64), nan=0.0)
+    buckets = max_points // 2
+    # n > buckets, so every bucket holds at least one value
+    starts = np.linspace(0, n, buckets + 1).astype(np.int64)[:-1]
+    counts = np.diff(np.append(starts, n))
+
+    positions = []
+    for reduce in (np.minimum, np.maximum):
+        extreme = np.repeat(reduce.reduceat(values, starts), counts)
+        # First position in each bucket holding that bucket's extreme
+        hits = np.flatnonzero(values == extreme)
+        positions.append(hits[np.searchsorted(hits, starts)])
+    return np.unique(np.concatenate(positions))
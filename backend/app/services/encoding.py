@@ -0,0 +1,303 @@
+import io
+import os
+import zlib
+import numpy as np
+import orjson
+from starlette.datastructures import Headers, MutableHeaders
+from app.services.metrics import SERIALIZE, stage
+
+# Arrow IPC / Parquet output needs pyarrow and "br" compression needs brotli.
+# Both are in requirements.txt; without them the server still runs, the two
+# formats are refused and clients asking for "br" get gzip.
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Responses smaller than this are sent uncompressed
+COMPRESSION_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024"))
+# zlib level for gzip; 9 costs a lot of CPU on big CSV streams for little gain
+GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", "4"))
+# Never compressed: each event has to reach the client as it is sent
+UNCOMPRESSED_CONTENT_TYPES = ("text/event-stream",)
+
+# Output formats
+JSON = "json"          # the endpoint's usual layout (a list of records for history)
+COLUMNS = "columns"    # columnar JSON: {"column": [values, ...], ...}
+CSV = "csv"
+ARROW = "arrow"        # Arrow IPC stream
+PARQUET = "parquet"
+
+MEDIA_TYPES = {
+    JSON: "application/json",
+    COLUMNS: "application/json",
+    CSV: "text/csv",
+    ARROW: "application/vnd.apache.arrow.stream",
+    PARQUET: "application/vnd.apache.parquet",
+}
+# Accept header media types that select a format
+ACCEPT_FORMATS = {
+    "application/json": JSON,
+    "text/csv": CSV,
+    "application/vnd.apache.arrow.stream": ARROW,
+    "application/vnd.apache.parquet": PARQUET,
+}
+
+
+class UnsupportedFormatError(ValueError):
+    """Raised when the requested output format can't be produced"""
+
+
+def negotiate(requested, accept, offered: tuple) -> str:
+    """
+    Output format for a request: the `format` query parameter if given,
+    otherwise the most preferred Accept media type the endpoint offers,
+    otherwise the endpoint's default (first in `offered`).
+    """
+    if requested:
+        fmt = requested.lower()
+        if fmt not in offered:
+            raise UnsupportedFormatError(f"Unknown format '{requested}', expected one of: {', '.join(offered)}")
+    else:
+        fmt = offered[0]
+        ranges = []
+        for i, part in enumerate((accept or "").split(",")):
+            media, _, params = part.strip().partition(";")
+            q = 1.0
+            for param in params.split(";"):
+                name, _, value = param.strip().partition("=")
+                if name == "q":
+                    try:
+                        q = float(value)
+                    except ValueError:
+                        q = 0.0
+            ranges.append((-q, i, media.strip().lower()))
+        # Media types the endpoint doesn't offer are skipped, so generic Accept
+        # headers (e.g. "application/json, text/plain, */*") keep the default
+        for neg_q, _, media in sorted(ranges):
+            accepted = ACCEPT_FORMATS.get(media)
+            if accepted in (ARROW, PARQUET) and pa is None:
+                continue
+            if neg_q < 0 and accepted in offered:
+                fmt = accepted
+                break
+
+    if fmt in (ARROW, PARQUET) and pa is None:
+        raise UnsupportedFormatError(f"The '{fmt}' format needs pyarrow, which is not installed on the server")
+    return fmt
+
+
+def _column_values(values):
+    """A column in a form orjson serializes directly"""
+    values = np.asarray(values)
+    if values.dtype.kind == "M":
+        return np.datetime_as_string(values, unit="s").tolist()
+    if values.dtype.kind in "fiub":
+        return np.ascontiguousarray(values)
+    return values.tolist()
+
+
+def columns_json(columns: dict) -> bytes:
+    """Columnar JSON (parallel arrays) with orjson; NaN becomes null"""
+    with stage(SERIALIZE):
+        return orjson.dumps({name: _column_values(values) for name, values in columns.items()},
+                            option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def arrow_table(columns: dict):
+    return pa.table({name: pa.array(np.asarray(values)) for name, values in columns.items()})
+
+
+def arrow_bytes(columns: dict) -> bytes:
+    """One Arrow IPC stream holding `columns`"""
+    with stage(SERIALIZE):
+        table = arrow_table(columns)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+
+def parquet_bytes(columns: dict) -> bytes:
+    with stage(SERIALIZE):
+        sink = pa.BufferOutputStream()
+        pq.write_table(arrow_table(columns), sink)
+        return sink.getvalue().to_pybytes()
+
+
+def encode_columns(columns: dict, fmt: str) -> bytes:
+    """Encode a dict of equal-length columns in a COLUMNS, ARROW or PARQUET format"""
+    if fmt == ARROW:
+        return arrow_bytes(columns)
+    if fmt == PARQUET:
+        return parquet_bytes(columns)
+    return columns_json(columns)
+
+
+def iter_frame_columns_json(frames):
+    """
+    Scored frames as a single columnar JSON document. The columns have to
+    be complete before the document can be written, so this buffers them.
+    """
+    parts = {}
+    for frame in frames:
+        for name in frame.columns:
+            parts.setdefault(name, []).append(frame[name].to_numpy())
+    if parts:
+        yield columns_json({name: np.concatenate(chunks) for name, chunks in parts.items()})
+    else:
+        yield b"{}"
+
+
+def iter_frame_arrow(frames):
+    """Scored frames as one Arrow IPC stream, one record batch per frame"""
+    sink = io.BytesIO()
+    writer = None
+    for frame in frames:
+        with stage(SERIALIZE):
+            batch = pa.RecordBatch.from_pandas(frame, preserve_index=False)
+            if writer is None:
+                writer = pa.ipc.new_stream(sink, batch.schema)
+            writer.write_batch(batch)
+            data = sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+        yield data
+    if writer is not None:
+        writer.close()
+        yield sink.getvalue()
+
+
+def iter_frame_parquet(frames):
+    """Scored frames as one Parquet file, one row group per frame"""
+    sink = io.BytesIO()
+    writer = None
+    for frame in frames:
+        with stage(SERIALIZE):
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(sink, table.schema)
+            writer.write_table(table)
+            data = sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+        yield data
+    if writer is not None:
+        writer.close()
+        yield sink.getvalue()
+
+
+class GzipCompressor:
+    encoding = "gzip"
+
+    def __init__(self, level: int = GZIP_LEVEL):
+        # wbits 31: deflate with a gzip header and trailer
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        """Compress a chunk; every chunk is flushed so streamed output reaches the client as it's made"""
+        if not data and not final:
+            return b""
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class BrotliCompressor:
+    encoding = "br"
+
+    def __init__(self, quality: int = BROTLI_QUALITY):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        if not data and not final:
+            return b""
+        return self._compressor.process(data) + (self._compressor.finish() if final else self._compressor.flush())
+
+
+def _accepted_encodings(header: str) -> set:
+    encodings = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if params.replace(" ", "") not in ("q=0", "q=0.0"):
+            encodings.add(name.strip().lower())
+    return encodings
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses for clients that accept it: Brotli when the
+    client takes "br" and brotli is installed, gzip otherwise. Streamed
+    responses are compressed chunk by chunk. Responses smaller than
+    `minimum_size`, responses that already carry a Content-Encoding and
+    event streams are passed through.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES, gzip_level: int = GZIP_LEVEL,
+                 brotli_quality: int = BROTLI_QUALITY):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def _compressor(self, scope):
+        """A compressor for the encoding the client prefers, or None to send the response as is"""
+        accepted = _accepted_encodings(Headers(scope=scope).get("Accept-Encoding", ""))
+        if "br" in accepted and brotli is not None:
+            return BrotliCompressor(self.brotli_quality)
+        if "gzip" in accepted:
+            return GzipCompressor(self.gzip_level)
+        return None
+
+    async def __call__(self, scope, receive, send):
+        compressor = self._compressor(scope) if scope["type"] == "http" else None
+        if compressor is None:
+            await self.app(scope, receive, send)
+            return
+
+        # The response start is held back until the first body chunk shows
+        # whether (and how) the headers have to change
+        start = None
+        compressing = False
+
+        async def send_compressed(message):
+            nonlocal start, compressing
+            kind = message["type"]
+            if kind == "http.response.start":
+                start = message
+                return
+            if start is None:
+                # Headers are out; the rest of the body follows the first chunk's choice
+                if compressing:
+                    message = {**message, "body": compressor.compress(message.get("body", b""), not message.get("more_body", False))}
+                await send(message)
+                return
+
+            held, start = start, None
+            headers = MutableHeaders(raw=list(held["headers"]))
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            compressing = (
+                kind == "http.response.body"
+                and "content-encoding" not in headers
+                and not headers.get("content-type", "").startswith(UNCOMPRESSED_CONTENT_TYPES)
+                and (more_body or len(body) >= self.minimum_size)
+            )
+            if compressing:
+                body = compressor.compress(body, not more_body)
+                headers["Content-Encoding"] = compressor.encoding
+                if more_body:
+                    del headers["Content-Length"]
+                else:
+                    headers["Content-Length"] = str(len(body))
+                message = {**message, "body": body}
+            headers.add_vary_header("Accept-Encoding")
+            await send({**held, "headers": headers.raw})
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,217 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from app.services.features import LGBM_FEATURES, LOGREG_FEATURES
+from app.services.inference import BATCH_PM25_THRESHOLD, NativeLGBMPredictor, predict_frame
+from app.services.metrics import INFERENCE, count_routing, registry, stage
+from app.services.model_registry import MODELS_DIR, _fingerprint, load_bundle
+
+# "thread" runs CPU-heavy work on a thread pool; "process" additionally
+# sends model scoring to worker processes, each with its own copy of the models
+EXECUTOR_KIND = os.getenv("EXECUTOR_KIND", "thread")
+EXECUTOR_WORKERS = int(os.getenv("EXECUTOR_WORKERS", str(max(os.cpu_count() or 1, 2))))
+# Jobs allowed in flight (running or waiting) before new requests get a 503
+EXECUTOR_MAX_PENDING = int(os.getenv("EXECUTOR_MAX_PENDING", str(EXECUTOR_WORKERS * 4)))
+# In process mode, frames at least this long are split across all workers
+PARALLEL_MIN_ROWS = int(os.getenv("EXECUTOR_PARALLEL_MIN_ROWS", "20000"))
+
+# Columns a worker process needs to score a prepared frame
+SCORING_COLUMNS = list(dict.fromkeys(LGBM_FEATURES + LOGREG_FEATURES))
+
+
+class PoolSaturatedError(RuntimeError):
+    """Raised when the pool already has `max_pending` jobs in flight"""
+
+
+class WorkerVersionError(RuntimeError):
+    """Raised by a worker process that can't load the model version it was asked to score with"""
+
+
+# Per-process state of pool workers
+_worker_bundle = None
+_worker_models_dir = MODELS_DIR
+
+
+def _init_worker(models_dir: str):
+    """Process pool initializer: load and warm the models once per worker"""
+    global _worker_bundle, _worker_models_dir
+    _worker_models_dir = models_dir
+    _worker_bundle = _load_worker_bundle(models_dir)
+
+
+def _load_worker_bundle(models_dir: str):
+    bundle = load_bundle(models_dir)
+    # Workers already run in parallel; one LightGBM thread each avoids oversubscription
+    if isinstance(bundle.lgbm, NativeLGBMPredictor):
+        bundle.lgbm.num_threads = 1
+    return bundle
+
+
+def _worker_ready() -> int:
+    return os.getpid()
+
+
+def _score_in_worker(frame: pd.DataFrame, version: str, pm25_threshold: float) -> np.ndarray:
+    """
+    Score a prepared frame with this worker's models if they are `version`.
+
+    A worker on another version reloads from disk, but only when the
+    artifacts changed since its last load: the disk may already hold a
+    version newer than the server's, and reloading it again wouldn't help.
+    Raises WorkerVersionError when the worker still isn't on `version`.
+    """
+    global _worker_bundle
+    if _worker_bundle is None or _worker_bundle.version != version:
+        if _worker_bundle is None or _fingerprint(_worker_models_dir) != _worker_bundle.fingerprint:
+            _worker_bundle = _load_worker_bundle(_worker_models_dir)
+        if _worker_bundle.version != version:
+            raise WorkerVersionError(f"Worker has model version {_worker_bundle.version}, not {version}")
+    return predict_frame(frame, _worker_bundle.lgbm, _worker_bundle.log_reg, pm25_threshold)
+
+
+class WorkPool:
+    """
+    Runs CPU-bound request work (pandas parsing, resampling, model scoring)
+    off the event loop.
+
+    `run()` executes a callable on the thread pool. In process mode,
+    `predict_frame()` additionally ships scoring to worker processes that
+    load the models once at start-up, splitting large frames across all of
+    them. In thread mode large frames are scored in one call and LightGBM
+    spreads the work over its own threads.
+
+    Admission control: at most `max_pending` admitted jobs are in flight at
+    once; past that `run()` raises PoolSaturatedError immediately instead
+    of queuing.
+    """
+
+    def __init__(self, kind: str = EXECUTOR_KIND, workers: int = EXECUTOR_WORKERS,
+                 max_pending: int = EXECUTOR_MAX_PENDING, models_dir: str = MODELS_DIR,
+                 parallel_min_rows: int = PARALLEL_MIN_ROWS):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind: {kind}")
+        self.kind = kind
+        self.workers = workers
+        self.max_pending = max_pending
+        self.models_dir = models_dir
+        self.parallel_min_rows = parallel_min_rows
+        self._threads = None
+        self._processes = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def start(self):
+        with self._lock:
+            if self._threads is None:
+                self._threads = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="work-pool")
+            if self.kind == "process" and self._processes is None:
+                # spawn rather than fork: the parent already runs threads (model watcher, thread pool)
+                self._processes = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.models_dir,),
+                )
+                # Bring every worker up now so the first batch doesn't pay for model loading
+                for _ in range(self.workers):
+                    self._processes.submit(_worker_ready)
+
+    def shutdown(self):
+        with self._lock:
+            threads, processes = self._threads, self._processes
+            self._threads = self._processes = None
+        if processes is not None:
+            processes.shutdown(wait=True, cancel_futures=True)
+        if threads is not None:
+            threads.shutdown(wait=True, cancel_futures=True)
+
+    @property
+    def saturated(self) -> bool:
+        return self.in_flight >= self.max_pending
+
+    def admit(self):
+        """Raise PoolSaturatedError if no new job can be taken on right now"""
+        if self.saturated:
+            with self._lock:
+                self.rejected += 1
+            raise PoolSaturatedError(f"{self.in_flight} jobs in flight (limit {self.max_pending})")
+
+    async def run(self, fn, *args, admit: bool = True):
+        """
+        Run `fn(*args)` on the thread pool and return its result.
+
+        Pass `admit=False` for follow-up work of a job that was already
+        admitted (e.g. later chunks of a streamed batch), so a busy server
+        doesn't cut off a response halfway through.
+        """
+        if admit:
+            self.admit()
+        if self._threads is None:
+            self.start()
+        with self._lock:
+            self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._threads, fn, *args)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self.completed += 1
+
+    def predict_frame(self, df: pd.DataFrame, models, pm25_threshold: float = BATCH_PM25_THRESHOLD,
+                      metrics: bool = True) -> np.ndarray:
+        """
+        Score a prepared frame with `models` (a ModelBundle). Blocking; call
+        it from pool work, not from the event loop. With `metrics=False` the
+        rows aren't counted in the routing and inference metrics, for
+        scoring the service does for itself rather than for a request.
+        """
+        if metrics:
+            # Routing is counted here, in the serving process, whichever kind of pool scores the rows
+            lgbm_rows = int((df['PM25'] <= pm25_threshold).sum()) if len(df) else 0
+            count_routing(lgbm_rows, len(df) - lgbm_rows)
+
+        processes = self._processes
+        with stage(INFERENCE) if metrics else nullcontext():
+            if processes is None or len(df) == 0:
+                return predict_frame(df, models.lgbm, models.log_reg, pm25_threshold)
+
+            frame = df[SCORING_COLUMNS]
+            parts = self.workers if len(frame) >= self.parallel_min_rows else 1
+            bounds = np.linspace(0, len(frame), parts + 1).astype(int)
+            spans = [(lo, hi) for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo]
+            futures = [processes.submit(_score_in_worker, frame.iloc[lo:hi], models.version, pm25_threshold)
+                       for lo, hi in spans]
+            results = []
+            for (lo, hi), future in zip(spans, futures):
+                try:
+                    results.append(future.result())
+                except WorkerVersionError:
+                    # Models on disk no longer match `models`; score this part here with them
+                    results.append(predict_frame(frame.iloc[lo:hi], models.lgbm, models.log_reg, pm25_threshold))
+            return np.concatenate(results)
+
+    def status(self) -> dict:
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+work_pool = WorkPool()
+registry.gauge("work_pool_in_flight", "Jobs running or waiting on the work pool", lambda: work_pool.in_flight)
+
+
+def get_work_pool() -> WorkPool:
+    """FastAPI dependency for the shared work pool"""
+    return work_pool
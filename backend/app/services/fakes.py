@@ -0,0 +1,91 @@
+"""
+Offline stand-ins for NASA POWER and OpenAQ.
+
+Both answer from local data after a configurable delay, so load tests
+and the test suite exercise the real providers (pooling, caching,
+request coalescing, retries) without touching the network.
+"""
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+import httpx
+import pandas as pd
+from app.services.air_quality import PM25_PARAMETER_ID, PM25Provider
+from app.services.dataset import MERGED_DATA_PATH
+from app.services.weather import NasaPowerProvider, WEATHER_PARAMETERS
+
+
+def nasa_payload(start_date: str, end_date: str) -> dict:
+    """A NASA POWER `properties.parameter` block for the dates, filled from the history data"""
+    history = pd.read_csv(MERGED_DATA_PATH)
+    by_hour = history.groupby("Hour")[[p for p in WEATHER_PARAMETERS if p in history.columns]].mean()
+    hours = pd.date_range(pd.Timestamp(start_date), pd.Timestamp(end_date) + pd.Timedelta(hours=23), freq="h")
+    parameters = {}
+    for param in WEATHER_PARAMETERS:
+        values = by_hour[param] if param in by_hour else pd.Series(0.0, index=range(24))
+        parameters[param] = {t.strftime("%Y%m%d%H"): round(float(values.get(t.hour, 0.0)), 2) for t in hours}
+    return parameters
+
+
+class FakeNasaTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport answering NASA POWER hourly requests after `latency`
+    seconds. The first requests are answered with `statuses` in turn (e.g.
+    [503, 503]) before it starts succeeding; `urls` records every request.
+    """
+
+    def __init__(self, latency: float = 0.05, statuses=()):
+        self.latency = latency
+        self.requests = 0
+        self.urls = []
+        self._statuses = list(statuses)
+        self._payloads = {}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        self.urls.append(request.url)
+        await asyncio.sleep(self.latency)
+        if self._statuses:
+            return httpx.Response(self._statuses.pop(0), content=b"upstream error")
+        start, end = request.url.params["start"], request.url.params["end"]
+        if (start, end) not in self._payloads:
+            self._payloads[(start, end)] = json.dumps({"properties": {"parameter": nasa_payload(start, end)}}).encode()
+        return httpx.Response(200, content=self._payloads[(start, end)], headers={"content-type": "application/json"})
+
+
+class FakeOpenAQClient:
+    """Duck-typed openaq.OpenAQ: `locations.list` and `measurements.list` after `latency` seconds"""
+
+    def __init__(self, latency: float = 0.05, pm25: float = 18.0):
+        self.latency = latency
+        self.requests = 0
+        self.locations = SimpleNamespace(list=self._list_locations)
+        self.measurements = SimpleNamespace(list=self._list_measurements)
+        self._pm25 = pm25
+
+    def _list_locations(self, coordinates, radius, limit, parameters_id):
+        self.requests += 1
+        time.sleep(self.latency)
+        lat, lon = coordinates
+        sensor = SimpleNamespace(id=int(abs(lat * 100)) * 100000 + int(abs(lon * 100)),
+                                 parameter=SimpleNamespace(id=PM25_PARAMETER_ID, units="µg/m³"))
+        location = SimpleNamespace(name=f"Station {lat:.2f},{lon:.2f}", distance=1500.0, sensors=[sensor],
+                                   coordinates=SimpleNamespace(latitude=lat + 0.01, longitude=lon))
+        return SimpleNamespace(results=[location])
+
+    def _list_measurements(self, sensors_id, limit):
+        self.requests += 1
+        time.sleep(self.latency)
+        return SimpleNamespace(results=[SimpleNamespace(value=self._pm25)])
+
+    def close(self):
+        pass
+
+
+def fake_weather_provider(latency: float = 0.05) -> NasaPowerProvider:
+    return NasaPowerProvider(transport=FakeNasaTransport(latency), retries=0)
+
+
+def fake_pm25_provider(latency: float = 0.05) -> PM25Provider:
+    return PM25Provider(client=FakeOpenAQClient(latency))
@@ -0,0 +1,74 @@
+import math
+import numpy as np
+
+# Canonical feature order shared by both models. They only differ in how the
+# AC power lag column was spelled at training time.
+FEATURE_COLUMNS = ['PM25', 'ALLSKY_SFC_SW_DWN', 'ALLSKY_KT', 'T2M', 'WS10M', 'SZA', 'T2M_Lag1', 'PM25_Lag1', 'AC_Power/m2_Lag1', 'power_factor_Lag1', 'Hour_sin', 'Hour_cos', 'Month_sin', 'Month_cos']
+LGBM_FEATURES = FEATURE_COLUMNS
+LOGREG_FEATURES = [col if col != 'AC_Power/m2_Lag1' else 'AC Power/m2_Lag1' for col in FEATURE_COLUMNS]
+
+# Lag values assumed when there is no previous reading to take them from,
+# shared by the batch fill and the portfolio's fleet-wide defaults
+DEFAULT_AC_POWER_LAG1 = 0.0
+DEFAULT_POWER_FACTOR_LAG1 = 0.95
+
+N_FEATURES = len(FEATURE_COLUMNS)
+HOUR_SIN_IDX = FEATURE_COLUMNS.index('Hour_sin')
+MONTH_SIN_IDX = FEATURE_COLUMNS.index('Month_sin')
+
+# Cyclic encodings for every valid hour (0-23) and month (index 1-12, 0 unused)
+HOUR_SIN = np.sin(2 * np.pi * np.arange(24) / 24)
+HOUR_COS = np.cos(2 * np.pi * np.arange(24) / 24)
+MONTH_SIN = np.sin(2 * np.pi * np.arange(13) / 12)
+MONTH_COS = np.cos(2 * np.pi * np.arange(13) / 12)
+
+
+def cyclic_hour(hour) -> tuple:
+    """(sin, cos) of the hour of day, from the lookup table when in range"""
+    if isinstance(hour, int) and 0 <= hour < 24:
+        return HOUR_SIN[hour], HOUR_COS[hour]
+    return math.sin(2 * math.pi * hour / 24), math.cos(2 * math.pi * hour / 24)
+
+
+def cyclic_month(month) -> tuple:
+    """(sin, cos) of the month, from the lookup table when in range"""
+    if isinstance(month, int) and 1 <= month <= 12:
+        return MONTH_SIN[month], MONTH_COS[month]
+    return math.sin(2 * math.pi * month / 12), math.cos(2 * math.pi * month / 12)
+
+
+def cyclic_columns(values, table_sin, table_cos, period: int):
+    """Vectorized sin/cos of an integer-valued column, via the lookup tables"""
+    values = np.asarray(values, dtype=np.float64)
+    if np.isfinite(values).all():
+        idx = values.astype(np.int64)
+        if (idx == values).all() and (len(idx) == 0 or (idx.min() >= 0 and idx.max() < len(table_sin))):
+            return table_sin[idx], table_cos[idx]
+    return np.sin(2 * np.pi * values / period), np.cos(2 * np.pi * values / period)
+
+
+def build_feature_vector(pm25, allsky_sfc_sw_dwn, allsky_kt, t2m, ws10m, sza, t2m_lag1,
+                         pm25_lag1, ac_power_lag1, power_factor_lag1, hour, month,
+                         dtype=np.float64) -> np.ndarray:
+    """One request's features as a (1, N_FEATURES) array in model column order"""
+    hour_sin, hour_cos = cyclic_hour(hour)
+    month_sin, month_cos = cyclic_month(month)
+    return np.array([[
+        pm25, allsky_sfc_sw_dwn, allsky_kt, t2m, ws10m, sza, t2m_lag1,
+        pm25_lag1, ac_power_lag1, power_factor_lag1,
+        hour_sin, hour_cos, month_sin, month_cos,
+    ]], dtype=dtype)
+
+
+def build_feature_matrix(df, columns=FEATURE_COLUMNS, dtype=np.float64) -> np.ndarray:
+    """
+    Stack the feature columns of a prepared frame into a C-contiguous matrix.
+
+    Works on anything indexable by column name that yields array-likes
+    (a DataFrame or a plain dict of NumPy arrays).
+    """
+    n = len(df[columns[0]])
+    out = np.empty((n, len(columns)), dtype=dtype)
+    for j, col in enumerate(columns):
+        out[:, j] = df[col]
+    return out
@@ -0,0 +1,85 @@
+import os
+import numpy as np
+import pandas as pd
+from app.services.features import FEATURE_COLUMNS, HOUR_COS, HOUR_SIN, MONTH_COS, MONTH_SIN, N_FEATURES
+from app.services.inference import SINGLE_PM25_THRESHOLD, predict_matrix
+
+# Longest horizon and most sites/scenarios one forecast request may ask for
+FORECAST_MAX_HOURS = int(os.getenv("FORECAST_MAX_HOURS", "168"))
+FORECAST_MAX_SITES = int(os.getenv("FORECAST_MAX_SITES", "100"))
+
+# NASA POWER parameters, in the order they are stored in a weather matrix
+WEATHER_COLUMNS = ['ALLSKY_SFC_SW_DWN', 'ALLSKY_KT', 'T2M', 'WS10M', 'SZA']
+_WEATHER_IDX = [FEATURE_COLUMNS.index(col) for col in WEATHER_COLUMNS]
+_T2M = WEATHER_COLUMNS.index('T2M')
+
+_PM25, _T2M_LAG, _PM25_LAG, _AC_LAG, _PF_LAG, _HOUR_SIN, _HOUR_COS, _MONTH_SIN, _MONTH_COS = (
+    FEATURE_COLUMNS.index(col) for col in
+    ['PM25', 'T2M_Lag1', 'PM25_Lag1', 'AC_Power/m2_Lag1', 'power_factor_Lag1', 'Hour_sin', 'Hour_cos', 'Month_sin', 'Month_cos']
+)
+
+
+def forecast_times(start_date: str, start_hour: int, hours: int) -> pd.DatetimeIndex:
+    """The hourly steps of a forecast, starting at `start_hour` on a YYYYMMDD date"""
+    start = pd.to_datetime(start_date, format="%Y%m%d") + pd.Timedelta(hours=start_hour)
+    return pd.date_range(start, periods=hours, freq="h")
+
+
+def weather_dates(times: pd.DatetimeIndex) -> tuple:
+    """YYYYMMDD range to fetch for `times`, including the hour before the first step (for T2M_Lag1)"""
+    first = times[0] - pd.Timedelta(hours=1)
+    return first.strftime("%Y%m%d"), times[-1].strftime("%Y%m%d")
+
+
+def weather_matrix(properties: dict, times: pd.DatetimeIndex) -> np.ndarray:
+    """
+    (len(times) + 1, len(WEATHER_COLUMNS)) array from a NASA POWER
+    `properties.parameter` block. Row 0 is the hour before the first step.
+    Missing values are 0.0, as in /api/predict.
+    """
+    keys = times.insert(0, times[0] - pd.Timedelta(hours=1)).strftime("%Y%m%d%H")
+    out = np.zeros((len(keys), len(WEATHER_COLUMNS)))
+    for j, param in enumerate(WEATHER_COLUMNS):
+        values = properties.get(param, {})
+        out[:, j] = [values.get(key, 0.0) for key in keys]
+    return out
+
+
+def recursive_forecast(weather: np.ndarray, times: pd.DatetimeIndex, pm25: np.ndarray, pm25_lag1: np.ndarray,
+                       ac_power_lag1: np.ndarray, power_factor_lag1: np.ndarray, lgbm_model, log_reg_model,
+                       pm25_threshold: float = SINGLE_PM25_THRESHOLD) -> tuple:
+    """
+    Predict every step of the horizon for n sites (or scenarios) at once.
+
+    `weather` is (n, len(times) + 1, len(WEATHER_COLUMNS)), one
+    weather_matrix per site. Each step scores all n rows together, then its
+    predicted AC power becomes the next step's AC power lag. PM2.5 and the
+    power factor are held at their current values, so from the second step
+    on PM25_Lag1 is the current PM2.5. T2M_Lag1 comes from the weather series.
+
+    Returns (predictions, lgbm_mask), both (n, len(times)).
+    """
+    n, steps = len(pm25), len(times)
+    predictions = np.empty((n, steps))
+    lgbm_mask = np.empty((n, steps), dtype=bool)
+
+    X = np.empty((n, N_FEATURES))
+    X[:, _PM25] = pm25
+    X[:, _PM25_LAG] = pm25_lag1
+    X[:, _AC_LAG] = ac_power_lag1
+    X[:, _PF_LAG] = power_factor_lag1
+
+    hours, months = times.hour.to_numpy(), times.month.to_numpy()
+    for t in range(steps):
+        X[:, _WEATHER_IDX] = weather[:, t + 1]
+        X[:, _T2M_LAG] = weather[:, t, _T2M]
+        X[:, _HOUR_SIN], X[:, _HOUR_COS] = HOUR_SIN[hours[t]], HOUR_COS[hours[t]]
+        X[:, _MONTH_SIN], X[:, _MONTH_COS] = MONTH_SIN[months[t]], MONTH_COS[months[t]]
+
+        predictions[:, t], lgbm_mask[:, t] = predict_matrix(X, lgbm_model, log_reg_model, pm25_threshold)
+
+        # Roll this step forward as the next step's lags
+        X[:, _AC_LAG] = predictions[:, t]
+        X[:, _PM25_LAG] = pm25
+
+    return predictions, lgbm_mask
@@ -0,0 +1,161 @@
+import os
+import numpy as np
+import pandas as pd
+from app.services.features import LGBM_FEATURES, LOGREG_FEATURES, build_feature_matrix
+
+# "native" scores on the raw LightGBM booster and the LogReg pipeline's
+# coefficients; "sklearn" keeps calling the pickled estimators
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "native")
+
+# LightGBM threads for multi-row calls (0 = LightGBM's default, all cores)
+LGBM_NUM_THREADS = int(os.getenv("LGBM_NUM_THREADS", "0"))
+
+# Calls with at most this many rows run single-threaded; thread start-up
+# costs more than it saves on tiny inputs
+SINGLE_THREAD_MAX_ROWS = 64
+
+# Rows with PM2.5 at or below this value are scored by LGBM, the rest by LogReg
+BATCH_PM25_THRESHOLD = 35
+SINGLE_PM25_THRESHOLD = 25
+
+# Upper bound on rows handed to a model in a single predict call
+DEFAULT_CHUNK_SIZE = 100_000
+
+
+class NativeLGBMPredictor:
+    """Predicts straight on the underlying lgb.Booster, skipping the sklearn wrapper"""
+
+    def __init__(self, model, num_threads: int = LGBM_NUM_THREADS):
+        self.booster = getattr(model, "booster_", model)
+        self.num_threads = num_threads
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        threads = 1 if len(X) <= SINGLE_THREAD_MAX_ROWS else self.num_threads
+        return self.booster.predict(X, num_threads=threads)
+
+
+class LinearPipelinePredictor:
+    """
+    The StandardScaler + LinearRegression pipeline as plain NumPy arithmetic.
+
+    Applies the same operations in the same order as the pipeline, so the
+    results match it to the last bit or two.
+    """
+
+    def __init__(self, pipeline):
+        scaler, regression = (step for _, step in pipeline.steps)
+        self.mean = scaler.mean_ if scaler.with_mean else None
+        self.scale = scaler.scale_ if scaler.with_std else None
+        self.coef = np.ascontiguousarray(regression.coef_, dtype=np.float64)
+        self.intercept = float(regression.intercept_)
+
+    @staticmethod
+    def supports(pipeline) -> bool:
+        steps = [type(step).__name__ for _, step in getattr(pipeline, "steps", [])]
+        return steps == ["StandardScaler", "LinearRegression"]
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        if self.mean is not None:
+            X = X - self.mean
+        if self.scale is not None:
+            X = X / self.scale
+        return X @ self.coef + self.intercept
+
+
+class NamedFeaturePredictor:
+    """
+    Calls a fitted estimator on a frame with its training column names, so
+    sklearn's feature-name check sees what the estimator was fitted on.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.columns = list(model.feature_names_in_)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self.model.predict(pd.DataFrame(X, columns=self.columns, copy=False))
+
+
+def with_feature_names(model):
+    """`model`, wrapped in NamedFeaturePredictor if it was fitted with column names"""
+    return NamedFeaturePredictor(model) if getattr(model, "feature_names_in_", None) is not None else model
+
+
+def make_predictors(lgbm_model, log_reg_model, backend: str = INFERENCE_BACKEND):
+    """
+    Wrap loaded artifacts in the configured inference backend.
+
+    Falls back to the estimator's own predict for artifacts the native
+    path doesn't recognise.
+    """
+    if backend != "native":
+        return with_feature_names(lgbm_model), with_feature_names(log_reg_model)
+
+    lgbm = NativeLGBMPredictor(lgbm_model) if hasattr(lgbm_model, "booster_") else with_feature_names(lgbm_model)
+    log_reg = LinearPipelinePredictor(log_reg_model) if LinearPipelinePredictor.supports(log_reg_model) else with_feature_names(log_reg_model)
+    return lgbm, log_reg
+
+
+def predict_frame(df: pd.DataFrame, lgbm_model, log_reg_model,
+                  pm25_threshold: float = BATCH_PM25_THRESHOLD,
+                  chunk_size: int = DEFAULT_CHUNK_SIZE) -> np.ndarray:
+    """
+    Score every row of a prepared feature frame.
+
+    The frame is split once on the PM2.5 routing mask, each model is called
+    on its whole partition (in chunks of at most `chunk_size` rows) and the
+    results are scattered back so they line up with the original row order.
+    """
+    predictions = np.empty(len(df), dtype=np.float64)
+    if len(df) == 0:
+        return predictions
+
+    # NaN PM2.5 compares False and is routed to LogReg, same as the row-wise check
+    lgbm_mask = (df['PM25'] <= pm25_threshold).to_numpy()
+
+    _predict_partition(lgbm_model, df, LGBM_FEATURES, np.flatnonzero(lgbm_mask), predictions, chunk_size)
+    _predict_partition(log_reg_model, df, LOGREG_FEATURES, np.flatnonzero(~lgbm_mask), predictions, chunk_size)
+
+    return predictions
+
+
+def predict_one(features: np.ndarray, lgbm_model, log_reg_model,
+                pm25_threshold: float = SINGLE_PM25_THRESHOLD):
+    """
+    Score a single (1, N_FEATURES) feature vector.
+
+    Returns (prediction, model name) so callers can report which model ran.
+    """
+    if features[0, 0] <= pm25_threshold:
+        return float(lgbm_model.predict(features)[0]), "lgbm"
+    return float(log_reg_model.predict(features)[0]), "logreg"
+
+
+def predict_matrix(X: np.ndarray, lgbm_model, log_reg_model,
+                   pm25_threshold: float = SINGLE_PM25_THRESHOLD):
+    """
+    Score an (n, N_FEATURES) matrix with one call per model.
+
+    Returns (predictions, lgbm_mask), the mask marking the rows LGBM scored.
+    """
+    predictions = np.empty(len(X))
+    # NaN PM2.5 compares False and goes to LogReg, same as predict_one
+    lgbm_mask = X[:, 0] <= pm25_threshold
+    if lgbm_mask.any():
+        predictions[lgbm_mask] = lgbm_model.predict(X[lgbm_mask])
+    if not lgbm_mask.all():
+        predictions[~lgbm_mask] = log_reg_model.predict(X[~lgbm_mask])
+    return predictions, lgbm_mask
+
+
+def _predict_partition(model, df, columns, positions, out, chunk_size):
+    """Run `model` over the rows at `positions` and write results into `out`"""
+    if len(positions) == 0:
+        return
+
+    # Features of this partition's rows only; the other model builds its own
+    rows = df if len(positions) == len(df) else df.iloc[positions]
+    features = build_feature_matrix(rows, columns)
+    for start in range(0, len(positions), chunk_size):
+        stop = start + chunk_size
+        out[positions[start:stop]] = model.predict(features[start:stop])
@@ -0,0 +1,289 @@
+import csv
+import io
+import logging
+import math
+import os
+import re
+import threading
+import numpy as np
+import pandas as pd
+from app.services.dataset import DATA_DIR
+from app.services.rollups import ROLLUP_COLUMNS, RollupCube
+from app.services.solar import solar_zenith
+
+logger = logging.getLogger(__name__)
+
+# One readings file per site, in the layout of merged_data_with_lags.csv
+INGEST_DIR = os.getenv("INGEST_DIR", os.path.join(DATA_DIR, "ingest"))
+# Most readings one ingestion request may carry
+INGEST_MAX_READINGS = int(os.getenv("INGEST_MAX_READINGS", "10000"))
+
+SITE_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+FILE_COLUMNS = ['datetime', 'AC Power/m2', 'power_factor', 'PM25', 'ALLSKY_SFC_SW_DWN', 'ALLSKY_KT', 'T2M', 'WS10M', 'SZA',
+                'T2M_Lag1', 'PM25_Lag1', 'Month', 'Day', 'Hour', 'AC Power/m2_Lag1', 'power_factor_Lag1']
+
+# Reading field for each measured column of the file
+READING_FIELDS = {
+    'AC Power/m2': 'ac_power',
+    'power_factor': 'power_factor',
+    'PM25': 'pm25',
+    'ALLSKY_SFC_SW_DWN': 'allsky_sfc_sw_dwn',
+    'ALLSKY_KT': 'allsky_kt',
+    'T2M': 't2m',
+    'WS10M': 'ws10m',
+    'SZA': 'sza',
+}
+
+# Lag column -> the column it lags by one hour
+LAG_COLUMNS = {
+    'T2M_Lag1': 'T2M',
+    'PM25_Lag1': 'PM25',
+    'AC Power/m2_Lag1': 'AC Power/m2',
+    'power_factor_Lag1': 'power_factor',
+}
+# Lags a reading may bring itself for when there is no reading an hour before it
+SUPPLIED_LAGS = {'T2M_Lag1': 't2m_lag1', 'PM25_Lag1': 'pm25_lag1'}
+
+ONE_HOUR = pd.Timedelta(hours=1)
+
+
+class IngestError(ValueError):
+    """Raised when readings can't be ingested as sent"""
+
+
+class SiteNotFoundError(LookupError):
+    """Raised for a site that has no ingested readings"""
+
+
+def _local_time(value, timezone: str) -> pd.Timestamp:
+    """Naive local time in `timezone`; naive values are taken to be in it already"""
+    ts = pd.Timestamp(value)
+    return ts.tz_convert(timezone).tz_localize(None) if ts.tzinfo is not None else ts
+
+
+def _lags(previous, ts: pd.Timestamp) -> dict:
+    """
+    Lag columns of a reading at `ts`: the previous reading's values if it
+    is exactly one hour earlier, NaN otherwise (as in the history file).
+    """
+    if previous is None or ts - previous['datetime'] != ONE_HOUR:
+        return {lag: float('nan') for lag in LAG_COLUMNS}
+    return {lag: previous[col] for lag, col in LAG_COLUMNS.items()}
+
+
+def _number(value) -> float:
+    return float('nan') if value is None else float(value)
+
+
+class SiteState:
+    """
+    Rolling state of one site: hour/day/month rollups over its readings and
+    its latest reading, from which the next reading's lags are taken.
+    """
+
+    def __init__(self, site_id: str, cube: RollupCube, last: dict = None):
+        self.site_id = site_id
+        self.cube = cube
+        self.last = last
+        self.lock = threading.Lock()
+
+    def add(self, row: dict):
+        """Take in one reading (a row in FILE_COLUMNS layout) that is later than the latest"""
+        self.cube.append(row['datetime'], [row[col] for col in self.cube.columns])
+        self.last = row
+
+    def status(self) -> dict:
+        last = self.last
+        if last is None:
+            return {"site_id": self.site_id, "rows": 0, "latest": None, "next": None}
+        upcoming = last['datetime'] + ONE_HOUR
+        return {
+            "site_id": self.site_id,
+            "rows": len(self.cube),
+            "latest": last['datetime'].isoformat(),
+            # What /api/predict fills in for this site when no lags are sent
+            "next": {"datetime": upcoming.isoformat(), "hour": upcoming.hour, "month": upcoming.month, **self.next_lags()},
+        }
+
+    def next_lags(self) -> dict:
+        """Lag inputs of /api/predict for the hour after the latest reading; None where unknown"""
+        last = self.last or {}
+
+        def value(col):
+            v = last.get(col)
+            return None if v is None or math.isnan(v) else v
+
+        return {
+            "pm25_lag1": value('PM25'),
+            "t2m_lag1": value('T2M'),
+            "ac_power_lag1": value('AC Power/m2'),
+            "power_factor_lag1": value('power_factor'),
+        }
+
+
+class IngestStore:
+    """
+    Hourly readings pushed by live sites, appended to one CSV per site under
+    `directory` and kept in memory as per-site rolling state.
+
+    Each reading's lag columns are filled from the site's previous reading
+    and added to its rollups as it arrives, so ingesting costs O(1) per
+    reading however long the site's history is. The files are only read to
+    rebuild a site's state after a restart.
+    """
+
+    def __init__(self, directory: str = INGEST_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._sites = {}
+        # Per-site locks held while a site's file is read
+        self._loading = {}
+
+    def path(self, site_id: str) -> str:
+        return os.path.join(self.directory, f"{site_id}.csv")
+
+    def _load(self, site_id: str):
+        """Site state rebuilt from its readings file, or None if it has none"""
+        path = self.path(site_id)
+        if not os.path.exists(path):
+            return None
+        df = pd.read_csv(path)
+        df['datetime'] = pd.to_datetime(df['datetime'])
+        cube = RollupCube(df.set_index('datetime'), ROLLUP_COLUMNS)
+        last = None
+        if len(df):
+            last = {col: float(df[col].iloc[-1]) for col in FILE_COLUMNS if col != 'datetime'}
+            last['datetime'] = pd.Timestamp(df['datetime'].iloc[-1])
+        logger.info("Loaded %d readings for site %s.", len(df), site_id)
+        return SiteState(site_id, cube, last)
+
+    def _state(self, site_id: str, create: bool = False) -> SiteState:
+        if not SITE_ID_PATTERN.match(site_id):
+            # Never let an id reach the file system unless it is a plain file name
+            raise SiteNotFoundError(f"Unknown site '{site_id}'")
+        with self._lock:
+            state = self._sites.get(site_id)
+            if state is not None:
+                return state
+            loading = self._loading.setdefault(site_id, threading.Lock())
+
+        # Reading a site's file only holds up requests for that site
+        with loading:
+            try:
+                with self._lock:
+                    state = self._sites.get(site_id)
+                if state is None:
+                    state = self._load(site_id)
+                    if state is None:
+                        if not create:
+                            raise SiteNotFoundError(f"No readings ingested for site '{site_id}'")
+                        empty = pd.DataFrame(columns=ROLLUP_COLUMNS, index=pd.DatetimeIndex([], name='datetime'), dtype=np.float64)
+                        state = SiteState(site_id, RollupCube(empty, ROLLUP_COLUMNS))
+                    with self._lock:
+                        state = self._sites.setdefault(site_id, state)
+                return state
+            finally:
+                with self._lock:
+                    self._loading.pop(site_id, None)
+
+    def site(self, site_id: str) -> SiteState:
+        """State of a site with ingested readings; raises SiteNotFoundError otherwise"""
+        return self._state(site_id)
+
+    def ingest(self, site_id: str, readings: list, latitude=None, longitude=None, timezone: str = 'UTC') -> dict:
+        """
+        Append a site's readings (objects with the READING_FIELDS attributes
+        and a `datetime`) and update its rolling state (blocking).
+
+        Readings are taken in time order. A reading at or before the site's
+        latest one is skipped, since the lags and rollups already built on
+        top of that point would no longer hold. A missing SZA is derived from
+        `latitude`/`longitude` when given; aware datetimes are converted to
+        `timezone` and stored as naive local times like the history file.
+        """
+        try:
+            times = pd.DatetimeIndex([_local_time(r.datetime, timezone) for r in readings])
+        except Exception as e:
+            raise IngestError(f"Could not read the reading times in timezone '{timezone}': {e}")
+        order = np.argsort(times.asi8, kind="stable")
+
+        sza = np.array([_number(r.sza) for r in readings])
+        missing_sza = np.isnan(sza)
+        if missing_sza.any() and latitude is not None and longitude is not None:
+            try:
+                sza[missing_sza] = solar_zenith(times[missing_sza].tz_localize(timezone), latitude, longitude)
+            except Exception as e:
+                raise IngestError(f"Could not derive SZA: {e}")
+
+        state = self._state(site_id, create=True)
+        with state.lock:
+            rows = []
+            previous = state.last
+            for i in order:
+                ts = times[i]
+                if previous is not None and ts <= previous['datetime']:
+                    continue
+                reading = readings[i]
+                row = {col: _number(getattr(reading, field)) for col, field in READING_FIELDS.items()}
+                row['SZA'] = sza[i]
+                row.update(_lags(previous, ts))
+                for lag, field in SUPPLIED_LAGS.items():
+                    if math.isnan(row[lag]) and getattr(reading, field) is not None:
+                        row[lag] = float(getattr(reading, field))
+                row.update({'datetime': ts, 'Month': ts.month, 'Day': ts.day, 'Hour': ts.hour})
+                rows.append(row)
+                previous = row
+
+            # The file first: memory must never get ahead of what a restart would rebuild
+            if rows:
+                self._append(site_id, rows)
+            for row in rows:
+                state.add(row)
+
+        return {
+            "site_id": site_id,
+            "accepted": len(rows),
+            "skipped": len(readings) - len(rows),
+            **{k: v for k, v in state.status().items() if k != "site_id"},
+        }
+
+    def _append(self, site_id: str, rows: list):
+        """Append rows to the site's readings file, writing the header for a new file"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(site_id)
+        new_file = not os.path.exists(path)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if new_file:
+            writer.writerow(FILE_COLUMNS)
+        for row in rows:
+            writer.writerow(
+                row[col].strftime('%Y-%m-%d %H:%M:%S') if col == 'datetime'
+                else '' if isinstance(row[col], float) and math.isnan(row[col]) else row[col]
+                for col in FILE_COLUMNS
+            )
+
+        data = buffer.getvalue().encode("utf-8")
+        # Unbuffered, so a failed write can be cut back off the file
+        with open(path, "ab", buffering=0) as f:
+            size = f.seek(0, os.SEEK_END)
+            try:
+                view = memoryview(data)
+                while view:
+                    view = view[f.write(view):]
+            except OSError:
+                # Don't leave part of the batch behind in the file
+                f.truncate(size)
+                raise
+
+    def history(self, site_id: str, start, end, interval: str) -> tuple:
+        """(times, mean AC power) of a site, per day/month bucket or per reading for 'hour'"""
+        state = self.site(site_id)
+        with state.lock:
+            if interval in ('day', 'month'):
+                return state.cube.query(interval, start, end, 'AC Power/m2')
+            return state.cube.rows(start, end, 'AC Power/m2')
+
+
+ingest_store = IngestStore()
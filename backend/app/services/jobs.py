@@ -0,0 +1,373 @@
+import glob
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+import pandas as pd
+from app.services.batch import BatchFormatError, DEFAULT_STREAM_CHUNK_ROWS, iter_csv_bytes, iter_prediction_chunks
+from app.services.executor import work_pool
+from app.services.model_registry import BASE_DIR, ModelsUnavailableError, model_registry
+
+logger = logging.getLogger(__name__)
+
+# Spooled uploads, result files and the SQLite job table live here
+JOBS_DIR = os.getenv("BATCH_JOBS_DIR", os.path.join(BASE_DIR, "jobs"))
+JOBS_WORKERS = int(os.getenv("BATCH_JOBS_WORKERS", "1"))
+# Finished jobs (and their files) are deleted this many seconds after they end
+JOBS_RETENTION = float(os.getenv("BATCH_JOBS_RETENTION", str(7 * 24 * 3600)))
+# Seconds a running job's lease lasts without a progress update; a job whose
+# worker process died is queued again once its lease runs out
+JOBS_LEASE = float(os.getenv("BATCH_JOBS_LEASE", "300"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    filename TEXT,
+    params TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    bytes_total INTEGER NOT NULL DEFAULT 0,
+    bytes_done INTEGER NOT NULL DEFAULT 0,
+    rows_done INTEGER NOT NULL DEFAULT 0,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    model_version TEXT,
+    error TEXT,
+    lease_id TEXT,
+    lease_expires REAL
+)
+"""
+
+# Columns added after the first release, for job tables created before them
+ADDED_COLUMNS = {"lease_id": "TEXT", "lease_expires": "REAL"}
+
+
+class JobCancelled(Exception):
+    """Raised inside a worker when the job it is running was cancelled"""
+
+
+class _Interrupted(Exception):
+    """Raised inside a worker when the runner is shutting down"""
+
+
+class _LeaseLost(Exception):
+    """Raised inside a worker whose job was taken back after its lease ran out"""
+
+
+class JobStore:
+    """
+    Batch job records in a local SQLite file.
+
+    Each call opens its own short-lived connection, so the store can be
+    used from the event loop and from worker threads alike. State changes
+    that race with other workers (in this or another process) are single
+    conditional UPDATEs. A claimed job carries a lease id that every later
+    write by its worker must match, and an expiry the worker pushes out
+    as it makes progress.
+    """
+
+    def __init__(self, directory: str = JOBS_DIR, lease: float = JOBS_LEASE):
+        self.directory = directory
+        self.path = os.path.join(directory, "jobs.sqlite3")
+        self.lease = lease
+        self._ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._ready:
+            os.makedirs(self.directory, exist_ok=True)
+            with sqlite3.connect(self.path, timeout=30) as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(SCHEMA)
+                existing = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+                for name, kind in ADDED_COLUMNS.items():
+                    if name not in existing:
+                        conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {kind}")
+            self._ready = True
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _execute(self, sql: str, args=()):
+        conn = self._connect()
+        try:
+            with conn:
+                return conn.execute(sql, args).fetchall()
+        finally:
+            conn.close()
+
+    def _write(self, sql: str, args=()) -> int:
+        """Run one write statement; returns the number of rows it changed"""
+        conn = self._connect()
+        try:
+            with conn:
+                return conn.execute(sql, args).rowcount
+        finally:
+            conn.close()
+
+    def input_path(self, job_id: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.input.csv")
+
+    def result_path(self, job_id: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.result.csv")
+
+    def create(self, filename: str, params: dict, bytes_total: int, job_id: str) -> dict:
+        self._execute(
+            "INSERT INTO jobs (id, status, filename, params, created_at, bytes_total) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, QUEUED, filename, json.dumps(params), time.time(), bytes_total),
+        )
+        return self.get(job_id)
+
+    def get(self, job_id: str):
+        rows = self._execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        return _job_dict(rows[0]) if rows else None
+
+    def list(self, limit: int = 50) -> list:
+        rows = self._execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,))
+        return [_job_dict(row) for row in rows]
+
+    def update(self, job_id: str, **fields):
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        self._execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def claim_next(self):
+        """
+        Move the oldest queued job to running under a new lease and return
+        it, or None if nothing is queued. The claim is one conditional
+        UPDATE, so two workers never get the same job.
+        """
+        while True:
+            lease_id = uuid.uuid4().hex
+            now = time.time()
+            claimed = self._write(
+                "UPDATE jobs SET status = ?, started_at = ?, bytes_done = 0, rows_done = 0, lease_id = ?, lease_expires = ? "
+                "WHERE id = (SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1) AND status = ?",
+                (RUNNING, now, lease_id, now + self.lease, QUEUED, QUEUED),
+            )
+            if claimed:
+                rows = self._execute("SELECT * FROM jobs WHERE lease_id = ?", (lease_id,))
+                return _job_dict(rows[0])
+            # Either nothing is queued or another worker took the job first
+            if not self._execute("SELECT 1 FROM jobs WHERE status = ? LIMIT 1", (QUEUED,)):
+                return None
+
+    def renew(self, job_id: str, lease_id: str, **fields) -> bool:
+        """Update a running job and extend its lease; False if the lease is no longer held"""
+        fields["lease_expires"] = time.time() + self.lease
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        return bool(self._write(f"UPDATE jobs SET {columns} WHERE id = ? AND lease_id = ? AND status = ?",
+                                (*fields.values(), job_id, lease_id, RUNNING)))
+
+    def release(self, job_id: str, lease_id: str, **fields) -> bool:
+        """Give up a job's lease while setting its final (or queued) state; False if it was not held"""
+        fields.update(lease_id=None, lease_expires=None)
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        return bool(self._write(f"UPDATE jobs SET {columns} WHERE id = ? AND lease_id = ?",
+                                (*fields.values(), job_id, lease_id)))
+
+    def cancel(self, job_id: str):
+        """Cancel a queued job right away; flag a running one for its worker to stop"""
+        if self._write("UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?",
+                       (CANCELLED, time.time(), job_id, QUEUED)):
+            self.remove_files(job_id)
+        else:
+            self._write("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?", (job_id, RUNNING))
+        return self.get(job_id)
+
+    def requeue_expired(self) -> int:
+        """Running jobs whose lease ran out (their worker process died) start over from the beginning"""
+        return self._write(
+            "UPDATE jobs SET status = ?, started_at = NULL, bytes_done = 0, rows_done = 0, lease_id = NULL, lease_expires = NULL "
+            "WHERE status = ? AND (lease_expires IS NULL OR lease_expires < ?)",
+            (QUEUED, RUNNING, time.time()),
+        )
+
+    def purge_expired(self, retention: float = JOBS_RETENTION) -> int:
+        cutoff = time.time() - retention
+        rows = self._execute("SELECT id FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (cutoff,))
+        for row in rows:
+            self.remove_files(row["id"])
+            self._execute("DELETE FROM jobs WHERE id = ?", (row["id"],))
+        return len(rows)
+
+    def remove_files(self, job_id: str, upload: bool = True, result: bool = True):
+        paths = []
+        if upload:
+            paths.append(self.input_path(job_id))
+        if result:
+            # Partial results are named per lease, see BatchJobRunner._process
+            paths += [self.result_path(job_id), *glob.glob(glob.escape(self.result_path(job_id)) + ".*.part")]
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _job_dict(row: sqlite3.Row) -> dict:
+    job = dict(row)
+    job["params"] = json.loads(job["params"])
+    job["cancel_requested"] = bool(job["cancel_requested"])
+    job["progress"] = round(job["bytes_done"] / job["bytes_total"], 4) if job["bytes_total"] else (1.0 if job["status"] == DONE else 0.0)
+    return job
+
+
+class BatchJobRunner:
+    """
+    Background workers for batch prediction jobs.
+
+    Uploads are spooled to disk by `submit()` and processed in chunks by
+    `workers` threads using the same pipeline as /api/predict/batch. The
+    result is written to a temporary file and renamed into place when
+    complete, so a finished result file is never partial. Progress is the
+    share of input bytes parsed so far. Jobs whose worker stopped renewing
+    its lease (the process died) are queued again, checked on `start()`
+    and whenever a worker is idle; this is safe with several processes
+    sharing one jobs directory.
+    """
+
+    def __init__(self, store: JobStore, workers: int = JOBS_WORKERS, poll_interval: float = 1.0):
+        self.store = store
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        if self._threads:
+            return
+        requeued = self.store.requeue_expired()
+        if requeued:
+            logger.info("Requeued %d interrupted batch job(s).", requeued)
+        self.store.purge_expired()
+        self._stop.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"batch-jobs-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout=10)
+        self._threads = []
+
+    def submit(self, source, filename: str, params: dict) -> dict:
+        """Spool an uploaded file object to disk and queue a job for it (blocking)"""
+        job_id = uuid.uuid4().hex
+        path = self.store.input_path(job_id)
+        os.makedirs(self.store.directory, exist_ok=True)
+        with open(path, "wb") as f:
+            shutil.copyfileobj(source, f, 1024 * 1024)
+        job = self.store.create(filename, params, os.path.getsize(path), job_id)
+        self._wake.set()
+        return job
+
+    def _run(self):
+        while not self._stop.is_set():
+            job = self.store.claim_next()
+            if job is None:
+                if self.store.requeue_expired():
+                    continue
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            self._process(job)
+
+    def _process(self, job: dict):
+        job_id = job["id"]
+        lease_id = job["lease_id"]
+        params = job["params"]
+        # Per lease, so a worker that lost its lease never writes over the new owner's output
+        part_path = f"{self.store.result_path(job_id)}.{lease_id}.part"
+        rows = 0
+
+        def counted(frames):
+            nonlocal rows
+            for frame in frames:
+                rows += len(frame)
+                yield frame
+
+        try:
+            models = model_registry.get()
+            if not self.store.renew(job_id, lease_id, model_version=models.version):
+                raise _LeaseLost()
+            with open(self.store.input_path(job_id), "rb") as source, open(part_path, "wb") as out:
+                reader = pd.read_csv(source, chunksize=params.get("chunk_size") or DEFAULT_STREAM_CHUNK_ROWS)
+                frames = iter_prediction_chunks(
+                    reader, models.lgbm, models.log_reg,
+                    latitude=params.get("latitude"), longitude=params.get("longitude"),
+                    timezone=params.get("timezone") or "UTC",
+                    predict=lambda frame: work_pool.predict_frame(frame, models),
+                )
+                for chunk in iter_csv_bytes(counted(frames)):
+                    out.write(chunk)
+                    self._checkpoint(job_id, lease_id, rows, min(source.tell(), job["bytes_total"]))
+            if not self.store.renew(job_id, lease_id):
+                raise _LeaseLost()
+            os.replace(part_path, self.store.result_path(job_id))
+        except _LeaseLost:
+            # Another worker has (or will get) the job; leave its files and record alone
+            self._remove(part_path)
+            logger.warning("Batch job %s lost its lease; dropping this run.", job_id, extra={"job_id": job_id})
+            return
+        except _Interrupted:
+            # Shutting down: leave the job for the next start
+            self._remove(part_path)
+            self.store.release(job_id, lease_id, status=QUEUED, started_at=None, bytes_done=0, rows_done=0)
+            return
+        except JobCancelled:
+            if self.store.release(job_id, lease_id, status=CANCELLED, finished_at=time.time()):
+                self.store.remove_files(job_id)
+                logger.info("Batch job %s cancelled after %d rows.", job_id, rows, extra={"job_id": job_id})
+            return
+        except (BatchFormatError, ModelsUnavailableError) as e:
+            self._fail(job_id, lease_id, str(e))
+            return
+        except Exception as e:
+            self._fail(job_id, lease_id, f"Batch prediction error: {e}")
+            return
+
+        if self.store.release(job_id, lease_id, status=DONE, finished_at=time.time(), rows_done=rows, bytes_done=job["bytes_total"]):
+            self.store.remove_files(job_id, result=False)
+            logger.info("Batch job %s finished: %d rows.", job_id, rows, extra={"job_id": job_id})
+
+    def _checkpoint(self, job_id: str, lease_id: str, rows: int, bytes_done: int):
+        """Record progress between chunks, renewing the lease, and stop if the job was cancelled"""
+        if self._stop.is_set():
+            raise _Interrupted()
+        if not self.store.renew(job_id, lease_id, rows_done=rows, bytes_done=bytes_done):
+            raise _LeaseLost()
+        job = self.store.get(job_id)
+        if job is None or job["cancel_requested"]:
+            raise JobCancelled()
+
+    @staticmethod
+    def _remove(path: str):
+        if os.path.exists(path):
+            os.remove(path)
+
+    def _fail(self, job_id: str, lease_id: str, error: str):
+        logger.warning("Batch job %s failed: %s", job_id, error, extra={"job_id": job_id})
+        if self.store.release(job_id, lease_id, status=FAILED, finished_at=time.time(), error=error):
+            self.store.remove_files(job_id)
+
+
+job_store = JobStore()
+job_runner = BatchJobRunner(job_store)
+
+
+def get_job_runner() -> BatchJobRunner:
+    """FastAPI dependency for the batch job runner"""
+    return job_runner
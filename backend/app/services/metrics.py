@@ -0,0 +1,258 @@
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Prefix of every exported metric name
+NAMESPACE = "smog"
+
+# Latency buckets in seconds, from sub-millisecond model calls to long batch uploads
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{_escape(value)}"' for name, value in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = f"{NAMESPACE}_{name}"
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self, name: str = None) -> list:
+        name = name or self.name
+        return [f"# HELP {name} {self.help}", f"# TYPE {name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, per label combination"""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header(f"{self.name}_total") + [f"{self.name}_total{_labels(self.labelnames, key)} {_number(v)}" for key, v in items]
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram of observed values (seconds, by convention)"""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return series[2] if series else 0
+
+    def render(self) -> list:
+        with self._lock:
+            items = sorted((key, ([*counts], total, n)) for key, (counts, total, n) in self._series.items())
+        lines = self.header()
+        for key, (counts, total, n) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', _number(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {n}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Point-in-time value read from a callback when metrics are collected"""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn):
+        super().__init__(name, help)
+        self.fn = fn
+
+    def render(self) -> list:
+        try:
+            value = self.fn()
+        except Exception:
+            return []
+        return [] if value is None else self.header() + [f"{self.name} {_number(value)}"]
+
+
+class MetricsRegistry:
+    """All metrics of the process, rendered together in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help: str, labelnames=()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name: str, help: str, fn) -> Gauge:
+        return self._register(Gauge(name, help, fn))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+http_requests = registry.counter("http_requests", "HTTP requests by route and status", ("method", "route", "status"))
+http_duration = registry.histogram("http_request_duration_seconds", "Time until the response body is fully sent, by route", ("method", "route"))
+stage_duration = registry.histogram("stage_duration_seconds", "Time spent per request-processing stage", ("stage",))
+model_routing = registry.counter("model_routing", "Rows routed to each model by the PM2.5 rule", ("model",))
+cache_requests = registry.counter("cache_requests", "Cache lookups by cache and result (hit/miss)", ("cache", "result"))
+upstream_requests = registry.counter("upstream_requests", "Calls to external services", ("upstream",))
+upstream_errors = registry.counter("upstream_errors", "Failed calls to external services", ("upstream",))
+
+# Stage names used with `stage()`
+FEATURE_BUILD = "feature_build"
+INFERENCE = "inference"
+UPSTREAM_NASA = "upstream_nasa"
+UPSTREAM_OPENAQ = "upstream_openaq"
+CSV_PARSE = "csv_parse"
+RESAMPLE = "resample"
+SERIALIZE = "serialize"
+
+
+def stage(name: str):
+    """Context manager timing one processing stage"""
+    return stage_duration.time(stage=name)
+
+
+def count_cache(cache: str, hit: bool):
+    cache_requests.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def count_routing(lgbm_rows: int, logreg_rows: int):
+    if lgbm_rows:
+        model_routing.inc(lgbm_rows, model="lgbm")
+    if logreg_rows:
+        model_routing.inc(logreg_rows, model="logreg")
+
+
+@contextmanager
+def upstream_call(upstream: str, stage_name: str):
+    """Count and time one call to an external service, counting it as an error if it raises"""
+    upstream_requests.inc(upstream=upstream)
+    try:
+        with stage(stage_name):
+            yield
+    except Exception:
+        upstream_errors.inc(upstream=upstream)
+        raise
+
+
+def timed_iter(iterable, stage_name: str):
+    """Yield from `iterable`, timing each step (e.g. parsing the next CSV chunk) as `stage_name`"""
+    iterator = iter(iterable)
+    while True:
+        with stage(stage_name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware counting and timing every HTTP request.
+
+    Requests are labelled by route template (e.g. /api/jobs/{job_id}) so
+    path parameters don't explode the number of series. The duration runs
+    until the last body chunk is sent, which covers streamed responses.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            http_duration.observe(time.perf_counter() - started, method=scope["method"], route=path)
+            http_requests.inc(method=scope["method"], route=path, status=status)
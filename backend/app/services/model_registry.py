@@ -0,0 +1,214 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+import joblib
+import lightgbm  # noqa: F401  imported up front so its cost isn't billed to the first model load
+import numpy as np
+import sklearn.pipeline  # noqa: F401
+from app.services.features import N_FEATURES
+from app.services.inference import INFERENCE_BACKEND, make_predictors
+
+logger = logging.getLogger(__name__)
+
+# backend/app/services/model_registry.py -> project root
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+MODELS_DIR = os.getenv("MODELS_DIR", os.path.join(BASE_DIR, "models"))
+
+MODEL_FILES = {
+    "lgbm": "lgb_shallow_model.pkl",
+    "log_reg": "log_reg_pipeline.pkl",
+}
+
+# Seconds between checks of models/ for new artifacts (0 disables watching)
+WATCH_INTERVAL = float(os.getenv("MODEL_WATCH_INTERVAL", "5"))
+
+
+class ModelsUnavailableError(RuntimeError):
+    """Raised when the model artifacts can't be loaded"""
+
+
+class ModelBundle:
+    """
+    One immutable, loaded version of both models.
+
+    `lgbm` and `log_reg` are the predictors requests should call (the native
+    backend by default); the unpickled estimators stay in `artifacts`.
+    """
+
+    def __init__(self, artifacts: dict, version: str, fingerprint, stats: dict):
+        self.artifacts = artifacts
+        self.lgbm, self.log_reg = make_predictors(artifacts["lgbm"], artifacts["log_reg"])
+        self.backend = INFERENCE_BACKEND
+        self.version = version
+        self.fingerprint = fingerprint
+        self.stats = stats
+        self.loaded_at = time.time()
+
+
+def _fingerprint(models_dir: str):
+    """Cheap change detector: (name, size, mtime) of every artifact"""
+    entries = []
+    for name in MODEL_FILES.values():
+        st = os.stat(os.path.join(models_dir, name))
+        entries.append((name, st.st_size, st.st_mtime_ns))
+    return tuple(entries)
+
+
+def _rss_bytes():
+    """Resident set size of this process, or None where /proc isn't available"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _load_artifact(path: str):
+    """joblib.load with timing and resident-memory accounting"""
+    rss_before = _rss_bytes()
+    started = time.perf_counter()
+    model = joblib.load(path)
+    elapsed = time.perf_counter() - started
+    rss_after = _rss_bytes()
+    return model, {
+        "load_seconds": round(elapsed, 4),
+        # Approximate: counts native (LightGBM) allocations too, but also anything else the process did meanwhile
+        "rss_delta_bytes": max(rss_after - rss_before, 0) if rss_before is not None and rss_after is not None else None,
+        "artifact_bytes": os.path.getsize(path),
+    }
+
+
+def load_bundle(models_dir: str = MODELS_DIR) -> ModelBundle:
+    """Load both artifacts, tag them with a content hash and warm them up"""
+    fingerprint = _fingerprint(models_dir)
+    digest = hashlib.sha256()
+    models = {}
+    stats = {}
+    for key, name in MODEL_FILES.items():
+        path = os.path.join(models_dir, name)
+        with open(path, "rb") as f:
+            digest.update(f.read())
+        models[key], stats[key] = _load_artifact(path)
+
+    bundle = ModelBundle(models, digest.hexdigest()[:12], fingerprint, stats)
+    warm_up(bundle)
+    return bundle
+
+
+def warm_up(bundle: ModelBundle):
+    """Run throwaway predictions so the first real request doesn't pay for lazy setup"""
+    for key, model in (("lgbm", bundle.lgbm), ("log_reg", bundle.log_reg)):
+        started = time.perf_counter()
+        model.predict(np.zeros((1, N_FEATURES)))
+        model.predict(np.zeros((64, N_FEATURES)))
+        bundle.stats[key]["warmup_seconds"] = round(time.perf_counter() - started, 4)
+
+
+class ModelRegistry:
+    """
+    Holds the current ModelBundle and swaps in new versions as they appear.
+
+    Models are loaded lazily on first use or by `start()` in the background.
+    A watcher thread polls `models_dir` and, when the artifacts change, loads
+    and warms the new version before replacing the bundle reference in one
+    assignment. Requests that already hold the old bundle finish with it.
+    """
+
+    def __init__(self, models_dir: str = MODELS_DIR, watch_interval: float = WATCH_INTERVAL):
+        self.models_dir = models_dir
+        self.watch_interval = watch_interval
+        self._bundle = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._failed_fingerprint = None
+        self._listeners = []
+        self.last_error = None
+
+    def on_swap(self, callback):
+        """Call `callback(bundle)` every time a new bundle is swapped in"""
+        self._listeners.append(callback)
+        return callback
+
+    def get(self) -> ModelBundle:
+        """Current bundle, loading it now if that hasn't happened yet"""
+        bundle = self._bundle
+        if bundle is None:
+            bundle = self.reload()
+        return bundle
+
+    def reload(self, force: bool = False) -> ModelBundle:
+        """Load the artifacts if they changed (or if `force`) and swap them in"""
+        with self._lock:
+            current = self._bundle
+            fingerprint = None
+            try:
+                fingerprint = _fingerprint(self.models_dir)
+                if not force and current is not None and fingerprint in (current.fingerprint, self._failed_fingerprint):
+                    # Unchanged, or the same broken artifacts that already failed to load
+                    return current
+                bundle = load_bundle(self.models_dir)
+            except Exception as e:
+                self._failed_fingerprint = fingerprint
+                self.last_error = f"{type(e).__name__}: {e}"
+                logger.error("Error loading models: %s", e)
+                if current is None:
+                    raise ModelsUnavailableError(self.last_error) from e
+                # Keep serving the previous version
+                return current
+
+            self._bundle = bundle
+            self.last_error = None
+            logger.info("Models loaded successfully (version %s).", bundle.version, extra={"model_version": bundle.version})
+            for callback in self._listeners:
+                try:
+                    callback(bundle)
+                except Exception as e:
+                    logger.exception("Model swap listener failed: %s", e)
+            return bundle
+
+    def start(self):
+        """Load in the background and, if enabled, start watching for new versions"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="model-registry", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        try:
+            self.get()
+        except ModelsUnavailableError:
+            pass
+        while self.watch_interval > 0 and not self._stop.wait(self.watch_interval):
+            try:
+                self.reload()
+            except ModelsUnavailableError:
+                pass
+
+    def status(self) -> dict:
+        bundle = self._bundle
+        return {
+            "loaded": bundle is not None,
+            "version": bundle.version if bundle else None,
+            "backend": bundle.backend if bundle else None,
+            "loaded_at": bundle.loaded_at if bundle else None,
+            "models_dir": os.path.abspath(self.models_dir),
+            "watching": self._thread is not None and self.watch_interval > 0,
+            "last_error": self.last_error,
+            "models": {
+                key: {"file": MODEL_FILES[key], **bundle.stats[key]}
+                for key in MODEL_FILES
+            } if bundle else {},
+        }
+
+
+model_registry = ModelRegistry()
@@ -0,0 +1,150 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+from app.services.dataset import DATA_DIR
+from app.services.features import build_feature_vector
+from app.services.inference import SINGLE_PM25_THRESHOLD, predict_matrix
+from app.services.metrics import INFERENCE, count_routing, stage
+from app.services.weather import LOCATION_MODE_DATES, location_weather
+
+logger = logging.getLogger(__name__)
+
+# Most sites one portfolio request may cover
+PORTFOLIO_MAX_SITES = int(os.getenv("PORTFOLIO_MAX_SITES", "500"))
+# Sites whose upstream data is being fetched at the same time
+PORTFOLIO_CONCURRENCY = int(os.getenv("PORTFOLIO_CONCURRENCY", "8"))
+# Seconds a site's NASA + OpenAQ lookups may take before it is reported as failed
+PORTFOLIO_SITE_TIMEOUT = float(os.getenv("PORTFOLIO_SITE_TIMEOUT", "20"))
+# Stored fleet used when a request lists no sites
+PORTFOLIO_SITES_PATH = os.getenv("PORTFOLIO_SITES_PATH", os.path.join(DATA_DIR, "sites.json"))
+
+
+class SiteInputError(Exception):
+    """A site's inputs could not be gathered; the message is reported for that site"""
+
+
+class SiteRegistry:
+    """
+    Fleet of sites stored as a JSON list in `path`, in the same layout as
+    the `sites` of a portfolio request. Re-read when the file changes.
+    """
+
+    def __init__(self, path: str = PORTFOLIO_SITES_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._sites = []
+
+    def sites(self) -> list:
+        """Stored sites as dicts; raises FileNotFoundError if there is no registry file"""
+        mtime = os.stat(self.path).st_mtime_ns
+        with self._lock:
+            if mtime != self._mtime:
+                with open(self.path) as f:
+                    sites = json.load(f)
+                if not isinstance(sites, list):
+                    raise ValueError(f"{self.path} must contain a JSON list of sites")
+                self._sites, self._mtime = sites, mtime
+                logger.info("Loaded %d sites from %s.", len(sites), self.path)
+            return self._sites
+
+
+async def gather_bounded(calls, limit: int) -> list:
+    """
+    Await zero-argument coroutine functions with at most `limit` running at
+    once. Results come back in order, with exceptions in place of the
+    results of calls that raised.
+    """
+    semaphore = asyncio.Semaphore(max(limit, 1))
+
+    async def bounded(call):
+        async with semaphore:
+            return await call()
+
+    return await asyncio.gather(*(bounded(call) for call in calls), return_exceptions=True)
+
+
+async def site_inputs(site, hour: int, weather, pm25_provider, timeout: float = PORTFOLIO_SITE_TIMEOUT) -> dict:
+    """
+    Weather for the site's hour and its PM2.5 (the given value, or the
+    latest OpenAQ reading), fetched concurrently. Raises SiteInputError
+    naming every upstream that failed.
+    """
+    start_date, end_date = LOCATION_MODE_DATES
+
+    async def fetch_weather():
+        properties = await weather.hourly(site.latitude, site.longitude, start_date, end_date)
+        return location_weather(properties, start_date, hour)
+
+    async def fetch_pm25():
+        if site.pm25 is not None:
+            return site.pm25
+        # The OpenAQ client is blocking; it shares its caches across threads
+        reading = await run_in_threadpool(pm25_provider.latest, site.latitude, site.longitude)
+        if reading.get("pm25") is None:
+            raise SiteInputError(reading.get("message", "PM2.5 data not found"))
+        return float(reading["pm25"])
+
+    try:
+        values, pm25 = await asyncio.wait_for(
+            asyncio.gather(fetch_weather(), fetch_pm25(), return_exceptions=True), timeout)
+    except asyncio.TimeoutError:
+        raise SiteInputError(f"Upstream data not available within {timeout:g}s")
+
+    errors = []
+    if isinstance(values, Exception):
+        errors.append(f"Error fetching NASA data: {values}")
+    if isinstance(pm25, Exception):
+        errors.append(f"Error fetching PM2.5: {pm25}")
+    if errors:
+        raise SiteInputError("; ".join(errors))
+    return {**values, "pm25": pm25}
+
+
+def site_features(site, inputs: dict, hour: int, month: int, ac_power_lag1: float, power_factor_lag1: float) -> np.ndarray:
+    """(1, N_FEATURES) row for a site; per-site lags override the fleet-wide defaults"""
+    return build_feature_vector(
+        pm25=inputs["pm25"],
+        allsky_sfc_sw_dwn=inputs["allsky_sfc_sw_dwn"],
+        allsky_kt=inputs["allsky_kt"],
+        t2m=inputs["t2m"],
+        ws10m=inputs["ws10m"],
+        sza=inputs["sza"],
+        t2m_lag1=inputs["t2m_lag1"],
+        # Without an earlier reading, the current one stands in for the lag
+        pm25_lag1=site.pm25_lag1 if site.pm25_lag1 is not None else inputs["pm25"],
+        ac_power_lag1=site.ac_power_lag1 if site.ac_power_lag1 is not None else ac_power_lag1,
+        power_factor_lag1=site.power_factor_lag1 if site.power_factor_lag1 is not None else power_factor_lag1,
+        hour=hour,
+        month=month,
+    )
+
+
+def score_sites(X: np.ndarray, models, pm25_threshold: float = SINGLE_PM25_THRESHOLD) -> tuple:
+    """Score all site rows with one call per model (blocking)"""
+    with stage(INFERENCE):
+        predictions, lgbm_mask = predict_matrix(X, models.lgbm, models.log_reg, pm25_threshold)
+    lgbm_rows = int(lgbm_mask.sum())
+    count_routing(lgbm_rows, len(X) - lgbm_rows)
+    return predictions, lgbm_mask
+
+
+def aggregate(results: list) -> dict:
+    """Fleet totals over the sites that were scored"""
+    scored = [r for r in results if r["predicted_power"] is not None]
+    with_area = [r for r in scored if r.get("area_m2") is not None]
+    return {
+        "sites": len(results),
+        "succeeded": len(scored),
+        "failed": len(results) - len(scored),
+        "mean_power": float(np.mean([r["predicted_power"] for r in scored])) if scored else None,
+        # Predictions are per m2; sites with a known panel area add up to a fleet total
+        "total_power": float(sum(r["predicted_power"] * r["area_m2"] for r in with_area)) if with_area else None,
+    }
+
+
+site_registry = SiteRegistry()
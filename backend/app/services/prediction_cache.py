@@ -0,0 +1,81 @@
+import os
+import threading
+import numpy as np
+from app.services.cache import TTLCache
+from app.services.metrics import count_cache, registry
+from app.services.model_registry import model_registry
+
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "10000"))
+PREDICTION_CACHE_TTL = float(os.getenv("PREDICTION_CACHE_TTL", "600"))
+# Features are rounded to this many decimals before lookup; requests that
+# agree after rounding share one cached prediction. Empty disables rounding.
+PREDICTION_CACHE_DECIMALS = os.getenv("PREDICTION_CACHE_DECIMALS", "6")
+
+
+class PredictionCache:
+    """
+    Memoizes single predictions on (model version, quantized feature vector).
+
+    Entries are evicted least-recently-used past `maxsize` and expire after
+    `ttl` seconds. The whole cache is dropped when the registry swaps in a
+    new model version; the version in the key also keeps stragglers still
+    scoring on the old bundle from being served to new requests.
+    """
+
+    def __init__(self, maxsize: int = PREDICTION_CACHE_SIZE, ttl: float = PREDICTION_CACHE_TTL,
+                 decimals=PREDICTION_CACHE_DECIMALS):
+        self.enabled = maxsize > 0
+        self.decimals = int(decimals) if decimals not in (None, "") else None
+        self._cache = TTLCache(maxsize=max(maxsize, 1), ttl=ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def key(self, features: np.ndarray, version: str):
+        row = np.asarray(features, dtype=np.float64).reshape(-1)
+        if self.decimals is not None:
+            row = np.round(row, self.decimals)
+        # + 0.0 folds -0.0 into 0.0 so both hash the same
+        return version, (row + 0.0).tobytes()
+
+    def get(self, features: np.ndarray, version: str):
+        """Cached (prediction, model name) or None"""
+        if not self.enabled:
+            return None
+        value = self._cache.get(self.key(features, version))
+        count_cache("prediction", value is not None)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, features: np.ndarray, version: str, value):
+        if self.enabled:
+            self._cache.set(self.key(features, version), value)
+
+    def invalidate(self, bundle=None):
+        self._cache.clear()
+        with self._lock:
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "size": len(self._cache),
+            "maxsize": self._cache.maxsize,
+            "ttl_seconds": self._cache.ttl,
+            "decimals": self.decimals,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "invalidations": self.invalidations,
+        }
+
+
+prediction_cache = PredictionCache()
+model_registry.on_swap(prediction_cache.invalidate)
+registry.gauge("prediction_cache_entries", "Entries in the single-prediction cache", lambda: len(prediction_cache._cache))
@@ -0,0 +1,243 @@
+import numpy as np
+import pandas as pd
+
+# Columns aggregated when the history data is loaded
+ROLLUP_COLUMNS = ['AC Power/m2', 'PM25', 'ALLSKY_SFC_SW_DWN', 'ALLSKY_KT', 'T2M', 'WS10M', 'SZA']
+
+# Bucket levels from finest to coarsest
+LEVELS = ('hour', 'day', 'month')
+
+
+def bucket_floor(ts: pd.Timestamp, level: str) -> pd.Timestamp:
+    """Start of the `level` bucket containing `ts`"""
+    if level == 'hour':
+        return ts.floor('h')
+    if level == 'day':
+        return ts.normalize()
+    return ts.normalize().replace(day=1)
+
+
+def bucket_next(ts: pd.Timestamp, level: str) -> pd.Timestamp:
+    """Start of the bucket following the one starting at `ts`"""
+    if level == 'hour':
+        return ts + pd.Timedelta(hours=1)
+    if level == 'day':
+        return ts + pd.Timedelta(days=1)
+    return ts + pd.offsets.MonthBegin(1)
+
+
+def bucket_starts(index: pd.DatetimeIndex, level: str) -> pd.DatetimeIndex:
+    """Vectorized bucket_floor over a whole index"""
+    if level == 'hour':
+        return index.floor('h')
+    if level == 'day':
+        return index.normalize()
+    return index.to_period('M').to_timestamp().as_unit(index.unit)
+
+
+HOUR_NS = 3600 * 10**9
+DAY_NS = 24 * HOUR_NS
+
+
+def _bucket_keys(value: int) -> tuple:
+    """Hour, day and month bucket starts of an int64 ns timestamp (bucket_floor without Timestamp overhead)"""
+    month = np.datetime64(value, 'ns').astype('datetime64[M]').astype('datetime64[ns]').view(np.int64)
+    return value - value % HOUR_NS, value - value % DAY_NS, int(month)
+
+
+def _grow(array: np.ndarray, size: int) -> np.ndarray:
+    """`array` with room for at least `size` entries along axis 0, doubling its capacity"""
+    if size <= len(array):
+        return array
+    grown = np.zeros((max(size, 2 * len(array), 16),) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class _Level:
+    """
+    Sum/count aggregates for the non-empty buckets of one level. The arrays
+    are over-allocated so buckets can be appended; `size` of them are used.
+    """
+
+    def __init__(self, starts, rows, sums, counts):
+        self._starts = starts    # int64 ns bucket starts, sorted
+        self._rows = rows        # rows per bucket, NaN or not
+        self._sums = sums        # (buckets, columns) sums of non-NaN values
+        self._counts = counts    # (buckets, columns) non-NaN counts
+        self.size = len(starts)
+
+    starts = property(lambda self: self._starts[:self.size])
+    rows = property(lambda self: self._rows[:self.size])
+    sums = property(lambda self: self._sums[:self.size])
+    counts = property(lambda self: self._counts[:self.size])
+
+    def add(self, start: int, values: np.ndarray, present: np.ndarray):
+        """Add a row to the bucket at `start`, which is the last bucket or one after it"""
+        i = self.size - 1
+        if self.size == 0 or self._starts[i] != start:
+            i = self.size
+            self._starts = _grow(self._starts, i + 1)
+            self._rows = _grow(self._rows, i + 1)
+            self._sums = _grow(self._sums, i + 1)
+            self._counts = _grow(self._counts, i + 1)
+            self._starts[i] = start
+            self.size += 1
+        self._rows[i] += 1
+        self._sums[i] += np.where(present, values, 0.0)
+        self._counts[i] += present
+
+    def span(self, lo: pd.Timestamp, hi: pd.Timestamp):
+        """Positions of the buckets starting in [lo, hi)"""
+        return (np.searchsorted(self.starts, lo.value, side='left'),
+                np.searchsorted(self.starts, hi.value, side='left'))
+
+
+class RollupCube:
+    """
+    Hourly, daily and monthly sum/count aggregates of a time-sorted frame.
+
+    A range query at some level is answered from that level's stored
+    buckets. Only a bucket cut by the range boundaries is rebuilt, from the
+    next finer level and, below hours, from the raw rows, so the cost
+    follows the number of buckets returned rather than the rows covered.
+
+    Rows later than the last one can be added with `append`, which updates
+    the raw rows and every level in amortized O(1).
+    """
+
+    def __init__(self, df: pd.DataFrame, columns=ROLLUP_COLUMNS):
+        self.columns = [col for col in columns if col in df.columns]
+        # Work in nanoseconds throughout so stored keys compare with Timestamp.value
+        index = df.index.as_unit('ns')
+        self._index = index.asi8
+        self._values = df[self.columns].to_numpy(dtype=np.float64)
+        self._size = len(self._index)
+
+        self._levels = {}
+        for level in LEVELS:
+            keys = bucket_starts(index, level).asi8
+            # The frame is sorted, so bucket boundaries are where the key changes
+            breaks = np.flatnonzero(np.diff(keys)) + 1
+            offsets = np.concatenate(([0], breaks))
+            present = ~np.isnan(self._values)
+            self._levels[level] = _Level(
+                starts=keys[offsets] if len(keys) else keys,
+                rows=np.diff(np.append(offsets, len(keys))) if len(keys) else np.zeros(0, dtype=np.int64),
+                sums=np.add.reduceat(np.where(present, self._values, 0.0), offsets, axis=0) if len(keys) else np.zeros((0, len(self.columns))),
+                counts=np.add.reduceat(present.astype(np.int64), offsets, axis=0) if len(keys) else np.zeros((0, len(self.columns)), dtype=np.int64),
+            )
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, ts: pd.Timestamp, values):
+        """
+        Add one row, in `columns` order, at or after the latest row. Raises
+        ValueError for a row earlier than that.
+        """
+        ts = pd.Timestamp(ts)
+        n = self._size
+        if n and ts.value < self._index[n - 1]:
+            raise ValueError(f"Row at {ts} is earlier than the latest row")
+        values = np.asarray(values, dtype=np.float64)
+        self._index = _grow(self._index, n + 1)
+        self._values = _grow(self._values, n + 1)
+        self._index[n] = ts.value
+        self._values[n] = values
+        self._size = n + 1
+
+        present = ~np.isnan(values)
+        for level, start in zip(LEVELS, _bucket_keys(ts.value)):
+            self._levels[level].add(start, values, present)
+
+    def rows(self, start, end, column: str = 'AC Power/m2'):
+        """Raw values of `column` for rows with start <= time <= end, as (times, values)"""
+        index = self._index[:self._size]
+        i = np.searchsorted(index, pd.Timestamp(start).as_unit('ns').value, side='left')
+        j = np.searchsorted(index, pd.Timestamp(end).as_unit('ns').value, side='right')
+        times = pd.DatetimeIndex(index[i:j].view('datetime64[ns]'))
+        return times, self._values[i:j, self.columns.index(column)].copy()
+
+    def _raw_totals(self, lo: pd.Timestamp, hi: pd.Timestamp):
+        """Row count, sums and counts over raw rows in [lo, hi)"""
+        index = self._index[:self._size]
+        i = np.searchsorted(index, lo.value, side='left')
+        j = np.searchsorted(index, hi.value, side='left')
+        values = self._values[i:j]
+        present = ~np.isnan(values)
+        return j - i, np.where(present, values, 0.0).sum(axis=0), present.sum(axis=0)
+
+    def _finer_totals(self, level: str, lo: pd.Timestamp, hi: pd.Timestamp):
+        """Totals over [lo, hi) from the level below `level`, or raw rows below hours"""
+        finer = LEVELS.index(level) - 1
+        return self._totals(LEVELS[finer], lo, hi) if finer >= 0 else self._raw_totals(lo, hi)
+
+    def _totals(self, level: str, lo: pd.Timestamp, hi: pd.Timestamp):
+        """Row count, sums and counts over [lo, hi), using `level` buckets and finer"""
+        first_full = lo if bucket_floor(lo, level) == lo else bucket_next(bucket_floor(lo, level), level)
+        last_full = bucket_floor(hi, level)
+        if first_full >= last_full:
+            # No whole bucket fits, so the range is answered entirely one level down
+            return self._finer_totals(level, lo, hi)
+
+        stored = self._levels[level]
+        i, j = stored.span(first_full, last_full)
+        rows = int(stored.rows[i:j].sum())
+        sums = stored.sums[i:j].sum(axis=0)
+        counts = stored.counts[i:j].sum(axis=0)
+
+        for edge_lo, edge_hi in ((lo, first_full), (last_full, hi)):
+            if edge_lo < edge_hi:
+                edge = self._finer_totals(level, edge_lo, edge_hi)
+                rows += edge[0]
+                sums = sums + edge[1]
+                counts = counts + edge[2]
+        return rows, sums, counts
+
+    def query(self, level: str, start, end, column: str = 'AC Power/m2'):
+        """
+        Mean of `column` per `level` bucket for rows with start <= time <= end.
+
+        Matches `resample(...).mean()` over the same rows: buckets run from
+        the first to the last bucket holding a row, and a bucket with rows
+        but no values has a NaN mean. Returns (bucket starts, means).
+        """
+        col = self.columns.index(column)
+        lo = pd.Timestamp(start)
+        hi = pd.Timestamp(end) + pd.Timedelta(1, unit='ns')  # end is inclusive
+        stored = self._levels[level]
+
+        # Whole buckets come straight from the stored aggregates
+        first_full = lo if bucket_floor(lo, level) == lo else bucket_next(bucket_floor(lo, level), level)
+        last_full = max(bucket_floor(hi, level), first_full)
+        i, j = stored.span(first_full, last_full)
+        starts = stored.starts[i:j]
+        sums = stored.sums[i:j, col]
+        counts = stored.counts[i:j, col]
+
+        # Buckets cut by the range boundaries are rebuilt from finer levels
+        edges = []
+        if lo < first_full:
+            edges.append((bucket_floor(lo, level), lo, min(first_full, hi)))
+        if last_full < hi:
+            edges.append((last_full, last_full, hi))
+        for bucket, edge_lo, edge_hi in edges:
+            n, edge_sums, edge_counts = self._finer_totals(level, edge_lo, edge_hi)
+            if n:
+                pos = np.searchsorted(starts, bucket.value)
+                starts = np.insert(starts, pos, bucket.value)
+                sums = np.insert(sums, pos, edge_sums[col])
+                counts = np.insert(counts, pos, edge_counts[col])
+
+        if len(starts) == 0:
+            return pd.DatetimeIndex([]), np.zeros(0)
+
+        # Lay the non-empty buckets out on the full bucket grid, empty ones get NaN
+        freq = {'hour': 'h', 'day': 'D', 'month': 'MS'}[level]
+        grid = pd.date_range(pd.Timestamp(starts[0]), pd.Timestamp(starts[-1]), freq=freq).as_unit('ns')
+        means = np.full(len(grid), np.nan)
+        pos = np.searchsorted(grid.asi8, starts)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means[pos] = np.where(counts > 0, sums / counts, np.nan)
+        return grid, means
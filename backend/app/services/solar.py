@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+import pvlib
+from app.services.cache import TTLCache
+from app.services.metrics import count_cache
+
+# Coordinates are rounded to this many decimals for memoization (~1 km)
+COORD_PRECISION = 2
+
+
+def solar_zenith(times, latitude, longitude) -> np.ndarray:
+    """
+    Solar zenith angle in degrees for arrays of timestamps and coordinates.
+
+    `times` is anything pd.DatetimeIndex accepts; naive values are taken as
+    UTC. `latitude`/`longitude` are scalars or arrays the length of `times`.
+    pvlib is called once per distinct site over all of that site's
+    timestamps, so the setup cost is paid per site, not per value.
+    """
+    times = pd.DatetimeIndex(times)
+    if times.tz is None:
+        times = times.tz_localize("UTC")
+
+    lats = np.broadcast_to(np.asarray(latitude, dtype=np.float64), (len(times),))
+    lons = np.broadcast_to(np.asarray(longitude, dtype=np.float64), (len(times),))
+    zenith = np.full(len(times), np.nan)
+    if len(times) == 0:
+        return zenith
+
+    sites, site_ids = np.unique(np.column_stack([lats, lons]), axis=0, return_inverse=True)
+    site_ids = site_ids.ravel()
+    for i, (lat, lon) in enumerate(sites):
+        rows = np.flatnonzero(site_ids == i)
+        solpos = pvlib.solarposition.get_solarposition(time=times[rows], latitude=lat, longitude=lon)
+        zenith[rows] = solpos["zenith"].to_numpy()
+    return zenith
+
+
+# Zenith samples per memoized hour (every 5 minutes, both ends included)
+SAMPLES_PER_HOUR = 12
+
+
+class ZenithMemo:
+    """
+    Memoized zenith lookups keyed on (rounded lat, rounded lon, UTC hour).
+
+    Each entry holds 5-minute samples across the hour, and a miss fills the
+    whole UTC day for that site in one vectorized call. Lookups interpolate
+    between samples, which keeps the error around the 0.01 degree rounding
+    the API reports.
+    """
+
+    def __init__(self, maxsize: int = 50_000, ttl: float = 7 * 24 * 3600):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def _hour(self, lat: float, lon: float, hour: pd.Timestamp) -> np.ndarray:
+        key = (lat, lon, hour.value)
+        samples = self._cache.get(key)
+        count_cache("zenith", samples is not None)
+        if samples is None:
+            day_start = hour.normalize()
+            times = pd.date_range(day_start, periods=24 * SAMPLES_PER_HOUR + 1, freq=f"{60 // SAMPLES_PER_HOUR}min")
+            zenith = solar_zenith(times, lat, lon)
+            for h in range(24):
+                hour_start = day_start + pd.Timedelta(hours=h)
+                hour_samples = zenith[h * SAMPLES_PER_HOUR:(h + 1) * SAMPLES_PER_HOUR + 1]
+                self._cache.set((lat, lon, hour_start.value), hour_samples)
+                # Not read back from the cache: filling the day may already have evicted it
+                if hour_start == hour:
+                    samples = hour_samples
+        return samples
+
+    def at(self, lat: float, lon: float, when=None) -> float:
+        """Zenith for a site at `when` (default: now)"""
+        lat = round(lat, COORD_PRECISION)
+        lon = round(lon, COORD_PRECISION)
+        when = pd.Timestamp.now(tz="UTC") if when is None else pd.Timestamp(when)
+        if when.tz is None:
+            when = when.tz_localize("UTC")
+        when = when.tz_convert("UTC")
+
+        start = when.floor("h")
+        samples = self._hour(lat, lon, start)
+        position = (when - start) / pd.Timedelta(hours=1) * SAMPLES_PER_HOUR
+        return float(np.interp(position, np.arange(SAMPLES_PER_HOUR + 1), samples))
+
+
+zenith_memo = ZenithMemo()
+
+
+def zenith_series(lat: float, lon: float, start, end, freq: str = "h") -> pd.Series:
+    """Zenith at every `freq` step from start to end (inclusive), UTC"""
+    times = pd.date_range(pd.Timestamp(start), pd.Timestamp(end), freq=freq, tz="UTC")
+    return pd.Series(solar_zenith(times, lat, lon), index=times)
@@ -0,0 +1,160 @@
+import asyncio
+import os
+from abc import ABC, abstractmethod
+import httpx
+from app.services.cache import TTLCache
+from app.services.metrics import UPSTREAM_NASA, count_cache, upstream_call
+
+NASA_POWER_URL = os.getenv("NASA_POWER_URL", "https://power.larc.nasa.gov/api/temporal/hourly/point")
+
+# Hourly parameters the models need from NASA POWER
+WEATHER_PARAMETERS = ["ALLSKY_SFC_SW_DWN", "ALLSKY_KT", "T2M", "SZA", "WS10M"]
+
+# Location mode looks up a fixed day of NASA POWER data (hardcoded dates as per instructions)
+LOCATION_MODE_DATES = ("20250101", "20250102")
+
+
+def location_weather(properties: dict, date: str, hour: int) -> dict:
+    """
+    Weather inputs of /api/predict location mode for one hour of a
+    `properties.parameter` block; missing values are 0.0.
+    """
+    target_key = f"{date}{hour:02d}"
+    # 00:00 has no earlier hour that day and 08:00 repeats its own value
+    prev_key = target_key if hour in (0, 8) else f"{date}{hour - 1:02d}"
+
+    def get_val(param, key):
+        return properties.get(param, {}).get(key, 0.0)
+
+    return {
+        "allsky_sfc_sw_dwn": get_val("ALLSKY_SFC_SW_DWN", target_key),
+        "allsky_kt": get_val("ALLSKY_KT", target_key),
+        "t2m": get_val("T2M", target_key),
+        "sza": get_val("SZA", target_key),
+        "ws10m": get_val("WS10M", target_key),
+        "t2m_lag1": get_val("T2M", prev_key),
+    }
+
+
+class WeatherProvider(ABC):
+    """Source of hourly weather series for a point"""
+
+    @abstractmethod
+    async def hourly(self, lat: float, lon: float, start_date: str, end_date: str) -> dict:
+        """
+        Hourly values between two YYYYMMDD dates (inclusive).
+
+        Returns {parameter: {"YYYYMMDDHH": value}}, the layout of the
+        `properties.parameter` block in a NASA POWER response.
+        """
+
+    async def aclose(self):
+        """Release any pooled connections"""
+
+
+class NasaPowerProvider(WeatherProvider):
+    """
+    NASA POWER client with a pooled async HTTP connection, retries and a TTL cache.
+
+    Responses are cached per rounded coordinate and date range, so every
+    hour looked up for a site reuses one fetch. Concurrent misses for the
+    same key share a single upstream request.
+    """
+
+    def __init__(self, base_url: str = NASA_POWER_URL, timeout: float = 15.0, retries: int = 2,
+                 backoff: float = 0.5, cache_ttl: float = 6 * 3600, cache_size: int = 512,
+                 coord_precision: int = 2, max_connections: int = 10, transport=None):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.coord_precision = coord_precision
+        self.max_connections = max_connections
+        self._transport = transport
+        self._client = None
+        self._cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._inflight = {}
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+                transport=self._transport,
+            )
+        return self._client
+
+    async def hourly(self, lat: float, lon: float, start_date: str, end_date: str) -> dict:
+        # NASA POWER's grid is far coarser than 0.01 degrees, so nearby clicks share an entry
+        lat = round(lat, self.coord_precision)
+        lon = round(lon, self.coord_precision)
+        key = (lat, lon, start_date, end_date)
+
+        cached = self._cache.get(key)
+        count_cache("nasa_power", cached is not None)
+        if cached is not None:
+            return cached
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        task = asyncio.ensure_future(self._fetch(lat, lon, start_date, end_date))
+        self._inflight[key] = task
+        try:
+            data = await asyncio.shield(task)
+        finally:
+            self._inflight.pop(key, None)
+
+        self._cache.set(key, data)
+        return data
+
+    async def _fetch(self, lat: float, lon: float, start_date: str, end_date: str) -> dict:
+        params = {
+            "parameters": ",".join(WEATHER_PARAMETERS),
+            "community": "RE",
+            "latitude": lat,
+            "longitude": lon,
+            "start": start_date,
+            "end": end_date,
+            "format": "JSON",
+        }
+
+        client = self._get_client()
+        for attempt in range(self.retries + 1):
+            try:
+                with upstream_call("nasa_power", UPSTREAM_NASA):
+                    response = await client.get(self.base_url, params=params)
+                    response.raise_for_status()
+                    return response.json().get("properties", {}).get("parameter", {})
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                # Only connection problems, rate limiting and server errors are worth retrying
+                retryable = isinstance(e, httpx.TransportError) or e.response.status_code == 429 or e.response.status_code >= 500
+                if not retryable or attempt == self.retries:
+                    raise
+                await asyncio.sleep(self.backoff * 2 ** attempt)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class StaticWeatherProvider(WeatherProvider):
+    """In-memory provider returning a fixed payload, for tests and offline runs"""
+
+    def __init__(self, parameters: dict):
+        self.parameters = parameters
+        self.calls = 0
+
+    async def hourly(self, lat: float, lon: float, start_date: str, end_date: str) -> dict:
+        self.calls += 1
+        return self.parameters
+
+
+weather_provider = NasaPowerProvider()
+
+
+def get_weather_provider() -> WeatherProvider:
+    """FastAPI dependency; override it to swap in a fake provider"""
+    return weather_provider
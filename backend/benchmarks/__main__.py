@@ -0,0 +1,85 @@
+"""
+Run the whole benchmark suite and write one JSON report.
+
+Run from backend/:  python -m benchmarks [--out report.json] [--quick] [--full]
+                    python -m benchmarks --compare before.json after.json
+--quick shrinks every scenario for a smoke run; --full adds the 1M-row
+batch upload. --compare prints the relative change of every latency and
+throughput figure between two reports.
+"""
+import argparse
+import asyncio
+import json
+import time
+from benchmarks import bench_api, bench_batching, bench_features, bench_inference
+from benchmarks.common import server_output_to_stderr, environment, peak_rss_mb
+
+# Figures compared between reports; for latencies lower is better, for throughput higher
+COMPARED = {"p50_ms": "lower", "p95_ms": "lower", "p99_ms": "lower",
+            "calls_per_second": "higher", "items_per_second": "higher", "rows_per_second": "higher",
+            "requests_per_second": "higher"}
+
+
+def run_all(quick: bool = False, full: bool = False) -> dict:
+    scale = 10 if quick else 1
+    batch_rows = [1_000, 10_000] if quick else [1_000, 10_000, 100_000] + ([1_000_000] if full else [])
+    started = time.time()
+    report = {"environment": environment(), "started_at": started, "suites": {}}
+    report["suites"]["features"] = bench_features.run(calls=20_000 // scale, rows=100_000 // scale)
+    report["suites"]["inference"] = bench_inference.run(rows=100_000 // scale, calls=2_000 // scale)
+    report["suites"]["api"] = asyncio.run(bench_api.run(requests=500 // scale, batch_rows=batch_rows))
+    report["suites"]["batching"] = bench_batching.run_suite(requests=2_000 // scale)
+    report["seconds"] = round(time.time() - started, 1)
+    report["peak_rss_mb"] = peak_rss_mb()
+    return report
+
+
+def flatten(node, prefix=""):
+    """{"a": {"p50_ms": 1}} -> {"a.p50_ms": 1} for the compared figures"""
+    if isinstance(node, dict):
+        for key, value in node.items():
+            name = f"{prefix}.{key}" if prefix else key
+            if key in COMPARED and isinstance(value, (int, float)):
+                yield name, value
+            else:
+                yield from flatten(value, name)
+
+
+def compare(before: dict, after: dict):
+    old = dict(flatten(before.get("suites", before)))
+    new = dict(flatten(after.get("suites", after)))
+    rows = []
+    for name in sorted(old.keys() & new.keys()):
+        if not old[name]:
+            continue
+        change = (new[name] - old[name]) / old[name]
+        better = change < 0 if COMPARED[name.rsplit(".", 1)[-1]] == "lower" else change > 0
+        rows.append({"metric": name, "before": old[name], "after": new[name],
+                     "change_pct": round(change * 100, 1), "better": better})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", help="write the report here as well as to stdout")
+    parser.add_argument("--quick", action="store_true", help="small smoke run")
+    parser.add_argument("--full", action="store_true", help="include the 1M-row batch upload")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two saved reports")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f, open(args.compare[1]) as g:
+            print(json.dumps(compare(json.load(f), json.load(g)), indent=2))
+        return
+
+    with server_output_to_stderr():
+        report = run_all(args.quick, args.full)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
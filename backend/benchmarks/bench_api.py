@@ -0,0 +1,195 @@
+"""
+End-to-end load tests for every API route, fully offline.
+
+Run from backend/:  python -m benchmarks.bench_api [--requests 500] [--concurrency 16]
+                                                   [--batch-rows 1000 10000 100000] [--upstream-latency 0.05]
+Requests go through the whole ASGI app in-process (startup and shutdown
+included). NASA POWER and OpenAQ are replaced by the local stand-ins in
+app/services/fakes.py, which answer after --upstream-latency seconds. Each
+scenario reports p50/p95/p99 latency, throughput and RSS as JSON.
+"""
+import argparse
+import asyncio
+import json
+import time
+import httpx
+import numpy as np
+from app.main import app
+from app.services.air_quality import get_pm25_provider
+from app.services.executor import work_pool
+from app.services.weather import get_weather_provider
+from benchmarks.common import server_output_to_stderr, environment, peak_rss_mb, rss_mb, summarize, synthetic_batch_csv
+from app.services.fakes import fake_pm25_provider, fake_weather_provider
+
+
+def manual_bodies(n: int, seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    return [{
+        "is_location_mode": False,
+        "hour": int(rng.integers(0, 24)),
+        "month": int(rng.integers(1, 13)),
+        "allsky_sfc_sw_dwn": float(rng.uniform(0, 900)),
+        "allsky_kt": float(rng.uniform(0, 0.8)),
+        "t2m": float(rng.uniform(10, 40)),
+        "sza": float(rng.uniform(0, 120)),
+        "ws10m": float(rng.uniform(0, 10)),
+        "pm25": float(rng.uniform(0, 50)),
+        "pm25_lag1": float(rng.uniform(0, 50)),
+        "ac_power_lag1": float(rng.uniform(0, 150)),
+        "power_factor_lag1": float(rng.uniform(0.8, 1.0)),
+    } for _ in range(n)]
+
+
+def location_bodies(n: int, sites: int = 20, seed: int = 1) -> list:
+    """Location-mode requests spread over a handful of sites, like users clicking around a map"""
+    rng = np.random.default_rng(seed)
+    coords = rng.uniform([20.0, 70.0], [30.0, 90.0], size=(sites, 2))
+    bodies = manual_bodies(n, seed)
+    for body, site in zip(bodies, rng.integers(0, sites, n)):
+        body.update(is_location_mode=True, latitude=float(coords[site, 0]), longitude=float(coords[site, 1]))
+    return bodies
+
+
+def forecast_bodies(n: int, sites: int, hours: int = 24, seed: int = 3) -> list:
+    """Day-ahead forecasts for `sites` sites/scenarios each"""
+    rng = np.random.default_rng(seed)
+    return [{
+        "sites": [{
+            "latitude": float(rng.uniform(20.0, 30.0)),
+            "longitude": float(rng.uniform(70.0, 90.0)),
+            "pm25": float(rng.uniform(0, 50)),
+            "pm25_lag1": float(rng.uniform(0, 50)),
+            "ac_power_lag1": float(rng.uniform(0, 150)),
+            "power_factor_lag1": float(rng.uniform(0.8, 1.0)),
+        } for _ in range(sites)],
+        "hours": hours,
+    } for _ in range(n)]
+
+
+async def load(client: httpx.AsyncClient, requests: list, concurrency: int, items: int = None) -> dict:
+    """
+    Send `requests` (kwargs for client.request) from `concurrency` workers.
+
+    Latencies are summarized over successful responses only; error
+    statuses (e.g. 503 from admission control) are counted separately.
+    """
+    pending = list(reversed(requests))
+    timings = []
+    errors = {}
+
+    async def worker():
+        while pending:
+            kwargs = pending.pop()
+            t = time.perf_counter()
+            response = await client.request(**kwargs)
+            await response.aread()
+            if response.status_code >= 400:
+                errors[response.status_code] = errors.get(response.status_code, 0) + 1
+            else:
+                timings.append(time.perf_counter() - t)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    summary = summarize(timings, time.perf_counter() - started, items)
+    summary.update(errors=errors, rss_mb=rss_mb(), peak_rss_mb=peak_rss_mb())
+    return summary
+
+
+async def run(requests: int = 500, concurrency: int = 16, batch_rows=(1_000, 10_000, 100_000),
+              batch_repeats: int = 3, upstream_latency: float = 0.05, pool_max_pending: int = None) -> dict:
+    if pool_max_pending is not None:
+        work_pool.max_pending = pool_max_pending
+    weather = fake_weather_provider(upstream_latency)
+    pm25 = fake_pm25_provider(upstream_latency)
+    app.dependency_overrides[get_weather_provider] = lambda: weather
+    app.dependency_overrides[get_pm25_provider] = lambda: pm25
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with app.router.lifespan_context(app), \
+                httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            # Startup loads the models in the background; wait for them before timing anything
+            while not (await client.get("/api/models")).json()["loaded"]:
+                await asyncio.sleep(0.05)
+
+            results["health"] = await load(client, [{"method": "GET", "url": "/api/health"}] * requests, concurrency)
+            results["predict_manual"] = await load(
+                client, [{"method": "POST", "url": "/api/predict", "json": b} for b in manual_bodies(requests)], concurrency)
+            results["predict_location"] = await load(
+                client, [{"method": "POST", "url": "/api/predict", "json": b} for b in location_bodies(requests)], concurrency)
+            # Throughput counts site-hours predicted
+            forecasts = max(requests // 5, 1)
+            for sites in (1, 20):
+                results[f"forecast_24h_{sites}_sites"] = await load(
+                    client, [{"method": "POST", "url": "/api/predict/forecast", "json": b} for b in forecast_bodies(forecasts, sites)],
+                    concurrency, items=forecasts * sites * 24)
+
+            # Fleet refresh: every site's NASA + OpenAQ lookups fanned out, then one model call
+            portfolio = {"hour": 12, "month": 6, "sites": [
+                {"latitude": b["latitude"], "longitude": b["longitude"]} for b in location_bodies(50, sites=50, seed=4)]}
+            results["portfolio_50_sites"] = await load(
+                client, [{"method": "POST", "url": "/api/predict/portfolio", "json": portfolio}] * max(requests // 10, 1),
+                concurrency, items=max(requests // 10, 1) * 50)
+
+            for interval, (start, end) in {"hour": ("2023-01-01", "2024-12-31"), "day": ("2023-01-01", "2024-12-31"),
+                                           "month": ("2023-01-01", "2024-12-31")}.items():
+                params = {"start_date": start, "end_date": end, "interval": interval}
+                results[f"history_{interval}"] = await load(
+                    client, [{"method": "GET", "url": "/api/analytics/history", "params": params}] * max(requests // 5, 1), concurrency)
+            params = {"start_date": "2023-01-01", "end_date": "2024-12-31", "interval": "hour", "max_points": 500}
+            results["history_hour_500_points"] = await load(
+                client, [{"method": "GET", "url": "/api/analytics/history", "params": params}] * max(requests // 5, 1), concurrency)
+            params = {"start_date": "2023-01-01", "end_date": "2024-12-31", "interval": "hour", "format": "columns"}
+            results["history_hour_columns"] = await load(
+                client, [{"method": "GET", "url": "/api/analytics/history", "params": params}] * max(requests // 5, 1), concurrency)
+
+            rng = np.random.default_rng(2)
+            coords = rng.uniform([20.0, 70.0], [30.0, 90.0], size=(requests, 2)).round(3).tolist()
+            results["readings_sza"] = await load(
+                client, [{"method": "GET", "url": "/api/readings/sza", "params": {"lat": a, "lon": b}} for a, b in coords], concurrency)
+            results["readings_sza_series_year"] = await load(
+                client, [{"method": "GET", "url": "/api/readings/sza/series",
+                          "params": {"lat": 28.6, "lon": 77.2, "start_date": "2024-01-01", "end_date": "2024-12-31"}}] * 10, 2)
+            results["readings_pm25"] = await load(
+                client, [{"method": "GET", "url": "/api/readings/pm25", "params": {"lat": a, "lon": b}} for a, b in coords[:100]] * 5,
+                concurrency)
+
+            for rows in batch_rows:
+                with open(synthetic_batch_csv(rows), "rb") as f:
+                    content = f.read()
+                request = {"method": "POST", "url": "/api/predict/batch",
+                           "files": {"file": ("batch.csv", content, "text/csv")}}
+                results[f"batch_{rows}"] = await load(client, [request] * batch_repeats, 1, items=rows * batch_repeats)
+                # Only the prediction and the row number back
+                request = {**request, "params": {"columns": "row,Predicted_Power"}}
+                results[f"batch_{rows}_prediction_only"] = await load(client, [request] * batch_repeats, 1, items=rows * batch_repeats)
+    finally:
+        app.dependency_overrides.pop(get_weather_provider, None)
+        app.dependency_overrides.pop(get_pm25_provider, None)
+        await weather.aclose()
+
+    results["upstream_requests"] = {"nasa": weather._transport.requests, "openaq": pm25.client.requests}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500, help="requests per single-call scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--batch-rows", type=int, nargs="*", default=[1_000, 10_000, 100_000],
+                        help="synthetic batch CSV sizes (up to 1000000)")
+    parser.add_argument("--batch-repeats", type=int, default=3)
+    parser.add_argument("--upstream-latency", type=float, default=0.05, help="seconds the fake NASA/OpenAQ take to answer")
+    parser.add_argument("--pool-max-pending", type=int, default=None,
+                        help="override EXECUTOR_MAX_PENDING (admission limit) for the run")
+    args = parser.parse_args()
+
+    with server_output_to_stderr():
+        results = asyncio.run(run(args.requests, args.concurrency, args.batch_rows, args.batch_repeats,
+                                  args.upstream_latency, args.pool_max_pending))
+    print(json.dumps({"environment": environment(), "config": vars(args), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Throughput and latency of /api/predict with and without micro-batching.
+
+Run from backend/:  python -m benchmarks.bench_batching [--requests 2000] [--concurrency 64]
+Requests go through the full ASGI app in-process (no network) in manual
+mode, so no upstream services are involved.
+"""
+import argparse
+import asyncio
+import json
+import time
+import httpx
+import numpy as np
+from app.main import app
+from app.services.batcher import batcher
+from app.services.executor import work_pool
+from app.services.model_registry import model_registry
+from app.services.prediction_cache import prediction_cache
+from benchmarks.common import server_output_to_stderr, summarize
+
+
+def make_bodies(n: int, seed: int = 0) -> list:
+    """Random manual-mode request bodies, roughly half on each side of the PM2.5 threshold"""
+    rng = np.random.default_rng(seed)
+    return [{
+        "is_location_mode": False,
+        "hour": int(rng.integers(0, 24)),
+        "month": int(rng.integers(1, 13)),
+        "allsky_sfc_sw_dwn": float(rng.uniform(0, 900)),
+        "allsky_kt": float(rng.uniform(0, 0.8)),
+        "t2m": float(rng.uniform(10, 40)),
+        "sza": float(rng.uniform(0, 120)),
+        "ws10m": float(rng.uniform(0, 10)),
+        "pm25": float(rng.uniform(0, 50)),
+        "pm25_lag1": float(rng.uniform(0, 50)),
+        "ac_power_lag1": float(rng.uniform(0, 150)),
+        "power_factor_lag1": float(rng.uniform(0.8, 1.0)),
+    } for _ in range(n)]
+
+
+async def run(bodies: list, concurrency: int) -> dict:
+    latencies = []
+    queue = list(bodies)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker():
+            while queue:
+                body = queue.pop()
+                started = time.perf_counter()
+                response = await client.post("/api/predict", json=body)
+                latencies.append(time.perf_counter() - started)
+                response.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return summarize(latencies, elapsed)
+
+
+def run_suite(requests: int = 2000, concurrency: int = 64) -> dict:
+    model_registry.get()
+    # Measure batching, not admission control: unbatched, every request is its own pool job
+    work_pool.max_pending = concurrency * 2
+    # Both runs send the same bodies; the second must not be served from the cache
+    cache_enabled, prediction_cache.enabled = prediction_cache.enabled, False
+    bodies = make_bodies(requests)
+    report = {
+        "concurrency": concurrency,
+        "max_batch_size": batcher.max_batch_size,
+        "max_wait_ms": batcher.max_wait_ms,
+    }
+    for enabled in (False, True):
+        batcher.enabled = enabled
+        batcher.batches = batcher.rows = 0
+        result = asyncio.run(run(bodies, concurrency))
+        if enabled:
+            result["mean_batch_rows"] = round(batcher.rows / max(batcher.batches, 1), 1)
+        report["batched" if enabled else "unbatched"] = result
+    prediction_cache.enabled = cache_enabled
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+
+    with server_output_to_stderr():
+        report = run_suite(args.requests, args.concurrency)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Micro-benchmarks for feature building.
+
+Run from backend/:  python -m benchmarks.bench_features [--calls 20000] [--rows 100000]
+Times the single-request feature vector, the batch CSV preparation
+(parse-free: frame in, features out) and the feature-matrix build, and
+prints one JSON document.
+"""
+import argparse
+import json
+import time
+import numpy as np
+import pandas as pd
+from app.services.batch import fill_backfill_defaults, prepare_batch_frame
+from app.services.features import LGBM_FEATURES, build_feature_matrix, build_feature_vector
+from benchmarks.common import environment, peak_rss_mb, percentiles, summarize, synthetic_batch_csv
+
+
+def bench_feature_vector(calls: int) -> dict:
+    rng = np.random.default_rng(0)
+    inputs = rng.uniform(0, 100, size=(calls, 10))
+    hours = rng.integers(0, 24, calls).tolist()
+    months = rng.integers(1, 13, calls).tolist()
+    timings = []
+    started = time.perf_counter()
+    for row, hour, month in zip(inputs.tolist(), hours, months):
+        t = time.perf_counter()
+        build_feature_vector(*row, hour=hour, month=month)
+        timings.append(time.perf_counter() - t)
+    return summarize(timings, time.perf_counter() - started)
+
+
+def bench_prepare(raw: pd.DataFrame, repeats: int = 3) -> dict:
+    timings = []
+    for _ in range(repeats):
+        df = raw.copy()
+        t = time.perf_counter()
+        fill_backfill_defaults(prepare_batch_frame(df))
+        timings.append(time.perf_counter() - t)
+    best = min(timings)
+    return {"rows": len(raw), "best_seconds": round(best, 4), "rows_per_second": round(len(raw) / best), **percentiles(timings)}
+
+
+def bench_matrix(prepared: pd.DataFrame, repeats: int = 5) -> dict:
+    timings = []
+    for _ in range(repeats):
+        t = time.perf_counter()
+        build_feature_matrix(prepared, LGBM_FEATURES)
+        timings.append(time.perf_counter() - t)
+    best = min(timings)
+    return {"rows": len(prepared), "best_seconds": round(best, 4), "rows_per_second": round(len(prepared) / best), **percentiles(timings)}
+
+
+def run(calls: int = 20_000, rows: int = 100_000) -> dict:
+    raw = pd.read_csv(synthetic_batch_csv(rows))
+    prepared = fill_backfill_defaults(prepare_batch_frame(raw.copy()))
+    return {
+        "feature_vector": bench_feature_vector(calls),
+        "prepare_batch_frame": bench_prepare(raw),
+        "feature_matrix": bench_matrix(prepared),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=20_000, help="single feature vectors to build")
+    parser.add_argument("--rows", type=int, default=100_000, help="rows in the batch preparation benchmark")
+    args = parser.parse_args()
+    print(json.dumps({"environment": environment(), **run(args.calls, args.rows)}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Latency of the sklearn-wrapper and native inference backends.
+
+Run from backend/:  python -m benchmarks.bench_inference [--rows 100000] [--threads 0]
+Prints one JSON document with per-call latency percentiles for single rows
+and throughput for a large batch, per model and backend.
+"""
+import argparse
+import json
+import time
+import numpy as np
+import pandas as pd
+from app.services.dataset import DATA_DIR
+from app.services.features import FEATURE_COLUMNS
+from app.services.inference import LinearPipelinePredictor, NativeLGBMPredictor, make_predictors
+from app.services.model_registry import load_bundle
+from benchmarks.common import percentiles
+
+
+def sample_features(rows: int) -> np.ndarray:
+    """Real feature rows from the lagged dataset, tiled up to `rows`"""
+    df = pd.read_csv(f"{DATA_DIR}/merged_data_with_lags.csv")
+    df = df.rename(columns={"AC Power/m2_Lag1": "AC_Power/m2_Lag1"}).fillna(0.0)
+    df["Hour_sin"] = np.sin(2 * np.pi * df["Hour"] / 24)
+    df["Hour_cos"] = np.cos(2 * np.pi * df["Hour"] / 24)
+    df["Month_sin"] = np.sin(2 * np.pi * df["Month"] / 12)
+    df["Month_cos"] = np.cos(2 * np.pi * df["Month"] / 12)
+    X = df[FEATURE_COLUMNS].to_numpy(dtype=np.float64)
+    return np.ascontiguousarray(np.resize(X, (rows, X.shape[1])))
+
+
+def bench_single(predict, X: np.ndarray, calls: int) -> dict:
+    timings = []
+    for i in range(calls):
+        row = X[i % len(X)][None, :]
+        started = time.perf_counter()
+        predict(row)
+        timings.append(time.perf_counter() - started)
+    return percentiles(timings)
+
+
+def bench_batch(predict, X: np.ndarray, repeats: int = 3) -> dict:
+    best = min(_timed(predict, X) for _ in range(repeats))
+    return {"rows": len(X), "seconds": round(best, 4), "rows_per_second": round(len(X) / best)}
+
+
+def _timed(predict, X):
+    started = time.perf_counter()
+    predict(X)
+    return time.perf_counter() - started
+
+
+def run(rows: int = 100_000, calls: int = 2_000, threads: int = 0) -> dict:
+    bundle = load_bundle()
+    lgbm, log_reg = bundle.artifacts["lgbm"], bundle.artifacts["log_reg"]
+    sklearn_lgbm, sklearn_log_reg = make_predictors(lgbm, log_reg, backend="sklearn")
+    backends = {
+        "sklearn": {"lgbm": sklearn_lgbm, "log_reg": sklearn_log_reg},
+        "native": {"lgbm": NativeLGBMPredictor(lgbm, num_threads=threads), "log_reg": LinearPipelinePredictor(log_reg)},
+    }
+
+    X = sample_features(rows)
+    report = {"rows": rows, "threads": threads, "results": {}}
+    for backend, models in backends.items():
+        for name, model in models.items():
+            model.predict(X[:64])  # warm-up
+            report["results"][f"{backend}/{name}"] = {
+                "single": bench_single(model.predict, X, calls),
+                "batch": bench_batch(model.predict, X),
+            }
+
+    # Both backends must agree before their timings mean anything
+    for name in ("lgbm", "log_reg"):
+        diff = np.abs(backends["sklearn"][name].predict(X) - backends["native"][name].predict(X)).max()
+        report["results"][f"native/{name}"]["max_abs_diff_vs_sklearn"] = float(diff)
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000, help="rows in the batch benchmark")
+    parser.add_argument("--calls", type=int, default=2_000, help="single-row calls per measurement")
+    parser.add_argument("--threads", type=int, default=0, help="LightGBM threads for batches (0 = all cores)")
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.rows, args.calls, args.threads), indent=2))
+
+
+if __name__ == "__main__":
+    main()
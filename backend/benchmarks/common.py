@@ -0,0 +1,100 @@
+"""Shared helpers for the benchmark scripts: timing summaries, memory and synthetic data"""
+import contextlib
+import os
+import resource
+import sys
+import tempfile
+import numpy as np
+import pandas as pd
+from app.services.dataset import MERGED_LAGS_PATH
+
+# Synthetic CSVs are generated once per size and reused across runs
+SYNTHETIC_DIR = os.getenv("BENCH_DATA_DIR", os.path.join(tempfile.gettempdir(), "smog-penalty-bench"))
+
+
+def server_output_to_stderr():
+    """Keep whatever the app prints off stdout, which carries the JSON report"""
+    return contextlib.redirect_stdout(sys.stderr)
+
+
+def percentiles(seconds) -> dict:
+    """p50/p95/p99 of a list of durations in seconds, reported in milliseconds"""
+    ms = np.asarray(seconds, dtype=np.float64) * 1000
+    if len(ms) == 0:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+    return {f"p{q}_ms": round(float(np.percentile(ms, q)), 4) for q in (50, 95, 99)}
+
+
+def summarize(seconds, elapsed: float, items: int = None) -> dict:
+    """Latency percentiles plus throughput for `len(seconds)` calls over `elapsed` wall seconds"""
+    calls = len(seconds)
+    summary = {"calls": calls, "seconds": round(elapsed, 4), **percentiles(seconds)}
+    summary["calls_per_second"] = round(calls / elapsed, 2) if elapsed > 0 else None
+    if items is not None:
+        summary["items"] = items
+        summary["items_per_second"] = round(items / elapsed) if elapsed > 0 else None
+    return summary
+
+
+def rss_mb():
+    """Current resident set size in MB, or None where /proc isn't available"""
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20, 1)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far, in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+def environment() -> dict:
+    """Enough about the machine to tell whether two reports are comparable"""
+    import lightgbm
+    import sklearn
+    return {
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "lightgbm": lightgbm.__version__,
+        "sklearn": sklearn.__version__,
+        "cpus": os.cpu_count(),
+        "platform": sys.platform,
+    }
+
+
+def synthetic_batch_csv(rows: int, seed: int = 0) -> str:
+    """
+    A batch-upload CSV of `rows` rows built from merged_data_with_lags.csv.
+
+    The source rows are tiled, each copy shifted forward in time past the
+    previous one so timestamps keep increasing, and the weather columns get
+    a little seeded noise so copies aren't byte-identical. Cached on disk
+    by size and seed.
+    """
+    path = os.path.join(SYNTHETIC_DIR, f"batch_{rows}_{seed}.csv")
+    if os.path.exists(path):
+        return path
+
+    source = pd.read_csv(MERGED_LAGS_PATH)
+    source["datetime"] = pd.to_datetime(source["datetime"])
+    copies = -(-rows // len(source))
+    span = source["datetime"].max() - source["datetime"].min() + pd.Timedelta(hours=1)
+
+    rng = np.random.default_rng(seed)
+    df = pd.concat([source] * copies, ignore_index=True).iloc[:rows]
+    copy_number = np.arange(len(df)) // len(source)
+    df["datetime"] = df["datetime"] + span * copy_number
+    for col in ("ALLSKY_SFC_SW_DWN", "T2M", "WS10M", "PM25"):
+        noise = rng.normal(1.0, 0.02, len(df))
+        df[col] = (df[col] * np.where(copy_number > 0, noise, 1.0)).round(3)
+
+    os.makedirs(SYNTHETIC_DIR, exist_ok=True)
+    tmp = f"{path}.tmp-{os.getpid()}"
+    df.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+    return path
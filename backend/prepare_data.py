@@ -0,0 +1,33 @@
+"""
+Build the columnar stores for the CSVs in data/.
+
+Run from backend/:  python prepare_data.py [--force] [csv ...]
+Each CSV becomes data/columnar/<name>/ (one memory-mapped .npy per column,
+a sorted datetime index and the derived lag and cyclic columns). Stores
+that are already up to date are left alone unless --force is given. The
+server also rebuilds a stale store on its own the first time it is read.
+"""
+import argparse
+import time
+from app.services.columnar import default_store_dir, is_stale, prepare_store
+from app.services.dataset import MERGED_DATA_PATH, MERGED_LAGS_PATH
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("csv", nargs="*", default=[MERGED_DATA_PATH, MERGED_LAGS_PATH])
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the store is up to date")
+    args = parser.parse_args()
+
+    for csv_path in args.csv:
+        store_dir = default_store_dir(csv_path)
+        if not args.force and not is_stale(store_dir, csv_path):
+            print(f"{store_dir} is up to date")
+            continue
+        started = time.perf_counter()
+        prepare_store(csv_path, store_dir)
+        print(f"Wrote {store_dir} in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
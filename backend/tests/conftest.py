@@ -0,0 +1,47 @@
+import os
+import shutil
+import sys
+import tempfile
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+DATA_DIR = os.path.join(os.path.dirname(BACKEND_DIR), "data")
+MERGED_LAGS_PATH = os.path.join(DATA_DIR, "merged_data_with_lags.csv")
+
+# Directories the app writes to, keyed by the environment variable that moves them
+STATE_DIRS = {
+    "BATCH_JOBS_DIR": "jobs",
+    "BACKTEST_DIR": "backtest",
+    "INGEST_DIR": "ingest",
+    "COLUMNAR_DIR": "columnar",
+}
+
+
+def pytest_configure(config):
+    """
+    Point everything the app writes at a fresh temporary directory. This has
+    to happen before collection: test modules import app services, which
+    read these variables at import time, so tmp_path_factory (a fixture)
+    would come too late.
+    """
+    root = tempfile.mkdtemp(prefix="smog-penalty-tests-")
+    config.app_state_dir = root
+    for name, sub in STATE_DIRS.items():
+        os.environ[name] = os.path.join(root, sub)
+
+
+def pytest_unconfigure(config):
+    root = getattr(config, "app_state_dir", None)
+    if root:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def client():
+    """Test client with the app's startup (models, work pool, jobs) run once per session"""
+    from fastapi.testclient import TestClient
+    from app.main import app
+    with TestClient(app) as c:
+        yield c
@@ -0,0 +1,38 @@
+from concurrent.futures import ThreadPoolExecutor
+from app.services.air_quality import PM25Provider
+from app.services.fakes import FakeOpenAQClient
+
+
+def test_openaq_station_cached_per_grid_cell():
+    client = FakeOpenAQClient(latency=0)
+    provider = PM25Provider(client=client)
+
+    first = provider.latest(12.3412, 77.5913)
+    assert first["pm25"] == 18.0
+    assert client.requests == 2  # station lookup + measurement
+
+    # Same 0.01 degree cell: both the station and its measurement come from the cache
+    second = provider.latest(12.3488, 77.5991)
+    assert second["pm25"] == 18.0 and client.requests == 2
+    # Distance is measured from each point, not taken from the cached lookup
+    assert second["distance"] != first["distance"]
+
+    provider.latest(12.3512, 77.5913)
+    assert client.requests == 4
+
+
+def test_openaq_concurrent_lookups_share_one_call():
+    client = FakeOpenAQClient(latency=0.05)
+    provider = PM25Provider(client=client)
+    with ThreadPoolExecutor(16) as pool:
+        stations = list(pool.map(lambda _: provider.nearest_station(12.341, 77.591), range(16)))
+    assert client.requests == 1
+    assert all(station is stations[0] for station in stations)
+
+
+def test_openaq_base_url_override():
+    provider = PM25Provider(api_key="0" * 64, base_url="https://openaq.test/v3/")
+    try:
+        assert provider.client.base_url == "https://openaq.test/v3/"
+    finally:
+        provider.close()
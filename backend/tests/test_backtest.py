@@ -0,0 +1,95 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from app.services import backtest
+from app.services.backtest import BacktestStore
+from app.services.model_registry import load_bundle
+from conftest import MERGED_LAGS_PATH
+
+
+@pytest.fixture(scope="module")
+def models():
+    return load_bundle()
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "history.csv"
+    pd.read_csv(MERGED_LAGS_PATH, nrows=600).to_csv(path, index=False)
+    return path
+
+
+@pytest.fixture
+def scored(monkeypatch):
+    """Times of the rows each predict_frame call of the backtest scores"""
+    calls = []
+    predict_frame = backtest.work_pool.predict_frame
+
+    def record(frame, models, **kwargs):
+        calls.append(list(frame.index))
+        return predict_frame(frame, models, **kwargs)
+
+    monkeypatch.setattr(backtest.work_pool, "predict_frame", record)
+    return calls
+
+
+def rewrite(path, df: pd.DataFrame):
+    """Write the source file, making sure its mtime moves even on coarse clocks"""
+    mtime = os.stat(path).st_mtime_ns
+    df.to_csv(path, index=False)
+    os.utime(path, ns=(mtime + 10**9, mtime + 10**9))
+
+
+def store(source, tmp_path, name="backtest") -> BacktestStore:
+    return BacktestStore(str(source), str(tmp_path / name), store_dir=str(tmp_path / f"{name}-columnar"))
+
+
+def test_only_changed_rows_are_rescored(source, tmp_path, models, scored):
+    backtests = store(source, tmp_path)
+    first = backtests.current(models)
+    assert first.meta["rows"] == first.meta["rescored"] == 600
+    # The history is read from its columnar store, not parsed from the CSV again
+    assert os.path.isfile(tmp_path / "backtest-columnar" / "meta.json")
+    assert backtests.current(models) is first and len(scored) == 1
+
+    df = pd.read_csv(source)
+    changed = [50, 333, 599]
+    df.loc[changed, 'T2M'] += 5.0
+    df.loc[changed, 'AC Power/m2'] += 1.0
+    rewrite(source, df)
+    scored.clear()
+
+    second = backtests.current(models)
+    assert second.meta["rows"] == 600 and second.meta["rescored"] == 3
+    assert scored == [list(pd.to_datetime(df['datetime'][changed]))]
+    np.testing.assert_array_equal(second.actual[changed], first.actual[changed] + 1.0)
+    unchanged = np.setdiff1d(np.arange(600), changed)
+    np.testing.assert_array_equal(second.predicted[unchanged], first.predicted[unchanged])
+    assert not np.array_equal(second.predicted[changed], first.predicted[changed])
+
+    # Same predictions as scoring the changed file from scratch
+    fresh = store(source, tmp_path, "fresh").current(models)
+    np.testing.assert_allclose(second.predicted, fresh.predicted, rtol=0, atol=1e-9)
+
+
+def test_appended_rows_are_rescored(source, tmp_path, models, scored):
+    backtests = store(source, tmp_path)
+    first = backtests.current(models)
+    full = pd.read_csv(MERGED_LAGS_PATH, nrows=648)
+    rewrite(source, full)
+    scored.clear()
+
+    second = backtests.current(models)
+    assert second.meta["rows"] == 648
+    # The appended rows, plus the earlier rows whose back-filled lags they changed
+    rescored = set(scored[0])
+    assert set(pd.to_datetime(full['datetime'][600:])) <= rescored
+    assert second.meta["rescored"] == len(rescored)
+    kept = ~np.isin(first.index, [t.value for t in rescored])
+    np.testing.assert_array_equal(second.predicted[:600][kept], first.predicted[kept])
+
+    # A restart picks the stored backtest up without scoring anything
+    scored.clear()
+    assert store(source, tmp_path).current(models).meta["rescored"] == second.meta["rescored"]
+    assert scored == []
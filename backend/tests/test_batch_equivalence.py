@@ -0,0 +1,118 @@
+import io
+import numpy as np
+import pandas as pd
+import pytest
+from app.services.batch import fill_backfill_defaults, prepare_batch_frame
+from app.services.features import LGBM_FEATURES, LOGREG_FEATURES, build_feature_matrix
+from app.services.inference import (BATCH_PM25_THRESHOLD, LinearPipelinePredictor, NativeLGBMPredictor,
+                                    make_predictors, predict_frame)
+from app.services.model_registry import load_bundle
+from conftest import MERGED_LAGS_PATH
+
+# Predictions are compared to this absolute tolerance (values are in W/m2)
+TOLERANCE = 1e-9
+
+
+@pytest.fixture(scope="module")
+def bundle():
+    return load_bundle()
+
+
+@pytest.fixture(scope="module")
+def history():
+    return pd.read_csv(MERGED_LAGS_PATH)
+
+
+def per_row_reference(df: pd.DataFrame, lgbm_model, log_reg_model) -> np.ndarray:
+    """The original /api/predict/batch loop: default fills, then one model call per row"""
+    df = df.copy()
+    df['Hour_sin'] = np.sin(2 * np.pi * df['Hour'] / 24)
+    df['Hour_cos'] = np.cos(2 * np.pi * df['Hour'] / 24)
+    df['Month_sin'] = np.sin(2 * np.pi * df['Month'] / 12)
+    df['Month_cos'] = np.cos(2 * np.pi * df['Month'] / 12)
+    df['AC_Power/m2_Lag1'] = df['AC Power/m2_Lag1'].fillna(0.0)
+    df['AC Power/m2_Lag1'] = df['AC Power/m2_Lag1'].fillna(0.0)
+    df['power_factor_Lag1'] = df['power_factor_Lag1'].fillna(0.95)
+    df['PM25_Lag1'] = df['PM25_Lag1'].bfill().fillna(0.0)
+    df['T2M_Lag1'] = df['T2M_Lag1'].bfill().fillna(25.0)
+
+    predictions = []
+    for _, row in df.iterrows():
+        if row['PM25'] <= BATCH_PM25_THRESHOLD:
+            predictions.append(lgbm_model.predict(pd.DataFrame([row[LGBM_FEATURES]]))[0])
+        else:
+            predictions.append(log_reg_model.predict(pd.DataFrame([row[LOGREG_FEATURES]]))[0])
+    return np.array(predictions, dtype=np.float64)
+
+
+@pytest.fixture(scope="module")
+def reference(history, bundle):
+    return per_row_reference(history, bundle.artifacts["lgbm"], bundle.artifacts["log_reg"])
+
+
+def test_both_models_are_exercised(history):
+    pm25 = history['PM25']
+    assert (pm25 <= BATCH_PM25_THRESHOLD).any() and (pm25 > BATCH_PM25_THRESHOLD).any()
+
+
+@pytest.mark.parametrize("chunk_size", [100_000, 97])
+def test_predict_frame_matches_per_row(history, bundle, reference, chunk_size):
+    frame = fill_backfill_defaults(prepare_batch_frame(history.copy()))
+    predictions = predict_frame(frame, bundle.lgbm, bundle.log_reg, chunk_size=chunk_size)
+    np.testing.assert_allclose(predictions, reference, rtol=0, atol=TOLERANCE)
+
+
+def test_predict_frame_with_sklearn_artifacts_matches_per_row(history, bundle, reference):
+    frame = fill_backfill_defaults(prepare_batch_frame(history.copy()))
+    lgbm, log_reg = make_predictors(bundle.artifacts["lgbm"], bundle.artifacts["log_reg"], backend="sklearn")
+    predictions = predict_frame(frame, lgbm, log_reg)
+    np.testing.assert_allclose(predictions, reference, rtol=0, atol=TOLERANCE)
+
+
+def test_batch_endpoint_matches_per_row(client, history, reference):
+    with open(MERGED_LAGS_PATH, "rb") as f:
+        # Small chunks so back-filled lags have to carry across chunk boundaries
+        r = client.post("/api/predict/batch", params={"chunk_size": 700}, files={"file": ("history.csv", f, "text/csv")})
+    assert r.status_code == 200
+    out = pd.read_csv(io.BytesIO(r.content))
+    assert len(out) == len(history)
+    np.testing.assert_allclose(out['Predicted_Power'].to_numpy(), reference, rtol=0, atol=TOLERANCE)
+
+
+def test_native_lgbm_matches_sklearn(history, bundle):
+    X = build_feature_matrix(fill_backfill_defaults(prepare_batch_frame(history.copy())), LGBM_FEATURES)
+    model = bundle.artifacts["lgbm"]
+    native = NativeLGBMPredictor(model)
+    expected = model.predict(pd.DataFrame(X, columns=LGBM_FEATURES))
+    np.testing.assert_allclose(native.predict(X), expected, rtol=0, atol=TOLERANCE)
+    # Single rows take the single-threaded path
+    for i in (0, len(X) // 2, len(X) - 1):
+        np.testing.assert_allclose(native.predict(X[i:i + 1]), expected[i:i + 1], rtol=0, atol=TOLERANCE)
+
+
+def test_linear_pipeline_matches_sklearn(history, bundle):
+    X = build_feature_matrix(fill_backfill_defaults(prepare_batch_frame(history.copy())), LOGREG_FEATURES)
+    pipeline = bundle.artifacts["log_reg"]
+    assert LinearPipelinePredictor.supports(pipeline)
+    native = LinearPipelinePredictor(pipeline)
+    expected = pipeline.predict(pd.DataFrame(X, columns=LOGREG_FEATURES))
+    np.testing.assert_allclose(native.predict(X), expected, rtol=0, atol=TOLERANCE)
+    for i in (0, len(X) // 2, len(X) - 1):
+        np.testing.assert_allclose(native.predict(X[i:i + 1]), expected[i:i + 1], rtol=0, atol=TOLERANCE)
+
+
+def test_header_only_upload_returns_header(client, history):
+    header = ",".join(history.columns) + "\n"
+    r = client.post("/api/predict/batch", files={"file": ("empty.csv", header.encode(), "text/csv")})
+    assert r.status_code == 200
+    out = pd.read_csv(io.BytesIO(r.content))
+    assert len(out) == 0
+    assert 'Predicted_Power' in out.columns and set(history.columns) <= set(out.columns)
+
+
+def test_non_numeric_value_in_first_chunk_is_rejected(client, history):
+    bad = history.head(50).astype({'PM25': object})
+    bad.loc[3, 'PM25'] = 'n/a ppm'
+    r = client.post("/api/predict/batch", files={"file": ("bad.csv", bad.to_csv(index=False).encode(), "text/csv")})
+    assert r.status_code == 400
+    assert 'PM25' in r.json()["detail"]
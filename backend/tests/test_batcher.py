@@ -0,0 +1,136 @@
+import asyncio
+import time
+import numpy as np
+import pytest
+from app.services.batcher import MicroBatcher
+from app.services.features import N_FEATURES
+
+THRESHOLD = 25.0
+
+
+class Model:
+    """Predicts a row's second feature plus `offset`, recording the size of every call"""
+
+    def __init__(self, offset: float, fail: bool = False):
+        self.offset = offset
+        self.fail = fail
+        self.calls = []
+
+    def predict(self, X):
+        self.calls.append(len(X))
+        if self.fail:
+            raise RuntimeError("model failed")
+        return X[:, 1] + self.offset
+
+
+class Bundle:
+    def __init__(self, offset: float = 0.0, fail: bool = False):
+        self.lgbm = Model(offset + 1000.0, fail)
+        self.log_reg = Model(offset + 2000.0, fail)
+
+
+def row(pm25: float, value: float) -> np.ndarray:
+    features = np.zeros((1, N_FEATURES))
+    features[0, 0], features[0, 1] = pm25, value
+    return features
+
+
+def expected(pm25: float, value: float, offset: float = 0.0) -> tuple:
+    return (value + offset + 1000.0, "lgbm") if pm25 <= THRESHOLD else (value + offset + 2000.0, "logreg")
+
+
+def test_each_caller_gets_its_own_result():
+    batcher = MicroBatcher(max_batch_size=16, max_wait_ms=20, enabled=True, pm25_threshold=THRESHOLD)
+    bundle = Bundle()
+    inputs = [(10.0 + (i % 3) * 15, float(i)) for i in range(40)]
+
+    async def main():
+        return await asyncio.gather(*(batcher.predict(row(*args), bundle) for args in inputs))
+
+    results = asyncio.run(main())
+    assert results == [expected(*args) for args in inputs]
+    # 40 rows in batches of 16, 16 and 8, each batch one call per model
+    assert batcher.batches == 3 and batcher.rows == 40
+    assert sum(bundle.lgbm.calls) + sum(bundle.log_reg.calls) == 40
+    assert len(bundle.lgbm.calls) + len(bundle.log_reg.calls) == 6
+
+
+def test_rows_are_scored_by_the_bundle_they_came_with():
+    batcher = MicroBatcher(max_batch_size=64, max_wait_ms=20, enabled=True, pm25_threshold=THRESHOLD)
+    old, new = Bundle(), Bundle(offset=1.0)
+
+    async def main():
+        calls = [batcher.predict(row(10.0, float(i)), old if i % 2 else new) for i in range(10)]
+        return await asyncio.gather(*calls)
+
+    results = asyncio.run(main())
+    assert results == [expected(10.0, float(i), 0.0 if i % 2 else 1.0) for i in range(10)]
+    assert old.lgbm.calls == [5] and new.lgbm.calls == [5]
+
+
+def test_a_failed_batch_fails_every_caller():
+    batcher = MicroBatcher(max_batch_size=64, max_wait_ms=5, enabled=True, pm25_threshold=THRESHOLD)
+    bundle = Bundle(fail=True)
+
+    async def main():
+        return await asyncio.gather(*(batcher.predict(row(10.0, i), bundle) for i in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+def test_aclose_scores_the_open_batch():
+    # The batch would otherwise wait a minute for its timer
+    batcher = MicroBatcher(max_batch_size=64, max_wait_ms=60_000, enabled=True, pm25_threshold=THRESHOLD)
+    bundle = Bundle()
+
+    async def main():
+        callers = [asyncio.ensure_future(batcher.predict(row(10.0, float(i)), bundle)) for i in range(5)]
+        await asyncio.sleep(0.01)
+        assert not any(caller.done() for caller in callers)
+
+        started = time.perf_counter()
+        await batcher.aclose()
+        # Every caller has its result once aclose returns; no scoring task is left behind
+        assert all(caller.done() for caller in callers) and not batcher._tasks
+        assert batcher._timer is None
+        return time.perf_counter() - started, [caller.result() for caller in callers]
+
+    elapsed, results = asyncio.run(main())
+    assert elapsed < 5
+    assert results == [expected(10.0, float(i)) for i in range(5)]
+    assert bundle.lgbm.calls == [5]
+
+
+def test_aclose_waits_for_batches_being_scored():
+    batcher = MicroBatcher(max_batch_size=2, max_wait_ms=60_000, enabled=True, pm25_threshold=THRESHOLD)
+    bundle = Bundle()
+    slow = bundle.lgbm.predict
+
+    def predict(X):
+        time.sleep(0.2)
+        return slow(X)
+
+    bundle.lgbm.predict = predict
+
+    async def main():
+        # A full batch is flushed at once and is still scoring when aclose is called
+        callers = [asyncio.ensure_future(batcher.predict(row(10.0, float(i)), bundle)) for i in range(2)]
+        await asyncio.sleep(0.01)
+        assert batcher._tasks
+        await batcher.aclose()
+        return [caller.result() for caller in callers]
+
+    assert asyncio.run(main()) == [expected(10.0, 0.0), expected(10.0, 1.0)]
+
+
+@pytest.mark.parametrize("settings", [{"enabled": False}, {"max_batch_size": 1}])
+def test_unbatched_predictions(settings):
+    batcher = MicroBatcher(**{"max_batch_size": 64, "max_wait_ms": 20, "enabled": True, "pm25_threshold": THRESHOLD, **settings})
+    bundle = Bundle()
+
+    async def main():
+        return await asyncio.gather(batcher.predict(row(10.0, 1.0), bundle), batcher.predict(row(40.0, 2.0), bundle))
+
+    assert asyncio.run(main()) == [expected(10.0, 1.0), expected(40.0, 2.0)]
+    assert batcher.batches == 0 and bundle.lgbm.calls == [1] and bundle.log_reg.calls == [1]
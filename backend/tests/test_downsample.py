@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from app.services.downsample import minmax_indices
+
+
+def buckets(n: int, max_points: int) -> list:
+    """Position ranges of the max_points // 2 buckets the series is cut into"""
+    edges = np.linspace(0, n, max_points // 2 + 1).astype(np.int64)
+    return [np.arange(lo, hi) for lo, hi in zip(edges[:-1], edges[1:])]
+
+
+@pytest.mark.parametrize("n,max_points", [(10_000, 500), (10_001, 333), (1_000, 999), (50, 3), (50, 2)])
+def test_minmax_keeps_each_buckets_extremes(n, max_points):
+    rng = np.random.default_rng(n + max_points)
+    values = rng.normal(0, 1, n).cumsum()
+    # A spike and a dip between neighbours, which plain striding would skip
+    values[n // 3] += 1000.0
+    values[2 * n // 3] -= 1000.0
+
+    kept = minmax_indices(values, max_points)
+    assert len(kept) <= max_points
+    assert np.all(np.diff(kept) > 0) and kept[0] >= 0 and kept[-1] < n
+    assert {n // 3, 2 * n // 3} <= set(kept)
+
+    for part in buckets(n, max_points):
+        inside = kept[(kept >= part[0]) & (kept <= part[-1])]
+        assert values[inside].min() == values[part].min()
+        assert values[inside].max() == values[part].max()
+
+
+def test_max_points_must_hold_a_pair():
+    with pytest.raises(ValueError):
+        minmax_indices(np.arange(5.0), 1)
+
+
+def test_short_series_are_kept_whole():
+    np.testing.assert_array_equal(minmax_indices(np.arange(5.0), 5), np.arange(5))
+    np.testing.assert_array_equal(minmax_indices(np.arange(5.0), 100), np.arange(5))
+    assert len(minmax_indices(np.zeros(0), 10)) == 0
+
+
+def test_nan_is_charted_as_zero():
+    values = np.array([5.0, np.nan, 7.0, 6.0, -3.0, 4.0, 8.0, 9.0])
+    kept = minmax_indices(values, 4)
+    # Buckets [0:4] and [4:8]: NaN (as 0.0) is the first bucket's minimum
+    assert list(kept) == [1, 2, 4, 7]
@@ -0,0 +1,144 @@
+import io
+import pandas as pd
+import pytest
+from app.services import encoding
+from app.services.encoding import ARROW, COLUMNS, CSV, JSON, PARQUET, UnsupportedFormatError, negotiate, pa
+from conftest import MERGED_LAGS_PATH
+
+BATCH_FORMATS = (CSV, COLUMNS, ARROW, PARQUET)
+HISTORY_FORMATS = (JSON, COLUMNS, ARROW, PARQUET)
+
+# What axios (and many other HTTP clients) send by default
+AXIOS_ACCEPT = "application/json, text/plain, */*"
+
+
+def test_generic_accept_keeps_default():
+    assert negotiate(None, AXIOS_ACCEPT, BATCH_FORMATS) == CSV
+    assert negotiate(None, AXIOS_ACCEPT, HISTORY_FORMATS) == JSON
+    assert negotiate(None, None, BATCH_FORMATS) == CSV
+    assert negotiate(None, "text/html,*/*;q=0.8", HISTORY_FORMATS) == JSON
+
+
+def test_json_is_not_remapped_to_columns():
+    assert negotiate(None, "application/json", BATCH_FORMATS) == CSV
+
+
+def test_format_parameter_wins():
+    assert negotiate("columns", AXIOS_ACCEPT, BATCH_FORMATS) == COLUMNS
+    assert negotiate("CSV", "application/json", BATCH_FORMATS) == CSV
+    with pytest.raises(UnsupportedFormatError):
+        negotiate("xml", None, BATCH_FORMATS)
+
+
+def test_accept_q_values():
+    accept = "text/csv;q=0.5, application/vnd.apache.arrow.stream"
+    expected = ARROW if pa is not None else CSV
+    assert negotiate(None, accept, BATCH_FORMATS) == expected
+    assert negotiate(None, "text/csv;q=0", BATCH_FORMATS) == CSV
+
+
+def test_binary_formats_need_pyarrow(monkeypatch):
+    monkeypatch.setattr(encoding, "pa", None)
+    with pytest.raises(UnsupportedFormatError):
+        negotiate("parquet", None, BATCH_FORMATS)
+    # Asked for through Accept, they are skipped instead
+    assert negotiate(None, "application/vnd.apache.arrow.stream", BATCH_FORMATS) == CSV
+
+
+def test_batch_binary_formats_without_pyarrow(client, monkeypatch):
+    monkeypatch.setattr(encoding, "pa", None)
+    head = pd.read_csv(MERGED_LAGS_PATH, nrows=50).to_csv(index=False).encode()
+    r = client.post("/api/predict/batch", params={"format": "arrow"}, files={"file": ("x.csv", head, "text/csv")})
+    assert r.status_code == 406
+
+
+@pytest.mark.skipif(pa is None, reason="pyarrow is not installed")
+@pytest.mark.parametrize("fmt", [ARROW, PARQUET])
+def test_batch_binary_formats(client, fmt):
+    head = pd.read_csv(MERGED_LAGS_PATH, nrows=50).to_csv(index=False).encode()
+    r = client.post("/api/predict/batch", params={"format": fmt, "columns": "row,Predicted_Power", "chunk_size": 20},
+                    files={"file": ("x.csv", head, "text/csv")})
+    assert r.status_code == 200
+    if fmt == ARROW:
+        table = pa.ipc.open_stream(r.content).read_all()
+    else:
+        import pyarrow.parquet as pq
+        table = pq.read_table(pa.BufferReader(r.content))
+    assert table.column_names == ["row", "Predicted_Power"]
+    assert table.column("row").to_pylist() == list(range(50))
+
+
+def test_batch_with_axios_accept_returns_csv(client):
+    head = pd.read_csv(MERGED_LAGS_PATH, nrows=50).to_csv(index=False).encode()
+    r = client.post("/api/predict/batch", files={"file": ("x.csv", head, "text/csv")}, headers={"Accept": AXIOS_ACCEPT})
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/csv")
+    assert "Predicted_Power" in pd.read_csv(io.BytesIO(r.content)).columns
+
+
+def _compressed_app(body: bytes, chunks: int = 1, headers: dict = None, **options):
+    """An ASGI app sending `body` (in `chunks` parts), wrapped in CompressionMiddleware"""
+    async def app(scope, receive, send):
+        raw = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+        if chunks == 1:
+            raw.append((b"content-length", str(len(body)).encode()))
+        await send({"type": "http.response.start", "status": 200, "headers": raw})
+        size = -(-len(body) // chunks) or 1
+        parts = [body[i:i + size] for i in range(0, len(body), size)] or [b""]
+        for i, part in enumerate(parts):
+            await send({"type": "http.response.body", "body": part, "more_body": i < len(parts) - 1})
+    return encoding.CompressionMiddleware(app, **options)
+
+
+def _get(app, accept_encoding: str):
+    from starlette.testclient import TestClient
+    # Not entered, so no lifespan events are sent to the bare app
+    return TestClient(app).get("/", headers={"Accept-Encoding": accept_encoding})
+
+
+BODY = b"datetime,Predicted_Power\n" + b"".join(b"2023-01-01 %02d:00:00,%d.5\n" % (i % 24, i) for i in range(2000))
+
+
+@pytest.mark.parametrize("chunks", [1, 7])
+def test_gzip(chunks):
+    r = _get(_compressed_app(BODY, chunks), "gzip")
+    assert r.headers["content-encoding"] == "gzip"
+    assert "accept-encoding" in r.headers["vary"].lower()
+    assert r.content == BODY
+    if chunks == 1:
+        assert int(r.headers["content-length"]) < len(BODY)
+    else:
+        assert "content-length" not in r.headers
+
+
+def test_small_and_encoded_responses_pass_through():
+    r = _get(_compressed_app(b"ok"), "gzip")
+    assert "content-encoding" not in r.headers and r.content == b"ok"
+    r = _get(_compressed_app(b"x" * 5000, headers={"Content-Encoding": "identity"}), "gzip")
+    assert r.headers["content-encoding"] == "identity" and r.content == b"x" * 5000
+    r = _get(_compressed_app(BODY), "identity")
+    assert "content-encoding" not in r.headers and r.content == BODY
+
+
+@pytest.mark.skipif(encoding.brotli is None, reason="brotli is not installed")
+@pytest.mark.parametrize("chunks", [1, 7])
+def test_brotli(chunks):
+    r = _get(_compressed_app(BODY, chunks), "gzip, br")
+    assert r.headers["content-encoding"] == "br"
+    assert r.content == BODY  # decoded by the client
+
+
+def test_brotli_falls_back_to_gzip_without_brotli(monkeypatch):
+    monkeypatch.setattr(encoding, "brotli", None)
+    r = _get(_compressed_app(BODY, 3), "gzip, br")
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.content == BODY
+
+
+def test_streamed_batch_is_gzipped(client):
+    with open(MERGED_LAGS_PATH, "rb") as f:
+        r = client.post("/api/predict/batch", params={"chunk_size": 500}, files={"file": ("x.csv", f, "text/csv")},
+                        headers={"Accept-Encoding": "gzip"})
+    assert r.status_code == 200
+    assert r.headers["content-encoding"] == "gzip"
+    assert len(pd.read_csv(io.BytesIO(r.content))) == len(pd.read_csv(MERGED_LAGS_PATH))
@@ -0,0 +1,90 @@
+import os
+import shutil
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from app.services import executor
+from app.services.batch import fill_backfill_defaults, prepare_batch_frame
+from app.services.executor import SCORING_COLUMNS, WorkerVersionError, WorkPool
+from app.services.inference import BATCH_PM25_THRESHOLD, predict_frame
+from app.services.model_registry import MODEL_FILES, MODELS_DIR, load_bundle
+from conftest import MERGED_LAGS_PATH
+
+
+@pytest.fixture(scope="module")
+def frame():
+    df = fill_backfill_defaults(prepare_batch_frame(pd.read_csv(MERGED_LAGS_PATH, nrows=300)))
+    return df[SCORING_COLUMNS]
+
+
+@pytest.fixture
+def models_dir(tmp_path):
+    for name in MODEL_FILES.values():
+        shutil.copy(os.path.join(MODELS_DIR, name), tmp_path / name)
+    return tmp_path
+
+
+def publish_new_version(models_dir):
+    """Rewrite an artifact with different bytes (same model), as a deploy would"""
+    path = models_dir / MODEL_FILES["log_reg"]
+    joblib.dump(joblib.load(path), path, compress=3)
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+@pytest.fixture
+def loads(monkeypatch, models_dir):
+    """A fresh worker's state over `models_dir`; counts the worker's model loads"""
+    calls = []
+    load = executor._load_worker_bundle
+
+    def counted(directory):
+        calls.append(directory)
+        return load(directory)
+
+    monkeypatch.setattr(executor, "_load_worker_bundle", counted)
+    monkeypatch.setattr(executor, "_worker_bundle", None)
+    monkeypatch.setattr(executor, "_worker_models_dir", str(models_dir))
+    return calls
+
+
+def test_worker_reloads_once_per_change_on_disk(frame, models_dir, loads, monkeypatch):
+    old = load_bundle(str(models_dir))
+    expected = predict_frame(frame, old.lgbm, old.log_reg, BATCH_PM25_THRESHOLD)
+    np.testing.assert_array_equal(executor._score_in_worker(frame, old.version, BATCH_PM25_THRESHOLD), expected)
+    executor._score_in_worker(frame, old.version, BATCH_PM25_THRESHOLD)
+    assert len(loads) == 1
+
+    # The server moves to a new version: the worker follows it once
+    publish_new_version(models_dir)
+    new = load_bundle(str(models_dir))
+    assert new.version != old.version
+    for _ in range(3):
+        np.testing.assert_array_equal(executor._score_in_worker(frame, new.version, BATCH_PM25_THRESHOLD), expected)
+    assert len(loads) == 2
+
+    # A worker started after the disk moved on, while the server is still on the old
+    # version, refuses it without reloading on every call
+    monkeypatch.setattr(executor, "_worker_bundle", None)
+    for _ in range(3):
+        with pytest.raises(WorkerVersionError):
+            executor._score_in_worker(frame, old.version, BATCH_PM25_THRESHOLD)
+    assert len(loads) == 3
+
+
+def test_process_pool_scores_with_the_servers_version(frame, models_dir):
+    old = load_bundle(str(models_dir))
+    expected = predict_frame(frame, old.lgbm, old.log_reg, BATCH_PM25_THRESHOLD)
+    pool = WorkPool(kind="process", workers=2, models_dir=str(models_dir), parallel_min_rows=100)
+    pool.start()
+    try:
+        np.testing.assert_allclose(pool.predict_frame(frame, old, metrics=False), expected, rtol=0, atol=1e-9)
+        # Workers move to the newer version on disk as soon as the server asks for it...
+        publish_new_version(models_dir)
+        new = load_bundle(str(models_dir))
+        np.testing.assert_allclose(pool.predict_frame(frame, new, metrics=False), expected, rtol=0, atol=1e-9)
+        # ...and hand their part back when a request still holds the old version
+        np.testing.assert_allclose(pool.predict_frame(frame, old, metrics=False), expected, rtol=0, atol=1e-9)
+    finally:
+        pool.shutdown()
@@ -0,0 +1,145 @@
+import math
+import pandas as pd
+import pytest
+from app.models.schemas import Reading
+from app.services.ingest import IngestStore, SiteNotFoundError
+from app.services.solar import solar_zenith
+
+LAT, LON = 31.5, 74.3
+
+
+def reading(when, **values) -> Reading:
+    """A reading at `when` with made-up measurements (overridable)"""
+    hour = pd.Timestamp(when).hour
+    fields = {"ac_power": 10.0 * hour, "power_factor": 0.9, "pm25": 20.0 + hour, "t2m": 25.0 + hour,
+              "allsky_sfc_sw_dwn": 0.5, "allsky_kt": 0.6, "ws10m": 2.0, "sza": 40.0}
+    fields.update(values)
+    return Reading(datetime=when, **fields)
+
+
+def rows(store: IngestStore, site_id: str) -> pd.DataFrame:
+    return pd.read_csv(store.path(site_id), parse_dates=['datetime'])
+
+
+def test_lags_come_from_the_reading_an_hour_earlier(tmp_path):
+    store = IngestStore(str(tmp_path))
+    # 03:00 is missing, so 04:00 has no lags of its own
+    times = ["2024-06-01 01:00", "2024-06-01 02:00", "2024-06-01 04:00", "2024-06-01 05:00"]
+    result = store.ingest("site-1", [reading(t) for t in times])
+    assert result["accepted"] == 4 and result["skipped"] == 0
+
+    df = rows(store, "site-1")
+    assert df['AC Power/m2_Lag1'].isna().tolist() == [True, False, True, False]
+    assert df['AC Power/m2_Lag1'][1] == df['AC Power/m2'][0]
+    assert df['PM25_Lag1'][3] == df['PM25'][2]
+    assert df['T2M_Lag1'][3] == df['T2M'][2]
+    assert df['power_factor_Lag1'][1] == 0.9
+    assert df[['Month', 'Day', 'Hour']].iloc[3].tolist() == [6, 1, 5]
+
+    # Supplied lags are only used across the gap
+    store.ingest("site-1", [reading("2024-06-01 07:00", pm25_lag1=5.0, t2m_lag1=6.0),
+                            reading("2024-06-01 08:00", pm25_lag1=5.0, t2m_lag1=6.0)])
+    df = rows(store, "site-1")
+    assert df['PM25_Lag1'].tolist()[-2:] == [5.0, df['PM25'].iloc[-2]]
+    assert df['T2M_Lag1'].tolist()[-2:] == [6.0, df['T2M'].iloc[-2]]
+
+    status = store.site("site-1").status()
+    assert status["next"]["datetime"] == "2024-06-01T09:00:00" and status["next"]["hour"] == 9
+    assert status["next"]["ac_power_lag1"] == 80.0
+
+
+def test_readings_at_or_before_the_latest_are_skipped(tmp_path):
+    store = IngestStore(str(tmp_path))
+    # Out of order within a request is fine: readings are sorted first
+    store.ingest("site-1", [reading("2024-06-01 02:00"), reading("2024-06-01 01:00")])
+    result = store.ingest("site-1", [reading("2024-06-01 01:00"), reading("2024-06-01 02:00", ac_power=99.0),
+                                     reading("2024-06-01 03:00")])
+    assert result["accepted"] == 1 and result["skipped"] == 2
+    assert result["rows"] == 3 and result["latest"] == "2024-06-01T03:00:00"
+
+    df = rows(store, "site-1")
+    assert df['datetime'].dt.hour.tolist() == [1, 2, 3]
+    assert df['AC Power/m2'].tolist() == [10.0, 20.0, 30.0]
+    assert df['AC Power/m2_Lag1'][2] == 20.0
+
+
+def test_missing_sza_is_derived_from_the_coordinates(tmp_path):
+    store = IngestStore(str(tmp_path))
+    times = ["2024-06-01 06:00", "2024-06-01 12:00"]
+    store.ingest("site-1", [reading(times[0], sza=None), reading(times[1], sza=12.5)], latitude=LAT, longitude=LON)
+    store.ingest("site-2", [reading(times[0], sza=None)])
+
+    sza = rows(store, "site-1")['SZA']
+    assert sza[0] == pytest.approx(solar_zenith(pd.DatetimeIndex(times[:1]), LAT, LON)[0])
+    assert sza[1] == 12.5
+    # Without coordinates it stays unknown
+    assert rows(store, "site-2")['SZA'].isna().all()
+
+
+def test_aware_times_are_stored_in_the_site_timezone(tmp_path):
+    store = IngestStore(str(tmp_path))
+    utc = ["2024-06-01T07:00:00+00:00", "2024-06-01T08:00:00+00:00"]
+    store.ingest("site-1", [reading(t, sza=None) for t in utc], latitude=LAT, longitude=LON, timezone="Asia/Karachi")
+
+    df = rows(store, "site-1")
+    assert df['datetime'].dt.strftime('%Y-%m-%d %H:%M').tolist() == ["2024-06-01 12:00", "2024-06-01 13:00"]
+    assert df['Hour'].tolist() == [12, 13]
+    # SZA is taken at the actual instant, not at the local wall-clock time read as UTC
+    assert df['SZA'].tolist() == pytest.approx(solar_zenith(pd.DatetimeIndex(utc), LAT, LON).tolist())
+    assert df['AC Power/m2_Lag1'][1] == df['AC Power/m2'][0]
+
+
+def test_bad_site_ids_are_rejected(tmp_path):
+    store = IngestStore(str(tmp_path))
+    for site_id in ["../escape", "a/b", "", "x" * 65]:
+        with pytest.raises(SiteNotFoundError):
+            store.ingest(site_id, [reading("2024-06-01 01:00")])
+        with pytest.raises(SiteNotFoundError):
+            store.site(site_id)
+    with pytest.raises(SiteNotFoundError):
+        store.site("never-ingested")
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_state_is_rebuilt_from_the_file_after_a_restart(tmp_path):
+    store = IngestStore(str(tmp_path))
+    times = pd.date_range("2024-01-30 20:00", periods=30, freq="h")
+    store.ingest("site-1", [reading(t) for t in times])
+    before = store.site("site-1").status()
+
+    restarted = IngestStore(str(tmp_path))
+    assert restarted.site("site-1").status() == before
+    for interval in ("hour", "day", "month"):
+        start, end = times[0], times[-1]
+        expected, got = store.history("site-1", start, end, interval), restarted.history("site-1", start, end, interval)
+        assert list(got[0]) == list(expected[0])
+        assert list(got[1]) == pytest.approx(list(expected[1]))
+
+    # The rebuilt state carries on where the old one stopped
+    result = restarted.ingest("site-1", [reading(times[-2]), reading(times[-1] + pd.Timedelta(hours=1))])
+    assert result["accepted"] == 1 and result["skipped"] == 1
+    df = rows(restarted, "site-1")
+    assert len(df) == 31
+    assert df['AC Power/m2_Lag1'].iloc[-1] == df['AC Power/m2'].iloc[-2]
+    assert not math.isnan(restarted.site("site-1").next_lags()["pm25_lag1"])
+
+
+def test_predict_uses_site_lags_only_for_the_next_hour(client):
+    times = ["2024-06-01T10:00:00", "2024-06-01T11:00:00"]
+    payload = {"site_id": "predict-next-hour", "readings": [reading(t).model_dump(mode="json") for t in times]}
+    assert client.post("/api/readings/ingest", json=payload).status_code == 200
+
+    base = {"is_location_mode": False, "pm25": 20.0, "site_id": "predict-next-hour",
+            "allsky_sfc_sw_dwn": 0.5, "allsky_kt": 0.6, "t2m": 30.0, "sza": 30.0, "ws10m": 2.0}
+    explicit = {"pm25_lag1": 31.0, "ac_power_lag1": 110.0, "power_factor_lag1": 0.9, "t2m_lag1": 36.0}
+    r = client.post("/api/predict", json={**base, "hour": 12, "month": 6})
+    assert r.status_code == 200
+    expected = client.post("/api/predict", json={**base, "site_id": None, **explicit, "hour": 12, "month": 6})
+    assert r.json()["features"] == expected.json()["features"]
+
+    # Any other hour or month would get the lags of the wrong hour
+    for hour, month in [(13, 6), (12, 7), (11, 6)]:
+        r = client.post("/api/predict", json={**base, "hour": hour, "month": month})
+        assert r.status_code == 400 and "2024-06-01T12:00:00" in r.json()["detail"]
+        assert client.post("/api/predict", json={**base, **explicit, "hour": hour, "month": month}).status_code == 200
+    assert client.post("/api/predict", json={**base, "site_id": "missing", "hour": 12, "month": 6}).status_code == 404
@@ -0,0 +1,168 @@
+import io
+import os
+import threading
+import time
+import pandas as pd
+import pytest
+from app.services.jobs import (CANCELLED, DONE, QUEUED, RUNNING, BatchJobRunner, JobStore, get_job_runner)
+from conftest import MERGED_LAGS_PATH
+
+LEASE = 0.3
+
+
+@pytest.fixture
+def upload():
+    return pd.read_csv(MERGED_LAGS_PATH, nrows=300).to_csv(index=False).encode()
+
+
+def queue(store: JobStore, count: int = 1) -> list:
+    """Queue `count` jobs, each with a small input file"""
+    runner = BatchJobRunner(store)
+    head = pd.read_csv(MERGED_LAGS_PATH, nrows=50).to_csv(index=False).encode()
+    jobs = [runner.submit(io.BytesIO(head), "x.csv", {"chunk_size": 20}) for _ in range(count)]
+    time.sleep(0.01)
+    return jobs
+
+
+def claim_all(stores: list) -> list:
+    """Have every store claim jobs from its own thread until none are left; returns the claimed ids"""
+    claimed = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(len(stores))
+
+    def worker(store):
+        barrier.wait()
+        while True:
+            store.requeue_expired()
+            job = store.claim_next()
+            if job is None:
+                return
+            with lock:
+                claimed.append(job["id"])
+
+    threads = [threading.Thread(target=worker, args=(store,)) for store in stores]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return claimed
+
+
+def test_each_job_is_claimed_once(tmp_path):
+    jobs = queue(JobStore(str(tmp_path)), 6)
+    # One store per worker, like separate processes sharing the directory
+    claimed = claim_all([JobStore(str(tmp_path)) for _ in range(8)])
+    assert sorted(claimed) == sorted(job["id"] for job in jobs)
+
+
+def test_expired_lease_is_reclaimed_exactly_once(tmp_path):
+    store = JobStore(str(tmp_path), lease=LEASE)
+    [job] = queue(store)
+    dead = store.claim_next()
+    assert dead["id"] == job["id"] and dead["status"] == RUNNING
+
+    # While the lease holds, nobody else can take the job
+    assert store.requeue_expired() == 0
+    assert claim_all([JobStore(str(tmp_path), lease=LEASE) for _ in range(4)]) == []
+
+    time.sleep(LEASE + 0.1)
+    stores = [JobStore(str(tmp_path), lease=60) for _ in range(8)]
+    assert claim_all(stores) == [job["id"]]
+
+    current = store.get(job["id"])
+    assert current["status"] == RUNNING and current["lease_id"] != dead["lease_id"]
+    # The dead worker's lease is gone: its late writes are ignored
+    assert not store.renew(job["id"], dead["lease_id"], rows_done=1)
+    assert not store.release(job["id"], dead["lease_id"], status=DONE)
+    assert store.get(job["id"])["status"] == RUNNING
+    # The new lease is live, so the job isn't requeued again
+    assert store.requeue_expired() == 0
+
+
+def test_cancel_queued_and_running(tmp_path):
+    store = JobStore(str(tmp_path))
+    first, second = queue(store, 2)
+
+    running = store.claim_next()
+    assert running["id"] == first["id"]
+    queued = store.cancel(second["id"])
+    assert queued["status"] == CANCELLED
+    flagged = store.cancel(first["id"])
+    assert flagged["status"] == RUNNING and flagged["cancel_requested"]
+
+    # The worker stops at its first checkpoint and cleans up
+    BatchJobRunner(store)._process(running)
+    assert store.get(first["id"])["status"] == CANCELLED
+    assert list(tmp_path.glob(f"{first['id']}*")) == []
+    # Finished jobs are left alone
+    assert store.cancel(first["id"])["status"] == CANCELLED
+    assert store.cancel("missing") is None
+
+
+def test_runner_picks_up_a_dead_workers_job(tmp_path):
+    store = JobStore(str(tmp_path), lease=LEASE)
+    [job] = queue(store)
+    store.claim_next()
+    time.sleep(LEASE + 0.1)
+
+    runner = BatchJobRunner(store, poll_interval=0.05)
+    runner.start()
+    try:
+        for _ in range(200):
+            if store.get(job["id"])["status"] == DONE:
+                break
+            time.sleep(0.05)
+    finally:
+        runner.stop()
+    done = store.get(job["id"])
+    assert done["status"] == DONE and done["rows_done"] == 50
+    assert len(pd.read_csv(store.result_path(job["id"]))) == 50
+
+
+@pytest.fixture
+def runner(client, tmp_path):
+    """A job runner over a temporary directory, served by the /api/jobs routes; not started"""
+    runner = BatchJobRunner(JobStore(str(tmp_path)), poll_interval=0.05)
+    client.app.dependency_overrides[get_job_runner] = lambda: runner
+    yield runner
+    runner.stop()
+    client.app.dependency_overrides.pop(get_job_runner, None)
+
+
+def test_job_routes(client, runner, upload):
+    r = client.post("/api/jobs/batch", params={"chunk_size": 100}, files={"file": ("x.csv", upload, "text/csv")})
+    assert r.status_code == 202
+    job = r.json()
+    assert job["status"] == QUEUED and job["bytes_total"] == len(upload)
+    assert client.get(f"/api/jobs/{job['id']}/result").status_code == 409
+    assert [j["id"] for j in client.get("/api/jobs").json()] == [job["id"]]
+
+    seen = set()
+    runner.start()
+    for _ in range(200):
+        job = client.get(f"/api/jobs/{job['id']}").json()
+        seen.add(job["status"])
+        if job["status"] == DONE:
+            break
+        time.sleep(0.05)
+    assert job["status"] == DONE
+    assert seen <= {QUEUED, RUNNING, DONE}
+    assert job["rows_done"] == 300 and job["bytes_done"] == job["bytes_total"]
+
+    result = client.get(f"/api/jobs/{job['id']}/result")
+    assert result.status_code == 200
+    streamed = client.post("/api/predict/batch", files={"file": ("x.csv", upload, "text/csv")})
+    pd.testing.assert_frame_equal(pd.read_csv(io.BytesIO(result.content)), pd.read_csv(io.BytesIO(streamed.content)))
+
+    # Finished jobs can't be cancelled, unknown ones are 404
+    assert client.post(f"/api/jobs/{job['id']}/cancel").json()["status"] == DONE
+    assert client.post("/api/jobs/missing/cancel").status_code == 404
+    assert client.get("/api/jobs/missing").status_code == 404
+
+
+def test_cancel_route(client, runner, upload):
+    job = client.post("/api/jobs/batch", files={"file": ("x.csv", upload, "text/csv")}).json()
+    cancelled = client.post(f"/api/jobs/{job['id']}/cancel").json()
+    assert cancelled["status"] == CANCELLED
+    assert client.get(f"/api/jobs/{job['id']}/result").status_code == 409
+    assert not os.path.exists(runner.store.input_path(job["id"]))
@@ -0,0 +1,56 @@
+import os
+import shutil
+import pytest
+from app.routes import models as models_route
+from app.services.model_registry import MODEL_FILES, MODELS_DIR, model_registry
+
+TOKEN = "test-admin-token"
+
+
+@pytest.fixture
+def admin(monkeypatch):
+    monkeypatch.setattr(models_route, "ADMIN_TOKEN", TOKEN)
+    return {"X-Admin-Token": TOKEN}
+
+
+def test_reload_needs_the_admin_token(client, monkeypatch):
+    monkeypatch.setattr(models_route, "ADMIN_TOKEN", None)
+    assert client.post("/api/models/reload", headers={"X-Admin-Token": "anything"}).status_code == 403
+
+    monkeypatch.setattr(models_route, "ADMIN_TOKEN", TOKEN)
+    assert client.post("/api/models/reload").status_code == 401
+    assert client.post("/api/models/reload", headers={"X-Admin-Token": "wrong"}).status_code == 401
+
+
+def test_reload_is_debounced(client, admin, monkeypatch):
+    model_registry.get()
+    monkeypatch.setattr(models_route, "RELOAD_MIN_INTERVAL", 0)
+    loaded_at = client.get("/api/models").json()["loaded_at"]
+    r = client.post("/api/models/reload", headers=admin)
+    assert r.status_code == 200 and r.json()["loaded_at"] > loaded_at
+    reloaded = r.json()["loaded_at"]
+
+    # Right after a load the same artifacts aren't loaded again
+    monkeypatch.setattr(models_route, "RELOAD_MIN_INTERVAL", 3600)
+    r = client.post("/api/models/reload", headers=admin)
+    assert r.status_code == 429 and int(r.headers["Retry-After"]) > 3500
+    assert client.get("/api/models").json()["loaded_at"] == reloaded
+
+
+def test_changed_artifacts_reload_at_once(client, admin, monkeypatch, tmp_path):
+    for name in MODEL_FILES.values():
+        shutil.copy(os.path.join(MODELS_DIR, name), tmp_path / name)
+    monkeypatch.setattr(model_registry, "models_dir", str(tmp_path))
+    monkeypatch.setattr(models_route, "RELOAD_MIN_INTERVAL", 3600)
+    try:
+        before = model_registry.reload(force=True).loaded_at
+        assert client.post("/api/models/reload", headers=admin).status_code == 429
+
+        path = tmp_path / MODEL_FILES["lgbm"]
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        r = client.post("/api/models/reload", headers=admin)
+        assert r.status_code == 200 and r.json()["loaded_at"] > before
+    finally:
+        monkeypatch.undo()
+        model_registry.reload(force=True)
@@ -0,0 +1,49 @@
+import os
+import shutil
+import numpy as np
+from app.services.features import N_FEATURES
+from app.services.model_registry import MODEL_FILES, MODELS_DIR, ModelRegistry, model_registry
+from app.services.prediction_cache import PredictionCache, prediction_cache
+
+FEATURES = np.arange(N_FEATURES, dtype=np.float64).reshape(1, -1)
+
+
+def test_keys_round_features():
+    cache = PredictionCache(maxsize=10, ttl=60, decimals="3")
+    cache.set(FEATURES, "v1", (1.0, "lgbm"))
+    assert cache.get(FEATURES + 1e-5, "v1") == (1.0, "lgbm")
+    assert cache.get(FEATURES + 1e-2, "v1") is None
+    # A prediction of one version is never served for another
+    assert cache.get(FEATURES, "v2") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+def test_a_model_swap_clears_the_cache(tmp_path):
+    for name in MODEL_FILES.values():
+        shutil.copy(os.path.join(MODELS_DIR, name), tmp_path / name)
+    registry = ModelRegistry(str(tmp_path), watch_interval=0)
+    cache = PredictionCache(maxsize=10, ttl=60)
+    registry.on_swap(cache.invalidate)
+    version = registry.get().version
+    assert cache.invalidations == 1
+
+    cache.set(FEATURES, version, (1.0, "lgbm"))
+    # Unchanged artifacts: nothing is swapped in and the entry stays
+    registry.reload()
+    assert cache.get(FEATURES, version) == (1.0, "lgbm")
+
+    # New artifacts on disk: the swap drops every entry
+    path = tmp_path / MODEL_FILES["lgbm"]
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    registry.reload()
+    assert cache.invalidations == 2 and cache.stats()["size"] == 0
+    assert cache.get(FEATURES, version) is None
+
+
+def test_the_served_cache_follows_the_model_registry():
+    version = model_registry.get().version
+    prediction_cache.set(FEATURES, version, (1.0, "lgbm"))
+    assert prediction_cache.get(FEATURES, version) == (1.0, "lgbm")
+    model_registry.reload(force=True)
+    assert prediction_cache.get(FEATURES, version) is None
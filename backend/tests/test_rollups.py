@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+from app.services.rollups import RollupCube
+
+FREQS = {'hour': 'h', 'day': 'D', 'month': 'MS'}
+COLUMNS = ['AC Power/m2', 'PM25']
+
+
+@pytest.fixture(scope="module")
+def frame() -> pd.DataFrame:
+    """Irregular readings over a year: 20-minute steps, whole days and a month missing, NaN values"""
+    rng = np.random.default_rng(7)
+    index = pd.date_range("2023-01-01 00:10", "2023-12-31 23:50", freq="20min")
+    index = index[rng.random(len(index)) < 0.7]
+    index = index[~((index >= "2023-03-04") & (index < "2023-03-09"))]
+    index = index[~((index >= "2023-07-01") & (index < "2023-08-01"))]
+    df = pd.DataFrame({col: rng.normal(50, 20, len(index)) for col in COLUMNS}, index=index)
+    df.loc[rng.random(len(df)) < 0.1, 'AC Power/m2'] = np.nan
+    # A whole day with rows but no values
+    df.loc["2023-05-05", 'AC Power/m2'] = np.nan
+    return df
+
+
+def assert_matches_resample(cube: RollupCube, df: pd.DataFrame, level: str, start, end):
+    # Timestamps, not date strings: .loc would take a string end to mean the whole day
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    times, means = cube.query(level, start, end, 'AC Power/m2')
+    expected = df.loc[start:end, 'AC Power/m2'].resample(FREQS[level]).mean()
+    assert list(times) == list(expected.index)
+    np.testing.assert_allclose(means, expected.to_numpy(), rtol=1e-9, equal_nan=True)
+
+
+@pytest.mark.parametrize("level", FREQS)
+def test_query_matches_resample_on_ragged_ranges(frame, level):
+    cube = RollupCube(frame, COLUMNS)
+    rng = np.random.default_rng(11)
+    span = (frame.index[-1] - frame.index[0]).total_seconds()
+    ranges = [(frame.index[0], frame.index[-1]),
+              # Cut mid-hour, mid-day and mid-month, around the missing days and month
+              (pd.Timestamp("2023-02-17 13:25"), pd.Timestamp("2023-03-10 05:05")),
+              (pd.Timestamp("2023-06-30 23:59"), pd.Timestamp("2023-08-01 00:30")),
+              (pd.Timestamp("2023-05-04 22:00"), pd.Timestamp("2023-05-06 01:00"))]
+    for _ in range(30):
+        a, b = sorted(rng.random(2) * span)
+        ranges.append((frame.index[0] + pd.Timedelta(seconds=a), frame.index[0] + pd.Timedelta(seconds=b)))
+    for start, end in ranges:
+        assert_matches_resample(cube, frame, level, start, end)
+
+
+@pytest.mark.parametrize("level", FREQS)
+def test_empty_buckets_and_ranges(frame, level):
+    cube = RollupCube(frame, COLUMNS)
+    # Empty buckets inside the range come back as NaN, like resample
+    times, means = cube.query(level, "2023-06-15", "2023-08-15")
+    assert np.isnan(means[(times >= "2023-07-01") & (times < "2023-08-01")]).all()
+    assert_matches_resample(cube, frame, level, "2023-03-01", "2023-03-12")
+    # A day of rows without values is a NaN bucket, not a missing one
+    times, means = cube.query('day', "2023-05-04", "2023-05-06 12:00")
+    assert len(times) == 3 and np.isnan(means[1]) and not np.isnan(means[[0, 2]]).any()
+
+    for start, end in [("2023-07-05", "2023-07-20 12:00"), ("2022-01-01", "2022-12-31"), ("2023-05-01", "2023-04-01")]:
+        times, means = cube.query(level, start, end)
+        assert len(times) == 0 and len(means) == 0
+    empty = RollupCube(frame.iloc[:0], COLUMNS)
+    assert len(empty.query(level, "2023-01-01", "2023-12-31")[0]) == 0
+
+
+def test_appended_rows_match_a_cube_built_at_once(frame):
+    split = len(frame) // 3
+    cube = RollupCube(frame.iloc[:split], COLUMNS)
+    for ts, row in zip(frame.index[split:], frame.iloc[split:].to_numpy()):
+        cube.append(ts, row)
+    assert len(cube) == len(frame)
+    with pytest.raises(ValueError):
+        cube.append(frame.index[0], frame.iloc[0].to_numpy())
+
+    for level in FREQS:
+        assert_matches_resample(cube, frame, level, frame.index[0], frame.index[-1])
+        assert_matches_resample(cube, frame, level, "2023-04-10 07:30", "2023-11-02 16:45")
+    start, end = pd.Timestamp("2023-09-01"), pd.Timestamp("2023-09-02 12:00")
+    times, values = cube.rows(start, end)
+    np.testing.assert_array_equal(values, frame.loc[start:end, 'AC Power/m2'].to_numpy())
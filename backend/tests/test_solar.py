@@ -0,0 +1,14 @@
+import pandas as pd
+import pytest
+from app.services.solar import ZenithMemo, solar_zenith
+
+LAT, LON = 31.52, 74.36
+
+
+@pytest.mark.parametrize("maxsize", [50_000, 4, 1])
+def test_memo_matches_solar_zenith(maxsize):
+    memo = ZenithMemo(maxsize=maxsize)
+    # A cache smaller than a day evicts hours while the day is being filled
+    for when in ["2024-06-01 00:00", "2024-06-01 07:20", "2024-06-01 23:55", "2024-12-21T12:00:00+05:00"]:
+        expected = solar_zenith(pd.DatetimeIndex([pd.Timestamp(when)]), LAT, LON)[0]
+        assert memo.at(LAT, LON, when) == pytest.approx(expected, abs=0.01)
@@ -0,0 +1,74 @@
+import asyncio
+import httpx
+from app.services.fakes import FakeNasaTransport
+from app.services.weather import NasaPowerProvider
+
+DATES = ("20250101", "20250102")
+
+
+def run(provider: NasaPowerProvider, *calls):
+    """Run `hourly` calls (tuples of arguments) concurrently on a fresh loop, then close the provider"""
+    async def main():
+        try:
+            return await asyncio.gather(*(provider.hourly(*args) for args in calls), return_exceptions=True)
+        finally:
+            await provider.aclose()
+    return asyncio.run(main())
+
+
+def test_nasa_cache_hit_skips_upstream():
+    transport = FakeNasaTransport(latency=0)
+    provider = NasaPowerProvider(transport=transport, retries=0)
+
+    async def main():
+        first = await provider.hourly(12.341, 77.591, *DATES)
+        # Rounds to the same 0.01 degree cell
+        second = await provider.hourly(12.344, 77.589, *DATES)
+        await provider.aclose()
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert transport.requests == 1
+    assert second == first and "T2M" in first
+
+
+def test_nasa_concurrent_misses_share_one_request():
+    transport = FakeNasaTransport(latency=0.05)
+    results = run(NasaPowerProvider(transport=transport, retries=0), *[(12.34, 77.59, *DATES)] * 20)
+    assert transport.requests == 1
+    assert all(result == results[0] for result in results)
+
+
+def test_nasa_retries_server_errors_then_fails():
+    transport = FakeNasaTransport(latency=0, statuses=[503, 502, 500])
+    provider = NasaPowerProvider(transport=transport, retries=2, backoff=0)
+    [result] = run(provider, (12.34, 77.59, *DATES))
+    assert isinstance(result, httpx.HTTPStatusError) and result.response.status_code == 500
+    assert transport.requests == 3
+
+
+def test_nasa_retry_recovers_and_failures_are_not_cached():
+    transport = FakeNasaTransport(latency=0, statuses=[503])
+    [result] = run(NasaPowerProvider(transport=transport, retries=1, backoff=0), (12.34, 77.59, *DATES))
+    assert "T2M" in result and transport.requests == 2
+
+    transport = FakeNasaTransport(latency=0, statuses=[503])
+    provider = NasaPowerProvider(transport=transport, retries=0)
+    failed, recovered = run(provider, (12.34, 77.59, *DATES)), run(provider, (12.34, 77.59, *DATES))
+    assert isinstance(failed[0], httpx.HTTPStatusError) and "T2M" in recovered[0]
+    assert transport.requests == 2
+
+
+def test_nasa_client_errors_are_not_retried():
+    transport = FakeNasaTransport(latency=0, statuses=[404])
+    [result] = run(NasaPowerProvider(transport=transport, retries=3, backoff=0), (12.34, 77.59, *DATES))
+    assert isinstance(result, httpx.HTTPStatusError)
+    assert transport.requests == 1
+
+
+def test_nasa_base_url_override():
+    transport = FakeNasaTransport(latency=0)
+    run(NasaPowerProvider(base_url="http://power.test/api/hourly", transport=transport), (12.34, 77.59, *DATES))
+    [url] = transport.urls
+    assert (url.host, url.path) == ("power.test", "/api/hourly")
+    assert url.params["latitude"] == "12.34" and url.params["start"] == DATES[0]
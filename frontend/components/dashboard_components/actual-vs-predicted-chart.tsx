@@ -42,7 +42,8 @@ export function ActualVsPredictedChart() {
         interval = "hour"
       }
       
-      const response = await fetch(`http://127.0.0.1:8000/api/analytics/history?start_date=${startStr}&end_date=${endStr}&interval=${interval}`)
+      // Actuals next to predictions precomputed once per model version on the server
+      const response = await fetch(`http://127.0.0.1:8000/api/analytics/backtest?start_date=${startStr}&end_date=${endStr}&interval=${interval}`)
       if (!response.ok) {
         throw new Error("Failed to fetch data")
       }
@@ -50,7 +51,7 @@ export function ActualVsPredictedChart() {
       const result = await response.json()
       setData(result)
     } catch (error) {
-      console.error("Error fetching historical data:", error)
+      console.error("Error fetching backtest data:", error)
       setData([])
     } finally {
       setIsLoading(false)
@@ -87,7 +88,7 @@ export function ActualVsPredictedChart() {
       <div className="mb-6 flex flex-col gap-4">
         <div className="flex items-center justify-between">
           <div>
-            <h3 className="font-semibold text-lg mb-1">Historical AC Power</h3>
+            <h3 className="font-semibold text-lg mb-1">Actual vs Predicted AC Power</h3>
             <p className="text-sm text-[#b3b3b3]">
               {viewMode === "yearly" && `Average Monthly Power - ${selectedYear}`}
               {viewMode === "monthly" && `Average Daily Power - ${months.find(m => m.value === selectedMonth)?.label} ${selectedYear}`}
@@ -196,9 +197,16 @@ export function ActualVsPredictedChart() {
                     }}
                 />
                 <Bar
-                    dataKey="power"
+                    dataKey="actual"
                     fill="#5ec1ffff"
-                    name="AC Power/m²"
+                    name="Actual AC Power/m²"
+                    radius={[4, 4, 0, 0]}
+                    opacity={0.9}
+                />
+                <Bar
+                    dataKey="predicted"
+                    fill="#f59e0b"
+                    name="Predicted AC Power/m²"
                     radius={[4, 4, 0, 0]}
                     opacity={0.9}
                 />